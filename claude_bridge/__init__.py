@@ -0,0 +1,10 @@
+"""Shared helpers for the claude.ai Playwright bridge scripts."""
+from .completion import arm_completion_observer, CompletionWaiter, send_and_wait
+from .composer import enter_message, submit_message, wait_for_input_ready
+from .streaming import stream_response
+from .pool import TabPool
+from .hedging import Hedger, HedgePolicy
+from .messages import evaluate_when_ready, read_last_message
+from .network import arm_network_capture, send_and_capture, stream_network_response, wait_for_capture
+from .document import extract_document
+from .export import export_conversation
@@ -0,0 +1,156 @@
+"""Extracting every artifact of the latest turn without reloading the page.
+
+Each artifact button in the newest message group is opened in turn and the
+code is read straight from the CodeMirror editor state, which also covers the
+lines CodeMirror hasn't rendered. If no editor shows up, the panel's copy
+button and the clipboard are used instead. Afterwards the canvas is closed and
+we wait for the composer, so the warm page is kept for the next turn.
+"""
+import re
+
+from .composer import wait_for_input_ready
+from .metrics import span
+from .selectors import REGISTRY
+
+LANGUAGE_EXTENSIONS = {
+    "python": ".py",
+    "javascript": ".js",
+    "jsx": ".jsx",
+    "typescript": ".ts",
+    "tsx": ".tsx",
+    "html": ".html",
+    "css": ".css",
+    "json": ".json",
+    "markdown": ".md",
+    "bash": ".sh",
+    "shell": ".sh",
+    "sql": ".sql",
+    "java": ".java",
+    "c": ".c",
+    "cpp": ".cpp",
+    "c++": ".cpp",
+    "csharp": ".cs",
+    "go": ".go",
+    "rust": ".rs",
+    "ruby": ".rb",
+    "php": ".php",
+    "swift": ".swift",
+    "kotlin": ".kt",
+    "yaml": ".yaml",
+    "xml": ".xml",
+    "svg": ".svg",
+    "mermaid": ".mmd",
+    "text": ".txt",
+}
+
+READ_EDITOR_JS = """([contentSel, previous]) => {
+    const content = document.querySelector(contentSel);
+    if (!content) return null;
+    const tile = content.cmView;
+    const view = tile && (tile.rootView ? tile.rootView.view : tile.view);
+    let text = null;
+    let complete = false;
+    if (view && view.state) {
+        text = view.state.doc.toString();
+        complete = true;
+    } else {
+        // Only the rendered lines are in the DOM; good enough for short documents.
+        text = Array.from(content.querySelectorAll('.cm-line'), (line) => line.textContent).join('\\n');
+    }
+    if (!text || text === previous) return null;
+    return {content: text, language: content.getAttribute('data-language'), complete};
+}"""
+
+CLIPBOARD_COPY_JS = """async (groupSel) => {
+    // The canvas copy button is the one that is not inside a chat message.
+    const buttons = Array.from(document.querySelectorAll('button'))
+        .filter((b) => (b.textContent || '').trim() === 'Copy' && !b.closest(groupSel));
+    if (buttons.length === 0) return null;
+    await navigator.clipboard.writeText('');
+    buttons[buttons.length - 1].click();
+    await new Promise((resolve) => setTimeout(resolve, 100));
+    return await navigator.clipboard.readText();
+}"""
+
+
+def _guess_language(title, content):
+    match = re.search(r"\.([A-Za-z0-9+]+)\s*$", title or "")
+    if match:
+        suffix = "." + match.group(1).lower()
+        for language, extension in LANGUAGE_EXTENSIONS.items():
+            if extension == suffix:
+                return language
+    stripped = content.lstrip()
+    if stripped.startswith(("<!DOCTYPE", "<html")):
+        return "html"
+    if stripped.startswith(("<svg", "<?xml")):
+        return "svg" if "<svg" in stripped[:200] else "xml"
+    if re.search(r"^(def |class |import |from \S+ import )", content, re.M):
+        return "python"
+    if re.search(r"^(import .* from |export |const |function )", content, re.M):
+        return "javascript"
+    return None
+
+
+def extension_for(artifact):
+    return LANGUAGE_EXTENSIONS.get((artifact.get("language") or "").lower(), ".txt")
+
+
+async def _read_open_artifact(page, previous):
+    try:
+        handle = await page.wait_for_function(
+            READ_EDITOR_JS, arg=[REGISTRY.css("canvas_content"), previous], timeout=5000)
+        return await handle.json_value()
+    except Exception:
+        pass
+    try:
+        text = await page.evaluate(CLIPBOARD_COPY_JS, REGISTRY.css("message_group"))
+    except Exception as e:
+        print(f"Clipboard fallback failed: {e}")
+        return None
+    if not text:
+        return None
+    return {"content": text, "language": None, "complete": True}
+
+
+async def extract_artifacts(page):
+    """Opens every artifact in the latest turn and returns [{title, language, extension, content}]."""
+    with span("artifact_extraction"):
+        return await _extract_artifacts(page)
+
+
+async def _extract_artifacts(page):
+    # One in-page check of every artifact-button strategy; no buttons means no artifacts, at once.
+    match = (await REGISTRY.probe(page, "artifact_button", scope="message_group"))["artifact_button"]
+    if not match:
+        return []
+
+    titles = match["labels"]
+    buttons = page.locator(REGISTRY.css("message_group")).last.locator(match["selector"])
+    artifacts = []
+    previous = None
+    for index, title in enumerate(titles):
+        await buttons.nth(index).click()
+        result = await _read_open_artifact(page, previous)
+        if not result:
+            print(f"Could not read artifact {index + 1} ({title!r}).")
+            continue
+        if not result["complete"]:
+            print(f"Artifact {index + 1} was read from rendered lines only and may be truncated.")
+        language = result["language"] or _guess_language(title, result["content"])
+        artifact = {"title": title, "language": language, "content": result["content"]}
+        artifact["extension"] = extension_for(artifact)
+        artifacts.append(artifact)
+        previous = result["content"]
+
+    close_button = (await REGISTRY.probe(page, "close_button", visible=True))["close_button"]
+    if close_button:
+        await page.locator(close_button["selector"]).first.click()
+    await wait_for_input_ready(page)
+    return artifacts
+
+
+def artifact_name(index, artifact):
+    """artifact_code.ext for the first artifact of a turn, artifact_code_K.ext after that."""
+    suffix = "" if index == 0 else f"_{index + 1}"
+    return f"artifact_code{suffix}{artifact.get('extension') or extension_for(artifact)}"
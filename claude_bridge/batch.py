@@ -0,0 +1,300 @@
+"""JSONL batch runner with checkpointing, so long runs can be resumed.
+
+Input is one JSON object per line with an id, a prompt and an optional
+conversation-group key:
+
+    {"id": "q1", "prompt": "Explain generators"}
+    {"id": "q2", "prompt": "Write a parser", "group": "parser"}
+    {"id": "q3", "prompt": "Now add tests for it", "group": "parser"}
+
+Prompts sharing a group run in one chat, in file order. Every other prompt
+gets a fresh chat. Results are appended to the output JSONL as they finish and
+fsync'd in batches, on the writer's own thread so a slow disk never stalls
+the tabs. After each sync the ids just made durable are appended to
+a small checkpoint file (`<output>.ckpt`) together with their chat URL. A
+restarted run skips those ids and reopens a half-finished group's chat. With
+`--cache`, ungrouped prompts answered before come from the response cache.
+When claude.ai reports a usage limit the run pauses until the reset time, and
+`--rate` caps submissions per minute. With `--rotate`, a long group moves to a
+fresh chat once its tab grows too large, carrying its last exchanges over.
+
+    python -m claude_bridge.batch prompts.jsonl results.jsonl --tabs 2
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import time
+
+from playwright.async_api import async_playwright
+
+from .blocking import add_blocking_arguments, profile_from_args
+from .cache import ResponseCache
+from .composer import wait_for_input_ready
+from .pool import TabPool
+from .quota import add_quota_arguments, scheduler_from_args
+from .rotation import ConversationRotator, add_rotation_arguments, rotation_policy_from_args
+from .session import CDP_URL
+
+
+def read_prompts(path, id_field="id", prompt_field="prompt", group_field="group"):
+    """Reads the prompt JSONL into dicts with `id`, `prompt` and `group` keys."""
+    items = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            item_id = str(record.get(id_field, line_number))
+            if item_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {item_id!r}")
+            seen.add(item_id)
+            items.append({
+                "id": item_id,
+                "prompt": record[prompt_field],
+                "group": record.get(group_field),
+            })
+    return items
+
+
+def _read_jsonl(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash can leave a torn last line; it was never checkpointed.
+                continue
+    return records
+
+
+def load_checkpoint(output_path, checkpoint_path=None):
+    """Returns ({id: chat_url} of completed ids, {group: last chat_url}).
+
+    Falls back to scanning the output file when there is no checkpoint yet.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".ckpt"
+    if os.path.exists(checkpoint_path):
+        records = _read_jsonl(checkpoint_path)
+    else:
+        records = [r for r in _read_jsonl(output_path) if r.get("success")]
+    done = {}
+    groups = {}
+    for record in records:
+        done[record["id"]] = record.get("url")
+        if record.get("group") is not None:
+            groups[record["group"]] = record.get("url")
+    return done, groups
+
+
+class CheckpointWriter:
+    """Appends results to the output JSONL and checkpoints them after each fsync.
+
+    On the event loop use `aadd` and `aclose`: they run the writes and fsyncs
+    on the writer's single worker thread, in call order.
+    """
+
+    def __init__(self, output_path, checkpoint_path=None, fsync_every=10, fsync_interval=5.0):
+        self.output = open(output_path, "a", encoding="utf-8")
+        self.checkpoint = open(checkpoint_path or output_path + ".ckpt", "a", encoding="utf-8")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.pending = []
+        self.last_sync = time.monotonic()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-writer")
+
+    def add(self, result):
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        if result["success"]:
+            self.pending.append({"id": result["id"], "group": result["group"], "url": result["url"]})
+        if len(self.pending) >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        # Only ids whose results are durable go into the checkpoint.
+        for entry in self.pending:
+            self.checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+        self.pending = []
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.output.close()
+        self.checkpoint.close()
+
+    async def _run(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def aadd(self, result):
+        """`add` on the writer's thread."""
+        await self._run(self.add, result)
+
+    async def aclose(self):
+        """`close` on the writer's thread; the thread is shut down afterwards."""
+        try:
+            await self._run(self.close)
+        finally:
+            self._executor.shutdown()
+
+
+def plan_units(items, done):
+    """Splits pending items into work units: one per group, one per ungrouped prompt."""
+    units = []
+    by_group = {}
+    for item in items:
+        if item["id"] in done:
+            continue
+        if item["group"] is None:
+            units.append([item])
+        elif item["group"] in by_group:
+            by_group[item["group"]].append(item)
+        else:
+            by_group[item["group"]] = [item]
+            units.append(by_group[item["group"]])
+    return units
+
+
+async def _run_unit(pool, tab, unit, group_urls, writer, cache=None, rotation=None):
+    group = unit[0]["group"]
+    if cache and group is None:
+        entry = await cache.aget(unit[0]["prompt"])
+        if entry:
+            await writer.aadd({
+                "id": unit[0]["id"],
+                "group": None,
+                "success": True,
+                "text": entry["text"],
+                "error": None,
+                "tab": None,
+                "url": None,
+                "cached": True,
+                "elapsed_ms": 0.0,
+                "completed_at": time.time(),
+            })
+            print(f"[{unit[0]['id']}] served from cache")
+            return True
+
+    resume_url = group_urls.get(group) if group is not None else None
+    if resume_url:
+        await pool.prepare(tab, fresh_chat=False)
+        await tab.page.goto(resume_url, wait_until="commit")
+        await wait_for_input_ready(tab.page, timeout=30000)
+    else:
+        await pool.prepare(tab, fresh_chat=True)
+
+    rotator = ConversationRotator(rotation) if rotation and group is not None else None
+    for item in unit:
+        started = time.monotonic()
+        success, text, error = False, None, None
+        try:
+            prompt = rotator.prepare(item["prompt"]) if rotator else item["prompt"]
+            success, text = await pool.send(tab.page, prompt)
+        except Exception as e:
+            error = str(e)
+        if cache and group is None and success and text:
+            await cache.aput(item["prompt"], text)
+        await writer.aadd({
+            "id": item["id"],
+            "group": group,
+            "success": success,
+            "text": text,
+            "error": error,
+            "tab": tab.index,
+            "url": tab.page.url,
+            "cached": False,
+            "elapsed_ms": (time.monotonic() - started) * 1000,
+            "completed_at": time.time(),
+        })
+        print(f"[{item['id']}] {'done' if success else 'FAILED'} in {time.monotonic() - started:.1f}s on tab {tab.index}")
+        if not success:
+            # Later turns in the group depend on this one; leave them for the next run.
+            return False
+        if rotator:
+            # After the result, so its checkpointed URL is the chat that holds the turn.
+            await rotator.maybe_rotate(tab.page, item["prompt"], text)
+    return True
+
+
+async def run_batch(context, input_path, output_path, tabs=1, fsync_every=10, timeout=120000,
+                    id_field="id", prompt_field="prompt", group_field="group", cache=None, scheduler=None,
+                    rotation=None, blocking=None):
+    """Runs every prompt in `input_path` that isn't checkpointed yet. Returns (completed, failed) unit counts."""
+    items = read_prompts(input_path, id_field, prompt_field, group_field)
+    done, group_urls = load_checkpoint(output_path)
+    units = plan_units(items, done)
+    print(f"Batch: {len(items)} prompts, {len(done)} already done, {sum(map(len, units))} to run.")
+    if not units:
+        return 0, 0
+
+    writer = CheckpointWriter(output_path, fsync_every=fsync_every)
+    queue = asyncio.Queue()
+    for unit in units:
+        queue.put_nowait(unit)
+    counts = {"completed": 0, "failed": 0}
+
+    async def worker(pool, tab):
+        while True:
+            try:
+                unit = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                ok = await _run_unit(pool, tab, unit, group_urls, writer, cache, rotation)
+            except Exception as e:
+                print(f"Tab {tab.index} failed on unit starting at {unit[0]['id']}: {e}")
+                ok = False
+            counts["completed" if ok else "failed"] += 1
+
+    try:
+        async with TabPool(context, size=min(tabs, len(units)), timeout=timeout, scheduler=scheduler,
+                           blocking=blocking) as pool:
+            await asyncio.gather(*(worker(pool, tab) for tab in pool.tabs))
+    finally:
+        await writer.aclose()
+    print(f"Batch finished: {counts['completed']} units completed, {counts['failed']} failed.")
+    return counts["completed"], counts["failed"]
+
+
+async def _main(args):
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(CDP_URL)
+        blocking = profile_from_args(args)
+        scheduler = scheduler_from_args(args)
+        await run_batch(browser.contexts[0], args.input, args.output, tabs=args.tabs,
+                        fsync_every=args.fsync_every, timeout=args.timeout,
+                        id_field=args.id_field, prompt_field=args.prompt_field, group_field=args.group_field,
+                        cache=ResponseCache() if args.cache else None, scheduler=scheduler,
+                        rotation=rotation_policy_from_args(args), blocking=blocking)
+        print(scheduler.summary())
+        if blocking:
+            print(blocking.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through claude.ai with resume support.")
+    parser.add_argument("input", help="Prompt JSONL file.")
+    parser.add_argument("output", help="Result JSONL file (appended to; <output>.ckpt holds the checkpoint).")
+    parser.add_argument("--tabs", type=int, default=1, help="Number of tabs to run units on concurrently.")
+    parser.add_argument("--fsync-every", type=int, default=10, help="Results per fsync of output and checkpoint.")
+    parser.add_argument("--timeout", type=int, default=120000, help="Response timeout in ms.")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--prompt-field", default="prompt")
+    parser.add_argument("--group-field", default="group")
+    parser.add_argument("--cache", action="store_true", help="Serve repeated ungrouped prompts from the response cache.")
+    add_blocking_arguments(parser)
+    add_quota_arguments(parser)
+    add_rotation_arguments(parser)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
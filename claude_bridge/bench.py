@@ -0,0 +1,344 @@
+"""Offline benchmark of the bridge against a local stand-in for claude.ai.
+
+A headless Chromium is launched and every https://claude.ai/ request is
+answered through `context.route` with MOCK_PAGE_HTML. The mock copies the
+parts of the real page the bridge depends on: the contenteditable composer,
+the "Send message" button, `[data-is-streaming]` groups holding a
+`div.font-claude-message`, the `action-bar-copy` icon, "Preview contents"
+artifact buttons and a CodeMirror-like canvas with its editor state. Answers
+are streamed at a configurable token rate, so no account or quota is needed.
+
+Each scenario runs the library's `send_and_wait` (and `extract_artifacts` for
+artifact turns) and reports turns/sec, time to first token, completion
+detection lag (from the mock finishing a turn to `send_and_wait` returning),
+the per-phase spans and memory:
+
+    python -m claude_bridge.bench                          # all scenarios
+    python -m claude_bridge.bench --scenarios short,long --token-rate 2000
+    python -m claude_bridge.bench --json bench.json
+
+Run it before and after a change to `runner.send_message_and_wait` or
+`runner.extract_artifact_code` to compare them on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+
+from playwright.async_api import async_playwright
+
+from .artifacts import extract_artifacts
+from .completion import send_and_wait
+from .composer import wait_for_input_ready
+from .metrics import METRICS, QUANTILES, _quantile, count_driver_calls
+
+MOCK_URL = "https://claude.ai/new"
+
+# name -> turns, answer length, artifacts per turn, artifact length, prompt length
+SCENARIOS = {
+    "short": {"turns": 20, "chars": 400, "artifacts": 0, "artifact_chars": 0, "prompt_chars": 0},
+    "long": {"turns": 3, "chars": 50000, "artifacts": 0, "artifact_chars": 0, "prompt_chars": 0},
+    "artifacts": {"turns": 10, "chars": 800, "artifacts": 2, "artifact_chars": 6000, "prompt_chars": 0},
+    "conversation": {"turns": 200, "chars": 300, "artifacts": 0, "artifact_chars": 0, "prompt_chars": 0},
+    "large_prompt": {"turns": 5, "chars": 400, "artifacts": 0, "artifact_chars": 0, "prompt_chars": 150000},
+}
+
+MOCK_PAGE_HTML = """<!DOCTYPE html>
+<html>
+<head><title>Claude</title></head>
+<body>
+<main id="thread"></main>
+<section id="canvas" hidden>
+    <button aria-label="Close">Close</button>
+    <div class="cm-editor"><div class="cm-content" data-language="python"></div></div>
+</section>
+<fieldset>
+    <div contenteditable="true"></div>
+    <button aria-label="Send message">Send</button>
+</fieldset>
+<script>
+(() => {
+    const config = Object.assign({
+        tokenRate: 1000, charsPerToken: 4, firstTokenMs: 300, responseChars: 400,
+        artifacts: 0, artifactChars: 0, renderedLines: 40,
+    }, window.__mockConfig || {});
+    const state = window.__mock = {turns: []};
+    const thread = document.getElementById('thread');
+    const canvas = document.getElementById('canvas');
+    const editor = canvas.querySelector('.cm-content');
+    const composer = document.querySelector('div[contenteditable="true"]');
+    const sendButton = document.querySelector('button[aria-label="Send message"]');
+    const now = () => performance.timeOrigin + performance.now();
+    const WORDS = ['the', 'bridge', 'streams', 'tokens', 'into', 'a', 'message', 'while',
+                   'observers', 'watch', 'for', 'completion', 'and', 'code', 'blocks'];
+
+    const words = (length, seed) => {
+        const out = [];
+        let size = 0;
+        for (let i = 0; size < length; i++) {
+            const word = WORDS[(i * 7 + seed) % WORDS.length];
+            const sep = i % 60 === 59 ? '\\n\\n' : ' ';
+            out.push(word + sep);
+            size += word.length + sep.length;
+        }
+        return out.join('').slice(0, length);
+    };
+
+    const source = (length, seed) => {
+        const lines = [];
+        let size = 0;
+        for (let i = 0; size < length; i++) {
+            const line = `def step_${seed}_${i}(value):\\n    return value * ${i} + ${seed}`;
+            lines.push(line);
+            size += line.length + 1;
+        }
+        return lines.join('\\n');
+    };
+
+    const openArtifact = (code) => {
+        // Like CodeMirror, only part of the document is rendered; the full text
+        // is in the editor state hanging off .cm-content.
+        editor.replaceChildren(...code.split('\\n').slice(0, config.renderedLines).map((text) => {
+            const line = document.createElement('div');
+            line.className = 'cm-line';
+            line.textContent = text;
+            return line;
+        }));
+        editor.cmView = {view: {state: {doc: {toString: () => code}}}};
+        canvas.hidden = false;
+    };
+
+    const finish = (turn, group, message) => {
+        for (let i = 0; i < config.artifacts; i++) {
+            const code = source(config.artifactChars, turn.index * 10 + i);
+            const button = document.createElement('button');
+            button.setAttribute('aria-label', 'Preview contents');
+            button.textContent = `step_${turn.index}_${i}.py`;
+            button.addEventListener('click', () => openArtifact(code));
+            message.appendChild(button);
+        }
+        const bar = document.createElement('div');
+        bar.innerHTML = '<button><svg data-testid="action-bar-copy"></svg></button>';
+        group.appendChild(bar);
+        group.setAttribute('data-is-streaming', 'false');
+        turn.done = now();
+    };
+
+    const respond = (prompt) => {
+        const turn = {index: state.turns.length, prompt_chars: prompt.length, sent: now(), first: null, done: null};
+        state.turns.push(turn);
+
+        const user = document.createElement('div');
+        user.className = 'font-user-message';
+        user.textContent = prompt;
+        thread.appendChild(user);
+
+        const group = document.createElement('div');
+        group.setAttribute('data-is-streaming', 'true');
+        group.setAttribute('data-scroll-anchor', 'true');
+        const message = document.createElement('div');
+        message.className = 'font-claude-message';
+        group.appendChild(message);
+        thread.appendChild(group);
+
+        const text = words(config.responseChars, turn.index);
+        const charsPerMs = config.tokenRate * config.charsPerToken / 1000;
+        let written = 0;
+        let paragraph = null;
+        let started = null;
+
+        const tick = () => {
+            if (started === null) {
+                started = performance.now();
+                turn.first = now();
+            }
+            const due = Math.min(text.length, Math.max(1, Math.floor((performance.now() - started) * charsPerMs)));
+            for (const piece of text.slice(written, due).split(/(\\n\\n)/)) {
+                if (piece === '\\n\\n' || !paragraph) {
+                    paragraph = document.createElement('p');
+                    message.appendChild(paragraph);
+                    if (piece === '\\n\\n') continue;
+                }
+                if (piece) paragraph.appendChild(document.createTextNode(piece));
+            }
+            written = due;
+            if (written < text.length) setTimeout(tick, 16);
+            else finish(turn, group, message);
+        };
+        setTimeout(tick, config.firstTokenMs);
+    };
+
+    const send = () => {
+        const prompt = composer.innerText;
+        if (!prompt.trim()) return;
+        composer.textContent = '';
+        respond(prompt);
+    };
+    sendButton.addEventListener('click', send);
+    composer.addEventListener('keydown', (event) => {
+        if (event.key === 'Enter' && !event.shiftKey) {
+            event.preventDefault();
+            send();
+        }
+    });
+    canvas.querySelector('button[aria-label="Close"]').addEventListener('click', () => {
+        canvas.hidden = true;
+    });
+})();
+</script>
+</body>
+</html>
+"""
+
+
+def _prompt(turn, length):
+    prompt = f"Benchmark prompt {turn}"
+    if length > len(prompt):
+        line = "    result = transform(value, index)  # refactor me\n"
+        prompt += "\n" + line * ((length - len(prompt)) // len(line) + 1)
+    return prompt[:max(length, len(prompt))]
+
+
+def _percentiles(values):
+    ordered = sorted(v for v in values if v is not None)
+    return {f"p{int(q * 100)}": round(_quantile(ordered, q), 1) if ordered else None for q in QUANTILES}
+
+
+async def _browser_memory(cdp):
+    metrics = await cdp.send("Performance.getMetrics")
+    values = {m["name"]: m["value"] for m in metrics["metrics"]}
+    return {"js_heap_mb": round(values.get("JSHeapUsedSize", 0) / 2**20, 1), "dom_nodes": int(values.get("Nodes", 0))}
+
+
+async def run_scenario(context, name, spec, token_rate=1000, first_token_ms=300, timeout=300000):
+    """Runs one scenario on a fresh mock page and returns its report dict."""
+    config = {
+        "tokenRate": token_rate,
+        "firstTokenMs": first_token_ms,
+        "responseChars": spec["chars"],
+        "artifacts": spec["artifacts"],
+        "artifactChars": spec["artifact_chars"],
+    }
+    page = await context.new_page()
+    await page.add_init_script(f"window.__mockConfig = {json.dumps(config)};")
+    await page.goto(MOCK_URL)
+    await wait_for_input_ready(page)
+    cdp = await context.new_cdp_session(page)
+    await cdp.send("Performance.enable")
+    count_driver_calls(page)
+
+    METRICS.reset()
+    turns = []
+    failures = 0
+    started = time.monotonic()
+    for i in range(spec["turns"]):
+        with METRICS.turn(i + 1) as record:
+            success, text = await send_and_wait(page, _prompt(i + 1, spec["prompt_chars"]), timeout=timeout)
+            returned = time.time()
+            artifacts = await extract_artifacts(page) if spec["artifacts"] and success else []
+        if not success:
+            failures += 1
+            continue
+        mock = await page.evaluate("() => window.__mock.turns[window.__mock.turns.length - 1]")
+        observed_first = next((s["duration_ms"] for s in record["spans"] if s["phase"] == "first_token"), None)
+        turns.append({
+            "ttft_ms": observed_first,
+            "detection_lag_ms": returned * 1000 - mock["done"],
+            "total_ms": record["total_ms"],
+            "chars": len(text or ""),
+            "artifacts": len(artifacts),
+        })
+        if spec["artifacts"] and len(artifacts) != spec["artifacts"]:
+            print(f"[{name}] turn {i + 1}: expected {spec['artifacts']} artifacts, got {len(artifacts)}")
+    elapsed = time.monotonic() - started
+
+    report = {
+        "scenario": name,
+        **spec,
+        "token_rate": token_rate,
+        "completed": len(turns),
+        "failed": failures,
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(len(turns) / elapsed, 3) if elapsed else None,
+        "ttft_ms": _percentiles(t["ttft_ms"] for t in turns),
+        "detection_lag_ms": _percentiles(t["detection_lag_ms"] for t in turns),
+        "turn_ms": _percentiles(t["total_ms"] for t in turns),
+        "phases": METRICS.summary(),
+        "driver_calls": sum(METRICS.driver_calls.values()),
+        **await _browser_memory(cdp),
+        "python_max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if len(turns) >= 40:
+        # Shows whether turns slow down as the conversation grows.
+        report["first_20_turn_ms"] = _percentiles(t["total_ms"] for t in turns[:20])
+        report["last_20_turn_ms"] = _percentiles(t["total_ms"] for t in turns[-20:])
+    await cdp.detach()
+    await page.close()
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['scenario']}: {report['completed']}/{report['turns']} turns "
+          f"of {report['chars']} chars in {report['elapsed_s']}s ({report['turns_per_s']} turns/s)")
+    for key in ("ttft_ms", "detection_lag_ms", "turn_ms", "first_20_turn_ms", "last_20_turn_ms"):
+        if key in report:
+            values = "  ".join(f"{q}={v}" for q, v in report[key].items())
+            print(f"   {key:<18} {values}")
+    for phase, stats in report["phases"].items():
+        print(f"   phase {phase:<12} n={stats['count']:<4} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+    print(f"   memory: JS heap {report['js_heap_mb']} MB, {report['dom_nodes']} DOM nodes, "
+          f"python max RSS {report['python_max_rss_mb']} MB")
+
+
+async def run_benchmarks(names, token_rate=1000, first_token_ms=300, turns=None, headed=False):
+    """Launches Chromium, serves the mock page and runs the named scenarios. Returns their reports."""
+    reports = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not headed)
+        context = await browser.new_context()
+
+        async def serve(route):
+            if route.request.resource_type == "document":
+                await route.fulfill(status=200, content_type="text/html", body=MOCK_PAGE_HTML)
+            else:
+                await route.abort()
+
+        await context.route("https://claude.ai/**", serve)
+        try:
+            for name in names:
+                spec = dict(SCENARIOS[name])
+                if turns:
+                    spec["turns"] = turns
+                report = await run_scenario(context, name, spec, token_rate, first_token_ms)
+                print_report(report)
+                reports.append(report)
+        finally:
+            await browser.close()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bridge against a local mock of claude.ai.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)}).")
+    parser.add_argument("--token-rate", type=int, default=1000, help="Tokens per second the mock streams.")
+    parser.add_argument("--first-token-ms", type=int, default=300, help="Mock delay before the first token.")
+    parser.add_argument("--turns", type=int, help="Override the number of turns of every scenario.")
+    parser.add_argument("--headed", action="store_true", help="Show the browser window.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the reports to this JSON file.")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    reports = asyncio.run(run_benchmarks(names, args.token_rate, args.first_token_ms, args.turns, args.headed))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nReports written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
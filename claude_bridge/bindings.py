@@ -0,0 +1,105 @@
+"""A single page binding shared by every in-page observer the bridge injects.
+
+`page.expose_binding` can only register a name once per page, so instead of one
+binding per feature we expose one dispatcher and route calls by token. Observer
+scripts call ``window.__claudeBridgeEmit(token, kind, payload)`` and the
+handler registered for ``token`` receives ``(kind, payload)``.
+
+The in-page helper functions (selector probes, the completion observer, the
+document walker, ...) are registered here too. `install_helpers(page)` puts
+them on ``window.__claudeBridgeHelpers`` once, through an init script on that
+page so they survive its navigations. The script only runs in the top frame
+of claude.ai documents; the user's other tabs and sites never see it. After
+that `helper(page, name)` is a one-line call instead of the function's full
+source on every evaluate.
+"""
+import itertools
+import json
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+BINDING_NAME = "__claudeBridgeEmit"
+HELPERS_GLOBAL = "__claudeBridgeHelpers"
+
+_handlers = weakref.WeakKeyDictionary()  # page -> {token: callback}
+_tokens = itertools.count(1)
+_helpers = {}  # name -> JS function source, registered by the module that defines it
+_init_helpers = weakref.WeakKeyDictionary()  # page -> names its init script installs
+_page_helpers = weakref.WeakKeyDictionary()  # page -> names installed in its current document
+
+
+def _dispatch(source, token, kind, payload=None):
+    page = source.get("page")
+    handlers = _handlers.get(page)
+    if not handlers:
+        return
+    callback = handlers.get(token)
+    if callback:
+        callback(kind, payload)
+
+
+async def ensure_binding(page) -> bool:
+    """Exposes the dispatcher binding on the page once. Returns False if it can't be installed."""
+    if page in _handlers:
+        return True
+    try:
+        await page.expose_binding(BINDING_NAME, _dispatch)
+    except Exception as e:
+        logger.warning("Could not expose bridge binding: %s", e)
+        return False
+    _handlers[page] = {}
+    return True
+
+
+def add_handler(page, callback) -> int:
+    """Registers a `(kind, payload)` callback and returns the token observers should emit with."""
+    token = next(_tokens)
+    _handlers[page][token] = callback
+    return token
+
+
+def remove_handler(page, token):
+    handlers = _handlers.get(page)
+    if handlers:
+        handlers.pop(token, None)
+
+
+def register_helper(name, source):
+    """Makes the JS function `source` installable as helper `name`."""
+    _helpers[name] = source
+
+
+def helper(page, name):
+    """The function to evaluate for helper `name`: a short call if it is installed on `page`, else its source."""
+    if name in _page_helpers.get(page, ()):
+        return f"(arg) => window.{HELPERS_GLOBAL}[{json.dumps(name)}](arg)"
+    return _helpers[name]
+
+
+def _helpers_script(names):
+    """An expression that installs the helpers and is true on a top-level claude.ai document, false elsewhere."""
+    entries = ",\n".join(f"{json.dumps(name)}: ({_helpers[name]})" for name in names)
+    return (f"(window === window.top && /(^|\\.)claude\\.ai$/.test(location.hostname)) && "
+            f"!!(window.{HELPERS_GLOBAL} = Object.assign(window.{HELPERS_GLOBAL} || {{}}, {{\n{entries}\n}}))")
+
+
+async def install_helpers(page) -> bool:
+    """Installs every registered helper on the page, now and for its later documents. Returns False on failure."""
+    names = frozenset(_helpers)
+    if _page_helpers.get(page) == names:
+        return True
+    script = _helpers_script(sorted(names))
+    try:
+        if _init_helpers.get(page) != names:
+            await page.add_init_script(script)
+            _init_helpers[page] = names
+        installed = await page.evaluate(f"() => {script}")
+    except Exception as e:
+        logger.warning("Could not install bridge helpers: %s", e)
+        return False
+    if not installed:
+        return False
+    _page_helpers[page] = names
+    return True
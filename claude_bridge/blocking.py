@@ -0,0 +1,125 @@
+"""Blocking non-essential requests on the automation tabs.
+
+claude.ai loads analytics, telemetry beacons, fonts and images that the bridge
+never looks at. They cost bandwidth and CPU on shared automation hosts.
+`BlockingProfile` aborts them with `route()`. Only URLs matching the deny
+regex are routed at all, so every other request stays inside the browser and
+costs nothing extra. Allow patterns win over deny patterns, so the chat API
+and the app's own scripts are never blocked.
+
+Bytes saved are estimated per resource type, because an aborted response
+never reports its size.
+"""
+import collections
+import re
+
+DEFAULT_DENY = (
+    # Analytics, telemetry and error reporting
+    r"google-analytics\.com", r"googletagmanager\.com", r"segment\.(io|com)", r"sentry\.io",
+    r"intercom(cdn)?\.(io|com)", r"statsig", r"datadoghq", r"honeycomb\.io", r"/api/event_logging",
+    r"/_vercel/insights", r"/cdn-cgi/rum",
+    # Images, fonts and media
+    r"/_next/image", r"\.(png|jpe?g|gif|webp|avif|ico|svg)(\?|$)",
+    r"\.(woff2?|ttf|otf|eot)(\?|$)", r"\.(mp4|webm|mp3|wav)(\?|$)",
+)
+DEFAULT_ALLOW = (
+    r"claude\.ai/api/organizations/",
+    r"claude\.ai/api/auth",
+)
+
+# Typical sizes, used to estimate what a blocked request would have cost.
+ESTIMATED_BYTES = {
+    "image": 25_000,
+    "font": 40_000,
+    "media": 500_000,
+    "script": 60_000,
+    "xhr": 2_000,
+    "fetch": 2_000,
+    "beacon": 1_000,
+    "ping": 500,
+}
+
+
+class BlockingProfile:
+    """Aborts requests matching `deny` (regex fragments) unless they match `allow`."""
+
+    def __init__(self, deny=DEFAULT_DENY, allow=DEFAULT_ALLOW):
+        self.deny = list(deny)
+        self.allow = list(allow)
+        self._deny_re = re.compile("|".join(f"(?:{pattern})" for pattern in self.deny))
+        self._allow_re = re.compile("|".join(f"(?:{pattern})" for pattern in self.allow)) if self.allow else None
+        self.blocked = collections.Counter()  # resource type -> requests aborted
+        self.passed = 0  # matched the deny list but were allowed through
+        self.bytes_saved = 0
+        self._targets = []
+
+    @classmethod
+    def from_args(cls, extra_deny=(), extra_allow=()):
+        return cls(deny=DEFAULT_DENY + tuple(extra_deny), allow=DEFAULT_ALLOW + tuple(extra_allow))
+
+    def should_block(self, url):
+        if self._allow_re and self._allow_re.search(url):
+            return False
+        return bool(self._deny_re.search(url))
+
+    async def _handle(self, route):
+        request = route.request
+        if not self.should_block(request.url):
+            self.passed += 1
+            await route.fallback()
+            return
+        self.blocked[request.resource_type] += 1
+        self.bytes_saved += ESTIMATED_BYTES.get(request.resource_type, 5_000)
+        await route.abort("blockedbyclient")
+
+    async def apply(self, target):
+        """Starts blocking on a page, or on a whole browser context the bridge launched itself.
+
+        Apply it to the automation pages of a connected Chrome, never to its
+        context: that would block images and fonts in every tab the user has open.
+        """
+        if target not in self._targets:
+            await target.route(self._deny_re, self._handle)
+            self._targets.append(target)
+        return self
+
+    async def remove(self, *targets):
+        """Stops blocking on `targets`, or on everything it was applied to."""
+        for target in targets or list(self._targets):
+            if target not in self._targets:
+                continue
+            self._targets.remove(target)
+            try:
+                await target.unroute(self._deny_re, self._handle)
+            except Exception:
+                pass
+
+    def stats(self):
+        return {
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "passed": self.passed,
+            "bytes_saved_estimate": self.bytes_saved,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        by_type = ", ".join(f"{kind} {count}" for kind, count in sorted(self.blocked.items())) or "none"
+        return (f"Blocked {stats['blocked']} requests ({by_type}), "
+                f"about {stats['bytes_saved_estimate'] / 1024:.0f} KB saved.")
+
+
+def add_blocking_arguments(parser):
+    parser.add_argument("--block", action="store_true",
+                        help="Block analytics, telemetry, fonts and images on the automation tabs.")
+    parser.add_argument("--block-deny", action="append", default=[], metavar="REGEX",
+                        help="Also block URLs matching this regex (implies --block; repeatable).")
+    parser.add_argument("--block-allow", action="append", default=[], metavar="REGEX",
+                        help="Never block URLs matching this regex (repeatable).")
+
+
+def profile_from_args(args):
+    """The BlockingProfile the --block flags ask for, or None."""
+    if not (args.block or args.block_deny):
+        return None
+    return BlockingProfile.from_args(args.block_deny, args.block_allow)
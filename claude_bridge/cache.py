@@ -0,0 +1,187 @@
+"""Content-addressed on-disk response cache.
+
+Entries are keyed by a hash of the normalized prompt plus a hash of the
+conversation context it was asked in (empty for a fresh chat), and stored in
+SQLite together with any extracted artifacts. The cache has a size cap with
+least-recently-used eviction, per-entry TTLs and persistent hit/miss counters.
+
+For multi-turn conversations, chain the context with `chain_context` after
+every turn, so a cached answer is only reused after an identical history.
+
+On the event loop use `aget`, `aput` and `astats`. They run the SQLite work
+on the cache's own single worker thread, so a slow disk or a long eviction
+never stalls the turns of other tabs or daemon clients.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "claude_bridge", "responses.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    artifacts TEXT,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def normalize_prompt(prompt):
+    """Normalizes unicode, line endings and trailing whitespace; indentation is kept."""
+    prompt = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in prompt.strip().split("\n"))
+
+
+def chain_context(context, prompt, response):
+    """Returns the context hash for the turn after (prompt, response)."""
+    digest = hashlib.sha256()
+    for part in (context, normalize_prompt(prompt), response):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Used from the worker thread and, through the sync methods, from the caller's; the lock serializes them.
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(prompt, context=""):
+        return chain_context(context, prompt, "")
+
+    def _count(self, name):
+        self.db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, prompt, context=""):
+        """Returns {"text", "artifacts", "created"} for a live entry, or None."""
+        key = self.key(prompt, context)
+        now = time.time()
+        with self._lock, self.db:
+            row = self.db.execute(
+                "SELECT text, artifacts, created, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[3] is not None and row[3] < now:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if not row:
+                self.misses += 1
+                self._count("misses")
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._count("hits")
+        return {"text": row[0], "artifacts": json.loads(row[1]) if row[1] else [], "created": row[2]}
+
+    def put(self, prompt, text, context="", artifacts=None, ttl=None):
+        key = self.key(prompt, context)
+        artifacts_json = json.dumps(artifacts) if artifacts else None
+        size = len(text.encode("utf-8")) + len((artifacts_json or "").encode("utf-8"))
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, artifacts, size, created, last_used, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, text, artifacts_json, size, now, now, now + ttl if ttl else None),
+            )
+            self._evict()
+
+    def _evict(self):
+        self.db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self.db.execute(
+            "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (evicted,),
+        )
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+            entries, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": counters.get("hits", 0),
+            "total_misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def close(self):
+        self._executor.shutdown()
+        self.db.close()
+
+    async def _run(self, method, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: method(*args, **kwargs))
+
+    async def aget(self, prompt, context=""):
+        """`get` on the cache's worker thread."""
+        return await self._run(self.get, prompt, context)
+
+    async def aput(self, prompt, text, context="", artifacts=None, ttl=None):
+        """`put` on the cache's worker thread."""
+        return await self._run(self.put, prompt, text, context, artifacts, ttl)
+
+    async def astats(self):
+        return await self._run(self.stats)
+
+
+async def get_cached_conversation(cache, prompts):
+    """Returns cached entries for every turn of a conversation, or None if any turn misses."""
+    entries = []
+    context = ""
+    for prompt in prompts:
+        entry = await cache.aget(prompt, context)
+        if not entry:
+            return None
+        entries.append(entry)
+        context = chain_context(context, prompt, entry["text"])
+    return entries
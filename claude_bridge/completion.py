@@ -0,0 +1,170 @@
+"""Event-driven detection of the end of a claude.ai turn.
+
+Instead of polling the DOM from Python, a MutationObserver is armed in the page
+before the message is sent. It remembers how many `[data-is-streaming]` message
+groups existed at that point and fires once a *new* group has stopped streaming
+and shows its copy button, so an older message's button can never satisfy it.
+The result is pushed back through the bridge binding and resolves a future.
+"""
+import asyncio
+import logging
+import time
+
+from .bindings import add_handler, ensure_binding, helper, register_helper, remove_handler, BINDING_NAME
+from .composer import submit_message
+from .metrics import METRICS, span
+from .selectors import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_OBSERVER_JS = """([token, binding, groupSel, copySel, messageSel]) => {
+    const registry = window.__claudeBridgeObservers || (window.__claudeBridgeObservers = {});
+    const baseline = document.querySelectorAll(groupSel).length;
+    const started = performance.now();
+
+    let firstSeen = false;
+
+    const finished = () => {
+        const groups = document.querySelectorAll(groupSel);
+        if (groups.length <= baseline) return null;
+        const last = groups[groups.length - 1];
+        if (!firstSeen && last.textContent) {
+            firstSeen = true;
+            window[binding](token, 'first', {elapsed_ms: performance.now() - started});
+        }
+        if (last.getAttribute('data-is-streaming') !== 'false') return null;
+        if (!last.querySelector(copySel)) return null;
+        const message = last.querySelector(messageSel) || last;
+        return {
+            text: message.textContent,
+            index: groups.length - 1,
+            elapsed_ms: performance.now() - started,
+        };
+    };
+
+    const observer = new MutationObserver(() => {
+        const result = finished();
+        if (!result) return;
+        observer.disconnect();
+        delete registry[token];
+        window[binding](token, 'done', result);
+    });
+    observer.observe(document.body, {
+        childList: true,
+        subtree: true,
+        attributes: true,
+        attributeFilter: ['data-is-streaming', 'data-testid'],
+    });
+    registry[token] = observer;
+    return baseline;
+}"""
+
+DISARM_JS = """(token) => {
+    const registry = window.__claudeBridgeObservers || {};
+    if (registry[token]) {
+        registry[token].disconnect();
+        delete registry[token];
+    }
+}"""
+
+register_helper("armCompletion", COMPLETION_OBSERVER_JS)
+register_helper("disarm", DISARM_JS)
+
+
+class CompletionWaiter:
+    """Handle for one armed completion observer; await `wait()` after sending the message."""
+
+    def __init__(self, page, token, future, baseline, timings, first_seen=None):
+        self.page = page
+        self.token = token
+        self.future = future
+        self.baseline = baseline
+        self.timings = timings  # monotonic "armed" and, once text appears, "first" times
+        self.first_seen = first_seen or asyncio.Event()
+
+    @property
+    def first_token_s(self):
+        """Seconds from arming until the new message first had text, or None."""
+        if "first" not in self.timings:
+            return None
+        return self.timings["first"] - self.timings["armed"]
+
+    async def wait_first(self, timeout_s):
+        """True once the new message has text, False if `timeout_s` passes first."""
+        try:
+            await asyncio.wait_for(self.first_seen.wait(), timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait(self, timeout=60000):
+        """Returns the observer payload (`text`, `index`, `elapsed_ms`) or None on timeout."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.future), timeout / 1000)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            await self.disarm()
+
+    async def disarm(self):
+        remove_handler(self.page, self.token)
+        if self.future.done():
+            return
+        self.future.cancel()
+        try:
+            await self.page.evaluate(helper(self.page, "disarm"), self.token)
+        except Exception:
+            pass
+
+
+async def arm_completion_observer(page):
+    """Arms the in-page observer for the next turn. Returns None if the binding is unavailable."""
+    if not await ensure_binding(page):
+        return None
+
+    future = asyncio.get_running_loop().create_future()
+    timings = {"armed": time.monotonic()}
+    first_seen = asyncio.Event()
+
+    def on_event(kind, payload):
+        if kind == "first":
+            timings["first"] = time.monotonic()
+            first_seen.set()
+        elif kind == "done" and not future.done():
+            first_seen.set()
+            future.set_result(payload)
+
+    token = add_handler(page, on_event)
+    try:
+        baseline = await page.evaluate(
+            helper(page, "armCompletion"),
+            [token, BINDING_NAME, REGISTRY.css("message_group"), REGISTRY.css("copy_button"), REGISTRY.css("message")],
+        )
+    except Exception as e:
+        logger.warning("Could not arm completion observer: %s", e)
+        remove_handler(page, token)
+        return None
+    return CompletionWaiter(page, token, future, baseline, timings, first_seen)
+
+
+async def send_and_wait(page, message, timeout=120000):
+    """Sends `message` with the composer and waits for the observer to report the finished turn.
+
+    Returns (success, response_text) like runner.send_message_and_wait.
+    """
+    waiter = await arm_completion_observer(page)
+    if not waiter:
+        return False, None
+    try:
+        await submit_message(page, message)
+    except Exception:
+        await waiter.disarm()
+        raise
+    with span("completion"):
+        result = await waiter.wait(timeout)
+    if waiter.first_token_s is not None:
+        METRICS.observe("first_token", waiter.first_token_s)
+    if result is None:
+        logger.warning("Timeout: Did not receive a complete new response in time.")
+        return False, None
+    return True, result['text']
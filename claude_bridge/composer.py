@@ -0,0 +1,227 @@
+"""Typing into the claude.ai composer and sending the message.
+
+Prompts are injected in one shot: the editor's contents are selected and
+replaced by a single CDP `Input.insertText`, so the editor handles one input
+event instead of one per keystroke or a clear-then-fill pair. A synthetic
+paste and `locator.fill` are the fallbacks. Afterwards the editor text is
+checked against the prompt by length and SHA-256. Only line breaks are
+normalized for that check, because the editor turns newlines into
+paragraphs: indentation and spaces must match exactly. Prompts above
+ATTACHMENT_THRESHOLD characters are uploaded as a text file attachment
+instead, with a short note in the editor.
+"""
+import hashlib
+import logging
+import re
+import weakref
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from .bindings import helper, register_helper
+from .metrics import span
+from .selectors import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+FILE_INPUT_SELECTOR = 'input[type="file"]'
+
+# Characters above which the prompt is sent as a file instead of typed.
+ATTACHMENT_THRESHOLD = 200_000
+ATTACHMENT_NAME = "prompt.txt"
+ATTACHMENT_NOTE = "The full prompt is in the attached {name}. Follow it exactly as if it had been typed here."
+
+INPUT_READY_JS = """(selector) => {
+    const box = document.querySelector(selector);
+    return !!box && !box.disabled && box.getAttribute('aria-disabled') !== 'true';
+}"""
+
+SELECT_CONTENTS_JS = """(selector) => {
+    const box = document.querySelector(selector);
+    if (!box) return false;
+    box.focus();
+    const range = document.createRange();
+    range.selectNodeContents(box);
+    const selection = window.getSelection();
+    selection.removeAllRanges();
+    selection.addRange(range);
+    return true;
+}"""
+
+PASTE_JS = """([selector, text]) => {
+    const box = document.querySelector(selector);
+    if (!box) return false;
+    const data = new DataTransfer();
+    data.setData('text/plain', text);
+    box.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+    return true;
+}"""
+
+EDITOR_DIGEST_JS = """async (selector) => {
+    const box = document.querySelector(selector);
+    if (!box) return null;
+    const text = box.innerText.replace(/[\\r\\n]+/g, '\\n').replace(/^\\n|\\n$/g, '');
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    const hex = Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+    return {length: text.length, sha256: hex};
+}"""
+
+SEND_ENABLED_JS = """(selector) => {
+    const button = document.querySelector(selector);
+    return !!button && !button.disabled && button.getAttribute('aria-disabled') !== 'true';
+}"""
+
+# No answer is streaming and no stop control is showing.
+CHAT_IDLE_JS = """([groupSel, stopSel]) => {
+    const groups = document.querySelectorAll(groupSel);
+    const last = groups[groups.length - 1];
+    if (last && last.getAttribute('data-is-streaming') === 'true') return false;
+    const stop = document.querySelector(stopSel);
+    return !stop || stop.getClientRects().length === 0;
+}"""
+
+register_helper("inputReady", INPUT_READY_JS)
+register_helper("selectContents", SELECT_CONTENTS_JS)
+register_helper("paste", PASTE_JS)
+register_helper("editorDigest", EDITOR_DIGEST_JS)
+register_helper("sendEnabled", SEND_ENABLED_JS)
+register_helper("chatIdle", CHAT_IDLE_JS)
+
+_cdp_sessions = weakref.WeakKeyDictionary()  # page -> CDPSession, or None if unavailable
+
+
+def _digest(text):
+    # Same normalization as EDITOR_DIGEST_JS: runs of line breaks become one, leading and trailing ones go.
+    normalized = re.sub(r"[\r\n]+", "\n", text).strip("\n")
+    return {
+        "length": len(normalized.encode("utf-16-le")) // 2,  # JavaScript string length
+        "sha256": hashlib.sha256(normalized.encode("utf-8")).hexdigest(),
+    }
+
+
+async def _cdp(page):
+    if page not in _cdp_sessions:
+        try:
+            _cdp_sessions[page] = await page.context.new_cdp_session(page)
+        except Exception:
+            _cdp_sessions[page] = None
+    return _cdp_sessions[page]
+
+
+async def wait_for_input_ready(page, timeout=10000):
+    """Waits until the composer is visible and accepts input."""
+    if not await REGISTRY.wait_for(page, "input", timeout=timeout):
+        raise PlaywrightTimeoutError(f"The composer did not appear within {timeout} ms.")
+    await page.wait_for_function(helper(page, "inputReady"), arg=REGISTRY.selector("input"), timeout=timeout)
+
+
+async def wait_for_chat_idle(page, timeout=10000):
+    """Waits until the last answer has stopped streaming and the composer accepts input.
+
+    This is the check to use between turns instead of a fixed pause.
+    """
+    await page.wait_for_function(helper(page, "chatIdle"), arg=[REGISTRY.css("message_group"), REGISTRY.css("stop_button")],
+                                 timeout=timeout)
+    await wait_for_input_ready(page, timeout)
+
+
+async def editor_matches(page, text):
+    """True if the composer holds `text`, compared by length and hash with only line breaks normalized."""
+    try:
+        actual = await page.evaluate(helper(page, "editorDigest"), REGISTRY.selector("input"))
+    except Exception:
+        return False
+    return actual == _digest(text)
+
+
+async def _insert_text(page, text):
+    cdp = await _cdp(page)
+    if not cdp:
+        return False
+    await page.evaluate(helper(page, "selectContents"), REGISTRY.selector("input"))
+    await cdp.send("Input.insertText", {"text": text})
+    return True
+
+
+async def _paste_text(page, text):
+    await page.evaluate(helper(page, "selectContents"), REGISTRY.selector("input"))
+    return await page.evaluate(helper(page, "paste"), [REGISTRY.selector("input"), text])
+
+
+async def _fill_text(page, text):
+    await page.locator(REGISTRY.selector("input")).fill(text)
+    return True
+
+
+async def insert_message(page, message):
+    """Replaces the composer's contents with `message` in one input event and verifies it.
+
+    Tries CDP Input.insertText, then a synthetic paste, then locator.fill.
+    Returns the method that worked; raises RuntimeError if none did.
+    """
+    for method, insert in (("insert_text", _insert_text), ("paste", _paste_text), ("fill", _fill_text)):
+        try:
+            if not await insert(page, message):
+                continue
+        except Exception as e:
+            logger.warning("Prompt injection via %s failed: %s", method, e)
+            continue
+        if await editor_matches(page, message):
+            return method
+        logger.warning("Prompt injection via %s did not leave the full prompt in the editor.", method)
+    raise RuntimeError(f"Could not put the {len(message)}-character prompt into the composer.")
+
+
+async def attach_message(page, message, timeout=30000, name=ATTACHMENT_NAME):
+    """Uploads `message` as a text file attachment and types a short note pointing at it."""
+    await page.set_input_files(FILE_INPUT_SELECTOR, files=[{
+        "name": name,
+        "mimeType": "text/plain",
+        "buffer": message.encode("utf-8"),
+    }])
+    await insert_message(page, ATTACHMENT_NOTE.format(name=name))
+    # The send button stays disabled until the upload has finished.
+    await page.wait_for_function(helper(page, "sendEnabled"), arg=REGISTRY.selector("send_button"), timeout=timeout)
+
+
+async def enter_message(page, message, attach_over=ATTACHMENT_THRESHOLD):
+    """Puts `message` into the composer, or attaches it above `attach_over` characters. Returns the method used."""
+    with span("fill", chars=len(message)) as attrs:
+        if attach_over and len(message) > attach_over:
+            await attach_message(page, message)
+            attrs["method"] = "attachment"
+        else:
+            attrs["method"] = await insert_message(page, message)
+    return attrs["method"]
+
+
+async def submit_message(page, message, timeout=10000, attach_over=ATTACHMENT_THRESHOLD):
+    """Puts `message` into the composer (or attaches it, above `attach_over` characters) and sends it."""
+    with span("input_ready"):
+        await wait_for_input_ready(page, timeout)
+    await enter_message(page, message, attach_over)
+    await click_send(page, timeout)
+
+
+async def click_send(page, timeout=10000):
+    """Sends what is in the composer with the registry's send button, or Enter if none is clickable."""
+    with span("send"):
+        button = (await REGISTRY.probe(page, "send_button", visible=True))["send_button"]
+        try:
+            if not button:
+                raise PlaywrightTimeoutError("No send button found.")
+            await page.locator(button["selector"]).first.click(timeout=timeout)
+        except PlaywrightTimeoutError:
+            logger.warning("Send button not clickable, pressing Enter instead.")
+            await page.locator(REGISTRY.selector("input")).press('Enter')
+
+
+async def stop_response(page, timeout=5000):
+    """Clicks the composer's stop control to end the answer being generated. Returns True if it was clicked."""
+    button = (await REGISTRY.probe(page, "stop_button", visible=True))["stop_button"]
+    if not button:
+        return False
+    try:
+        await page.locator(button["selector"]).first.click(timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
@@ -0,0 +1,281 @@
+"""Long-lived bridge daemon that keeps the CDP connection and warm claude.ai tabs.
+
+Start it once next to the debugging Chrome:
+
+    python -m claude_bridge.daemon                  # Unix socket at /tmp/claude_bridge.sock
+    python -m claude_bridge.daemon --port 8765      # localhost TCP instead
+    python -m claude_bridge.daemon --tabs 3         # serve three callers at a time
+    python -m claude_bridge.daemon --tabs 3 --hedge # resend slow prompts on an idle tab
+
+Clients send one JSON line and read NDJSON back (see claude_client.py):
+
+    {"op": "prompt", "prompt": "...", "stream": false, "new_chat": true, "timeout": 120000, "cache": true,
+     "document": false}
+    {"op": "health"}
+
+A prompt request answers with `delta`/`reset` lines when `stream` is true and
+always ends with a `final` line. With `document` set, a successful `final`
+line also carries the answer as prose segments and code blocks (see
+document.py). Requests from concurrent callers wait in one queue and are
+served by one worker per tab. With `--cache`, repeated prompts
+in a new chat are answered from the response cache without queueing. With
+`--hedge`, workers take any idle tab instead of owning one, and prompts whose
+first token is late are sent again on a second idle tab (see hedging.py).
+After a usage limit, prompts wait until the reset time shown by claude.ai,
+and a non-streamed prompt that hit the limit is sent again then; `--rate`
+caps submissions per minute (see quota.py).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from playwright.async_api import async_playwright
+
+from .blocking import add_blocking_arguments, profile_from_args
+from .cache import DEFAULT_PATH as DEFAULT_CACHE_PATH, ResponseCache
+from .completion import send_and_wait
+from .document import extract_document
+from .hedging import HedgePolicy, Hedger, add_hedging_arguments
+from .pool import TabPool
+from .quota import add_quota_arguments, scheduler_from_args
+from .session import CDP_URL
+from .streaming import stream_response
+
+DEFAULT_SOCKET = "/tmp/claude_bridge.sock"
+# Prompts can carry whole source files, so allow long request lines.
+LINE_LIMIT = 64 * 1024 * 1024
+
+
+class BridgeDaemon:
+    """Serves prompt requests from a shared queue on the tabs of a TabPool."""
+
+    def __init__(self, context, tabs=1, timeout=120000, cache=None, blocking=None, hedge=None, scheduler=None):
+        self.pool = TabPool(context, size=tabs, fresh_chat=True, timeout=timeout, scheduler=scheduler,
+                            blocking=blocking)
+        self.scheduler = scheduler
+        # Like the scripts and the batch runner: wait out usage limits and resend once they reset.
+        self.send = scheduler.wrap(send_and_wait) if scheduler else send_and_wait
+        self.hedger = Hedger(self.pool, hedge, timeout=timeout) if hedge else None
+        self.context = context
+        self.cache = cache
+        self.blocking = blocking
+        self.timeout = timeout
+        self.queue = asyncio.Queue()
+        self.started = time.monotonic()
+        self.served = 0
+
+    async def start(self):
+        await self.pool.start()
+        if self.hedger:
+            self.workers = [asyncio.create_task(self._worker()) for _ in self.pool.tabs]
+        else:
+            self.workers = [asyncio.create_task(self._worker(tab)) for tab in self.pool.tabs]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await self.pool.close()
+
+    async def _worker(self, tab=None):
+        """Serves requests on `tab`, or on whichever tab the hedger has idle if `tab` is None."""
+        while True:
+            request, out = await self.queue.get()
+            current = tab
+            try:
+                if tab is None and not request.get("stream"):
+                    await self._run_hedged(request, out)
+                else:
+                    current = tab or await self.hedger.acquire()
+                    await self._run_prompt(current, request, out)
+            except Exception as e:
+                print(f"Tab {current.index if current else '?'} failed on a request: {e}")
+                if current:
+                    current.failures += 1
+                await out.put({"type": "final", "complete": False, "text": None, "error": str(e)})
+            finally:
+                if tab is None and current is not None:
+                    self.hedger.release(current)
+                await out.put(None)
+                self.served += 1
+                self.queue.task_done()
+
+    async def _run_prompt(self, tab, request, out):
+        prompt = request["prompt"]
+        timeout = request.get("timeout", self.timeout)
+        await self.pool.prepare(tab, fresh_chat=request.get("new_chat", True))
+        if request.get("stream"):
+            # A stream can't be resent once events went out, so it only waits for quota before sending.
+            if self.scheduler:
+                await self.scheduler.ready(tab.page)
+            async for event in stream_response(tab.page, prompt, timeout=timeout):
+                if event["type"] == "final":
+                    tab.completed += event["complete"]
+                    tab.failures += not event["complete"]
+                    event["tab"] = tab.index
+                    if event["complete"]:
+                        await self._remember(request, event["text"])
+                        if request.get("document"):
+                            event["document"] = await extract_document(tab.page)
+                    else:
+                        event["limit"] = await self._check_limit(tab)
+                await out.put(event)
+            return
+
+        started = time.monotonic()
+        limits_before = self.scheduler.limits_hit if self.scheduler else 0
+        success, text = await self.send(tab.page, prompt, timeout=timeout)
+        tab.completed += success
+        tab.failures += not success
+        if success:
+            await self._remember(request, text)
+        await out.put({
+            "type": "final",
+            "complete": success,
+            "text": text,
+            "elapsed_ms": (time.monotonic() - started) * 1000,
+            "tab": tab.index,
+            # The wrapped send already looked for a limit after each failed attempt.
+            "limit": self.scheduler.last_limit if not success and self.scheduler and
+                     self.scheduler.limits_hit > limits_before else None,
+            "document": await extract_document(tab.page) if success and request.get("document") else None,
+        })
+
+    async def _check_limit(self, tab):
+        """After a failed turn: the usage limit that caused it, if any. Later prompts wait for its reset."""
+        return await self.scheduler.check(tab.page) if self.scheduler else None
+
+    async def _run_hedged(self, request, out):
+        result = await self.hedger.send(request["prompt"], timeout=request.get("timeout", self.timeout),
+                                        fresh_chat=request.get("new_chat", True))
+        if result["success"]:
+            await self._remember(request, result["text"])
+        await out.put({"type": "final", "complete": result["success"], **result})
+
+    def _uses_cache(self, request):
+        return self.cache is not None and request.get("cache", True) and request.get("new_chat", True)
+
+    async def _remember(self, request, text):
+        if text and self._uses_cache(request):
+            await self.cache.aput(request["prompt"], text)
+
+    async def health(self):
+        return {
+            "type": "health",
+            "uptime_s": time.monotonic() - self.started,
+            "queued": self.queue.qsize(),
+            "served": self.served,
+            "tabs": self.pool.health(),
+            "cache": await self.cache.astats() if self.cache else None,
+            "blocking": self.blocking.stats() if self.blocking else None,
+            "hedging": self.hedger.stats() if self.hedger else None,
+            "quota": self.scheduler.stats() if self.scheduler else None,
+        }
+
+    async def handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                await _write_line(writer, {"type": "error", "error": f"Invalid JSON: {e}"})
+                return
+
+            op = request.get("op", "prompt")
+            if op == "health":
+                await _write_line(writer, await self.health())
+                return
+            if op != "prompt" or not isinstance(request.get("prompt"), str):
+                await _write_line(writer, {"type": "error", "error": "Expected {\"op\": \"prompt\", \"prompt\": str}"})
+                return
+
+            if self._uses_cache(request):
+                entry = await self.cache.aget(request["prompt"])
+                if entry:
+                    await _write_line(writer, {"type": "final", "complete": True, "text": entry["text"],
+                                               "elapsed_ms": 0.0, "cached": True})
+                    return
+
+            out = asyncio.Queue()
+            await self.queue.put((request, out))
+            while True:
+                event = await out.get()
+                if event is None:
+                    break
+                await _write_line(writer, event)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The caller went away; the queued prompt still runs to completion.
+            pass
+        finally:
+            writer.close()
+
+
+async def _write_line(writer, payload):
+    writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def serve(socket_path=DEFAULT_SOCKET, port=None, tabs=1, timeout=120000, cache=None, blocking=None,
+                hedge=None, scheduler=None):
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(CDP_URL)
+        daemon = BridgeDaemon(browser.contexts[0], tabs=tabs, timeout=timeout, cache=cache, blocking=blocking,
+                              hedge=hedge, scheduler=scheduler)
+        await daemon.start()
+
+        if port:
+            server = await asyncio.start_server(daemon.handle_client, "127.0.0.1", port, limit=LINE_LIMIT)
+            where = f"127.0.0.1:{port}"
+        else:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(daemon.handle_client, socket_path, limit=LINE_LIMIT)
+            os.chmod(socket_path, 0o600)
+            where = socket_path
+
+        disconnected = asyncio.Event()
+        browser.on("disconnected", lambda _: disconnected.set())
+        print(f"Claude bridge daemon listening on {where} with {tabs} tab(s).")
+        try:
+            async with server:
+                serving = asyncio.create_task(server.serve_forever())
+                await disconnected.wait()
+                print("Browser connection lost, shutting down.", file=sys.stderr)
+                serving.cancel()
+        finally:
+            await daemon.stop()
+            if not port and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep a warm claude.ai bridge running for thin clients.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path to listen on.")
+    parser.add_argument("--port", type=int, help="Listen on this localhost TCP port instead of a Unix socket.")
+    parser.add_argument("--tabs", type=int, default=1, help="Number of tabs serving requests concurrently.")
+    parser.add_argument("--timeout", type=int, default=120000, help="Default response timeout in ms.")
+    parser.add_argument("--cache", action="store_true", help="Answer repeated new-chat prompts from the response cache.")
+    parser.add_argument("--cache-path", default=None, help="SQLite file for the response cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="Response cache size cap in MB.")
+    add_blocking_arguments(parser)
+    add_hedging_arguments(parser)
+    add_quota_arguments(parser)
+    args = parser.parse_args()
+    cache = None
+    if args.cache:
+        cache = ResponseCache(args.cache_path or DEFAULT_CACHE_PATH, max_bytes=args.cache_max_mb * 1024 * 1024)
+    try:
+        hedge = HedgePolicy(percentile=args.hedge_percentile) if args.hedge else None
+        asyncio.run(serve(args.socket, args.port, args.tabs, args.timeout, cache, profile_from_args(args), hedge,
+                          scheduler_from_args(args)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Reading the latest answer as a structured document in one in-page pass.
+
+`textContent` flattens fenced code blocks into the prose around them. Getting
+code out through the artifact canvas costs clicks, clipboard round trips and
+waits. `extract_document` walks the newest message once and returns its prose
+segments and code blocks in order. Each code block carries its language, from
+the `language-*` class or the block's header label. Whether the turn also
+holds a real artifact comes back in the same evaluate, so the canvas is only
+opened when there is something in it.
+
+Filename hints are taken from a first-line comment in the code
+(`# app.py`, `// src/index.ts`) or from a filename at the end of the prose
+just before the block ("Save this as `app.py`:"). A name in the prose only
+counts when it is code-formatted or bold, or when its extension matches the
+block's language, so "for your Next.js app" does not name a Python block.
+"""
+import os
+import re
+
+from .artifacts import LANGUAGE_EXTENSIONS, _guess_language
+from .bindings import helper, register_helper
+from .metrics import span
+from .selectors import REGISTRY
+
+LANGUAGE_ALIASES = {
+    "py": "python",
+    "python3": "python",
+    "js": "javascript",
+    "node": "javascript",
+    "ts": "typescript",
+    "sh": "bash",
+    "zsh": "bash",
+    "console": "bash",
+    "yml": "yaml",
+    "md": "markdown",
+    "c#": "csharp",
+    "cs": "csharp",
+    "rs": "rust",
+    "rb": "ruby",
+    "kt": "kotlin",
+    "golang": "go",
+    "plaintext": "text",
+    "txt": "text",
+}
+KNOWN_EXTENSIONS = set(LANGUAGE_EXTENSIONS.values()) | {".toml", ".ini", ".cfg", ".env", ".dockerfile", ".mjs",
+                                                        ".cjs", ".h", ".hpp", ".vue", ".svelte", ".r", ".lua"}
+
+FILENAME_RE = r"[\w.-]+(?:/[\w.-]+)*\.[A-Za-z0-9]{1,10}"
+COMMENT_FILENAME_RE = re.compile(
+    r"^\s*(?:#|//|/\*|<!--|--|;)\s*(?:file(?:name)?\s*:\s*)?(" + FILENAME_RE + r")\s*(?:\*/|-->)?\s*$",
+    re.IGNORECASE)
+PROSE_FILENAME_RE = re.compile(r"(?:(`|\*\*)|\b)(" + FILENAME_RE + r")(`|\*\*)?")
+FENCE_RE = re.compile(r"^```[ \t]*([\w+#.-]*)[^\n]*\n(.*?)^```[ \t]*$", re.MULTILINE | re.DOTALL)
+
+# root element -> [{type: "prose", text, marked} | {type: "code", language, code}] in document order,
+# where `marked` holds the prose's code-formatted and bold snippets
+SEGMENTS_JS = """(root) => {
+    const segments = [];
+    let prose = [];
+    let marked = [];
+    const flush = () => {
+        const text = prose.join('\\n').replace(/\\n{3,}/g, '\\n\\n').trim();
+        if (text) segments.push({type: 'prose', text, marked});
+        prose = [];
+        marked = [];
+    };
+    // The short label (language name, Copy button) rendered just before a code block's <pre>.
+    const headerLabel = (el) => {
+        if (!el || !['DIV', 'SPAN'].includes(el.tagName) || el.querySelector('pre')) return null;
+        const next = el.nextElementSibling;
+        if (!next || !(next.tagName === 'PRE' || next.querySelector(':scope > pre'))) return null;
+        let label = el.innerText || '';
+        for (const button of el.querySelectorAll('button')) label = label.replace(button.innerText || '', '');
+        label = label.trim();
+        return label.length < 25 && !/\\s/.test(label) ? label : null;
+    };
+    const codeBlock = (pre) => {
+        const code = pre.querySelector('code');
+        let language = null;
+        const match = ((code && code.className) || '').match(/language-([\\w+#.-]+)/);
+        if (match) {
+            language = match[1];
+        } else if (headerLabel(pre.previousElementSibling)) {
+            language = headerLabel(pre.previousElementSibling);
+        } else {
+            // The rendered block has a small header with the language name (and a Copy button).
+            const wrapper = pre.parentElement || pre;
+            for (const el of wrapper.querySelectorAll('div, span')) {
+                if (code && el.contains(code)) continue;
+                const label = (el.textContent || '').trim();
+                if (label && label.length < 25 && !/\\s/.test(label) && label !== 'Copy') {
+                    language = label;
+                    break;
+                }
+            }
+        }
+        return {type: 'code', language: language && language.toLowerCase(), code: (code || pre).textContent};
+    };
+    const walk = (node) => {
+        if (node.nodeType === Node.TEXT_NODE) {
+            if (node.textContent.trim()) prose.push(node.textContent);
+            return;
+        }
+        if (node.nodeType !== Node.ELEMENT_NODE) return;
+        if (node.tagName === 'PRE') {
+            flush();
+            segments.push(codeBlock(node));
+            return;
+        }
+        if (node.tagName === 'BUTTON' || headerLabel(node) !== null) return;
+        if (!node.querySelector('pre')) {
+            const text = node.innerText;
+            if (text && text.trim()) prose.push(text);
+            // innerText drops the backticks and bold markers a filename hint relies on.
+            const emphasized = node.matches('code, strong, b') ? [node] : node.querySelectorAll('code, strong, b');
+            for (const el of emphasized) marked.push(el.textContent.trim());
+            return;
+        }
+        for (const child of node.childNodes) walk(child);
+    };
+    walk(root);
+    flush();
+    return segments;
+}"""
+
+# group element, [[css, text], ...] -> labels of the artifact buttons in the group
+ARTIFACT_LABELS_JS = """(group, strategies) => {
+    for (const [css, text] of strategies) {
+        let buttons;
+        try {
+            buttons = Array.from(group.querySelectorAll(css));
+        } catch (e) {
+            continue;
+        }
+        if (text) buttons = buttons.filter((b) => (b.textContent || '').includes(text));
+        if (buttons.length === 0) continue;
+        return buttons.map((b) => (b.innerText || b.getAttribute('aria-label') || '').trim());
+    }
+    return [];
+}"""
+
+DOCUMENT_JS = """([groupSel, messageSel, artifactStrategies]) => {
+    const segmentsOf = %s;
+    const artifactLabels = %s;
+    const groups = document.querySelectorAll(groupSel);
+    if (groups.length === 0) return null;
+    const group = groups[groups.length - 1];
+    const messages = group.querySelectorAll(messageSel);
+    const root = messages.length ? messages[messages.length - 1] : group;
+    return {segments: segmentsOf(root), artifacts: artifactLabels(group, artifactStrategies), index: groups.length - 1};
+}""" % (SEGMENTS_JS, ARTIFACT_LABELS_JS)
+
+register_helper("document", DOCUMENT_JS)
+
+
+def normalize_language(language):
+    if not language:
+        return None
+    language = language.lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def _safe_path(name):
+    """A relative path inside the output directory, or None."""
+    name = os.path.normpath(name.strip().lstrip("/\\"))
+    if name.startswith("..") or os.path.isabs(name):
+        return None
+    return name
+
+
+def _extension_language(extension):
+    """The language a file extension stands for, or None."""
+    extension = extension.lower()
+    for language, known in LANGUAGE_EXTENSIONS.items():
+        if known == extension:
+            return language
+    return normalize_language(extension[1:]) if extension[1:] in LANGUAGE_ALIASES else None
+
+
+def filename_hint(code, prose_before="", language=None, marked=()):
+    """A filename suggested by the block's first line or the prose right before it, or None.
+
+    A name in the prose is taken when it is code-formatted or bold (backticks
+    or ** in markdown, a `marked` snippet from the DOM) or when its extension
+    matches `language`; never when its extension belongs to another language.
+    """
+    first_line = code.lstrip("\n").split("\n", 1)[0]
+    match = COMMENT_FILENAME_RE.match(first_line)
+    if match and os.path.splitext(match.group(1))[1].lower() in KNOWN_EXTENSIONS:
+        return _safe_path(match.group(1))
+    lines = [line for line in prose_before.splitlines() if line.strip()]
+    if not lines:
+        return None
+    hints = []
+    for opening, hint, closing in PROSE_FILENAME_RE.findall(lines[-1]):
+        extension = os.path.splitext(hint)[1].lower()
+        if extension not in KNOWN_EXTENSIONS:
+            continue
+        hinted = _extension_language(extension)
+        if language and hinted:
+            if hinted == language:
+                hints.append(hint)
+        elif (opening and opening == closing) or hint in marked:
+            hints.append(hint)
+    return _safe_path(hints[-1]) if hints else None
+
+
+def build_document(raw):
+    """Turns DOCUMENT_JS output into {segments, code_blocks, artifacts, text}."""
+    segments = []
+    code_blocks = []
+    prose_before = ""
+    marked = ()
+    for segment in raw["segments"]:
+        if segment["type"] == "prose":
+            segments.append({"type": "prose", "text": segment["text"]})
+            prose_before = segment["text"]
+            marked = segment.get("marked") or ()
+            continue
+        code = segment["code"]
+        label = normalize_language(segment.get("language"))
+        language = label or _guess_language(None, code)
+        hint = filename_hint(code, prose_before, language, marked)
+        if hint and not label:
+            language = _guess_language(hint, code) or language
+        extension = os.path.splitext(hint)[1] if hint else LANGUAGE_EXTENSIONS.get(language or "", ".txt")
+        block = {"type": "code", "index": len(code_blocks), "language": language, "filename": hint,
+                 "extension": extension, "code": code}
+        segments.append(block)
+        code_blocks.append(block)
+        prose_before = ""
+        marked = ()
+    text = "\n\n".join(s["text"] if s["type"] == "prose" else f"```{s['language'] or ''}\n{s['code'].rstrip()}\n```"
+                       for s in segments)
+    return {"segments": segments, "code_blocks": code_blocks, "artifacts": raw["artifacts"],
+            "index": raw.get("index"), "text": text}
+
+
+def document_from_markdown(text, artifacts=()):
+    """The same document structure, built from an answer's markdown (e.g. from the API) instead of the DOM."""
+    segments = []
+    position = 0
+    for match in FENCE_RE.finditer(text or ""):
+        prose = text[position:match.start()].strip()
+        if prose:
+            segments.append({"type": "prose", "text": prose})
+        segments.append({"type": "code", "language": match.group(1) or None, "code": match.group(2)})
+        position = match.end()
+    prose = (text or "")[position:].strip()
+    if prose:
+        segments.append({"type": "prose", "text": prose})
+    return build_document({"segments": segments, "artifacts": list(artifacts)})
+
+
+async def document_snapshot(page):
+    """The raw segments and artifact labels of the newest answer, or None. `build_document` parses them."""
+    with span("document_extraction"):
+        return await page.evaluate(helper(page, "document"), [
+            REGISTRY.css("message_group"),
+            REGISTRY.css("message"),
+            [list(option) for option in REGISTRY.ordered("artifact_button")],
+        ])
+
+
+async def extract_document(page):
+    """The newest answer as {segments, code_blocks, artifacts, text} in one evaluate, or None."""
+    raw = await document_snapshot(page)
+    if raw is None:
+        return None
+    document = build_document(raw)
+    print(f"Answer has {len(document['code_blocks'])} code block(s) and {len(document['artifacts'])} artifact(s).")
+    return document
+
+
+def code_block_name(block):
+    """The block's hinted filename, or code_K.ext when it has none."""
+    if block.get("filename"):
+        return block["filename"].replace(os.sep, "_")
+    return f"code_{block['index'] + 1}{block['extension']}"
@@ -0,0 +1,356 @@
+"""Exporting whole conversations in one pass.
+
+`export_conversation(page)` fetches the conversation's backing JSON from
+claude.ai's API with one `fetch` made inside the page. That request carries
+the page's own session. The JSON holds every human and assistant turn, and
+artifact contents come from the artifact tool calls in it. If the API can't
+be reached, one in-page DOM pass collects every turn instead. Each answer is
+split into prose and code blocks the same way as `document.py`. In that mode
+only artifact titles are available.
+
+The result is written as it is produced:
+
+- `.jsonl`: one header line, then one line per turn.
+- `.jsonl.gz`: the same, gzip-compressed.
+- `.zip`: `conversation.jsonl` plus every code block and artifact as its own file.
+
+Archive many chats at once with the CLI:
+
+    python -m claude_bridge.export archive/ --all
+    python -m claude_bridge.export archive/ https://claude.ai/chat/<id> --format zip
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+import zipfile
+
+from playwright.async_api import async_playwright
+
+from .artifacts import LANGUAGE_EXTENSIONS
+from .document import ARTIFACT_LABELS_JS, SEGMENTS_JS, build_document, document_from_markdown
+from .metrics import span
+from .selectors import REGISTRY
+from .session import CDP_URL, find_claude_page
+
+CONVERSATION_ID_RE = re.compile(r"/chat/([0-9a-fA-F-]{36})")
+
+FETCH_JSON_JS = """async (url) => {
+    const response = await fetch(url, {credentials: 'include', headers: {accept: 'application/json'}});
+    if (!response.ok) return {status: response.status, body: null};
+    return {status: response.status, body: await response.json()};
+}"""
+
+ORG_FROM_COOKIE_JS = """() => {
+    const match = document.cookie.match(/(?:^|;\\s*)lastActiveOrg=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : null;
+}"""
+
+EXPORT_DOM_JS = """([userSel, groupSel, messageSel, artifactStrategies]) => {
+    const segmentsOf = %s;
+    const artifactLabels = %s;
+    const turns = [];
+    // One combined query returns human and assistant turns in document order.
+    for (const el of document.querySelectorAll(userSel + ', ' + groupSel)) {
+        if (el.matches(userSel)) {
+            turns.push({role: 'human', text: el.innerText});
+            continue;
+        }
+        const messages = el.querySelectorAll(messageSel);
+        const root = messages.length ? messages[messages.length - 1] : el;
+        turns.push({role: 'assistant', segments: segmentsOf(root), artifacts: artifactLabels(el, artifactStrategies)});
+    }
+    return {title: document.title, turns};
+}""" % (SEGMENTS_JS, ARTIFACT_LABELS_JS)
+
+# Artifact MIME types -> language, for naming exported artifact files.
+ARTIFACT_TYPE_LANGUAGES = {
+    "text/html": "html",
+    "image/svg+xml": "svg",
+    "text/markdown": "markdown",
+    "application/vnd.ant.react": "jsx",
+    "application/vnd.ant.mermaid": "mermaid",
+}
+
+
+def conversation_id(url):
+    match = CONVERSATION_ID_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+async def _api(page, path):
+    result = await page.evaluate(FETCH_JSON_JS, path)
+    if result["status"] >= 400 or result["body"] is None:
+        raise RuntimeError(f"GET {path} returned {result['status']}")
+    return result["body"]
+
+
+async def organization_id(page):
+    """The active organization: the lastActiveOrg cookie, else the first organization the API lists."""
+    org = await page.evaluate(ORG_FROM_COOKIE_JS)
+    if org:
+        return org
+    organizations = await _api(page, "/api/organizations")
+    if not organizations:
+        raise RuntimeError("No organizations visible to this session.")
+    return organizations[0]["uuid"]
+
+
+async def list_conversations(page, org=None):
+    """[{uuid, name, updated_at, ...}] for every conversation in the organization, newest first."""
+    org = org or await organization_id(page)
+    conversations = await _api(page, f"/api/organizations/{org}/chat_conversations")
+    return sorted(conversations, key=lambda c: c.get("updated_at") or "", reverse=True)
+
+
+async def fetch_conversation(page, conversation=None, org=None):
+    """The conversation's backing JSON, including every message and tool call."""
+    conversation = conversation or conversation_id(page.url)
+    if not conversation:
+        raise RuntimeError(f"{page.url} is not a conversation URL.")
+    org = org or await organization_id(page)
+    return await _api(page, f"/api/organizations/{org}/chat_conversations/{conversation}"
+                            "?tree=True&rendering_mode=messages&render_all_tools=true")
+
+
+def _current_branch(messages, leaf):
+    """The messages on the path to `leaf`, oldest first; all of them if there is no leaf."""
+    by_uuid = {message.get("uuid"): message for message in messages}
+    if not leaf or leaf not in by_uuid:
+        return messages
+    branch = []
+    while leaf in by_uuid:
+        branch.append(by_uuid[leaf])
+        leaf = by_uuid[leaf].get("parent_message_uuid")
+    return branch[::-1]
+
+
+def _apply_artifact(artifacts, call):
+    """Folds one artifacts tool call (create/rewrite/update) into {id: artifact}."""
+    artifact_id = call.get("id") or call.get("title") or str(len(artifacts))
+    current = artifacts.get(artifact_id)
+    command = call.get("command", "create")
+    if command == "update" and current:
+        current["content"] = current["content"].replace(call.get("old_str", ""), call.get("new_str", ""), 1)
+        return current
+    language = call.get("language") or ARTIFACT_TYPE_LANGUAGES.get(call.get("type"))
+    artifact = {
+        "id": artifact_id,
+        "title": call.get("title") or (current or {}).get("title") or artifact_id,
+        "type": call.get("type") or (current or {}).get("type"),
+        "language": language or (current or {}).get("language"),
+        "content": call.get("content") or "",
+    }
+    artifact["extension"] = LANGUAGE_EXTENSIONS.get((artifact["language"] or "").lower(), ".txt")
+    artifacts[artifact_id] = artifact
+    return artifact
+
+
+def turns_from_api(raw):
+    """Turn dicts from the conversation JSON, with code blocks and the artifacts each answer wrote."""
+    messages = _current_branch(raw.get("chat_messages") or [], raw.get("current_leaf_message_uuid"))
+    artifacts = {}
+    turns = []
+    for message in messages:
+        role = "human" if message.get("sender") == "human" else "assistant"
+        blocks = message.get("content") or []
+        text = "\n\n".join(block.get("text") or "" for block in blocks if block.get("type") == "text")
+        text = text or message.get("text") or ""
+        written = []
+        for block in blocks:
+            if block.get("type") == "tool_use" and block.get("name") == "artifacts":
+                written.append(dict(_apply_artifact(artifacts, block.get("input") or {})))
+        turn = {"role": role, "uuid": message.get("uuid"), "created_at": message.get("created_at"), "text": text}
+        if role == "assistant":
+            document = document_from_markdown(text)
+            turn["segments"] = document["segments"]
+            turn["code_blocks"] = document["code_blocks"]
+            turn["artifacts"] = written
+        else:
+            turn["attachments"] = [
+                {"name": item.get("file_name"), "size": item.get("file_size"),
+                 "content": item.get("extracted_content")}
+                for item in message.get("attachments") or []
+            ]
+        turns.append(turn)
+    return turns
+
+
+def turns_from_dom(raw):
+    turns = []
+    for item in raw["turns"]:
+        if item["role"] == "human":
+            turns.append({"role": "human", "text": item["text"]})
+            continue
+        document = build_document({"segments": item["segments"], "artifacts": []})
+        turns.append({
+            "role": "assistant",
+            "text": document["text"],
+            "segments": document["segments"],
+            "code_blocks": document["code_blocks"],
+            # The DOM only has the artifact buttons; their contents need the API.
+            "artifacts": [{"title": title, "content": None} for title in item["artifacts"]],
+        })
+    return turns
+
+
+async def dom_conversation(page):
+    raw = await page.evaluate(EXPORT_DOM_JS, [
+        REGISTRY.css("user_message"),
+        REGISTRY.css("message_group"),
+        REGISTRY.css("message"),
+        [list(option) for option in REGISTRY.ordered("artifact_button")],
+    ])
+    return raw["title"], turns_from_dom(raw)
+
+
+def _file_name(turn_index, kind, index, item):
+    name = item.get("filename")
+    if not name and item.get("title"):
+        name = re.sub(r"[^\w.-]+", "_", item["title"]).strip("_") + (item.get("extension") or ".txt")
+    name = name or f"{kind}_{index + 1}{item.get('extension') or '.txt'}"
+    return f"turn_{turn_index:04d}/{name}"
+
+
+class ExportWriter:
+    """Writes a header line then one line per turn to .jsonl, .jsonl.gz or .zip, as turns arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._zip = None
+        if path.endswith(".zip"):
+            self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+            self._file = self._zip.open("conversation.jsonl", "w")
+        elif path.endswith(".gz"):
+            self._file = gzip.open(path, "wb")
+        else:
+            self._file = open(path, "wb")
+        self._files = []  # (archive name, content) written once the JSONL entry is closed
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        if self._zip and record.get("type") == "turn":
+            for kind, items in (("code", record.get("code_blocks") or []), ("artifact", record.get("artifacts") or [])):
+                for index, item in enumerate(items):
+                    content = item.get("code") if kind == "code" else item.get("content")
+                    if content:
+                        self._files.append((_file_name(record["index"], kind, index, item), content))
+
+    def close(self):
+        self._file.close()
+        if self._zip:
+            names = set()
+            for name, content in self._files:
+                stem, extension = os.path.splitext(name)
+                counter = 2
+                while name in names:
+                    name = f"{stem}_{counter}{extension}"
+                    counter += 1
+                names.add(name)
+                self._zip.writestr(name, content)
+            self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def export_conversation(page, path=None, conversation=None, source="auto", org=None):
+    """Exports every turn of the page's conversation (or `conversation`, an id).
+
+    `source` is "api", "dom" or "auto" (the API, falling back to the DOM).
+    Writes to `path` if given and returns {"conversation": header, "turns": [...]}.
+    """
+    started = time.monotonic()
+    header = {"type": "conversation", "id": conversation or conversation_id(page.url), "url": page.url,
+              "exported_at": time.time()}
+    turns = None
+    with span("conversation_export"):
+        if source in ("api", "auto"):
+            try:
+                raw = await fetch_conversation(page, conversation, org)
+                header.update(name=raw.get("name"), model=raw.get("model"), created_at=raw.get("created_at"),
+                              updated_at=raw.get("updated_at"), source="api")
+                turns = turns_from_api(raw)
+            except Exception as e:
+                if source == "api":
+                    raise
+                print(f"Conversation API unavailable ({e}), reading the page instead.")
+        if turns is None:
+            title, turns = await dom_conversation(page)
+            header.update(name=title, source="dom")
+    header["turns"] = len(turns)
+    if path:
+        with ExportWriter(path) as writer:
+            writer.write(header)
+            for index, turn in enumerate(turns):
+                writer.write({"type": "turn", "index": index, **turn})
+        print(f"Exported {len(turns)} turns from the {header['source']} to {path} "
+              f"in {time.monotonic() - started:.1f}s.")
+    return {"conversation": header, "turns": turns}
+
+
+async def export_many(page, directory, conversations, extension=".jsonl.gz", concurrency=4):
+    """Exports conversations by id through the API of one page, a few at a time. Returns the paths written."""
+    org = await organization_id(page)
+    semaphore = asyncio.Semaphore(concurrency)
+    paths = []
+
+    async def one(conversation):
+        async with semaphore:
+            path = os.path.join(directory, f"{conversation}{extension}")
+            try:
+                await export_conversation(page, path, conversation=conversation, source="api", org=org)
+                paths.append(path)
+            except Exception as e:
+                print(f"Could not export {conversation}: {e}")
+
+    await asyncio.gather(*(one(conversation) for conversation in conversations))
+    return paths
+
+
+async def _main(args):
+    extension = {"jsonl": ".jsonl", "gz": ".jsonl.gz", "zip": ".zip"}[args.format]
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(CDP_URL)
+        context = browser.contexts[0]
+        page = find_claude_page(context)
+        if not page:
+            print("Could not find a claude.ai tab. Please ensure it's open.")
+            return
+        started = time.monotonic()
+        if args.all:
+            conversations = [c["uuid"] for c in await list_conversations(page)][:args.limit]
+        elif args.conversations:
+            conversations = [conversation_id(value) or value for value in args.conversations]
+        else:
+            path = os.path.join(args.directory, f"{conversation_id(page.url) or 'current'}{extension}")
+            await export_conversation(page, path, source=args.source)
+            return
+        paths = await export_many(page, args.directory, conversations, extension, args.concurrency)
+        print(f"Exported {len(paths)} of {len(conversations)} conversations in {time.monotonic() - started:.1f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export claude.ai conversations to JSONL or archives.")
+    parser.add_argument("directory", help="Directory to write the exports to.")
+    parser.add_argument("conversations", nargs="*", help="Conversation URLs or ids (default: the open chat).")
+    parser.add_argument("--all", action="store_true", help="Export every conversation in the organization.")
+    parser.add_argument("--limit", type=int, help="With --all, only the most recently updated N conversations.")
+    parser.add_argument("--format", choices=("jsonl", "gz", "zip"), default="gz",
+                        help="Plain JSONL, gzip-compressed JSONL (default) or a zip with every code file.")
+    parser.add_argument("--source", choices=("auto", "api", "dom"), default="auto",
+                        help="For the open chat: the conversation API, the page, or the API with the page as fallback.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations fetched at a time.")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""A fleet of self-launched headless Chromium instances, one OS process each.
+
+Attaching to the one Chrome a person started caps the bridge at one browser
+and one Python event loop. The fleet clones a logged-in Chrome profile
+directory once per instance and starts each instance with
+`launch_persistent_context` in its own process. Playwright talks to the
+instance over a pipe, so no debugging ports are involved. Every instance runs
+a TabPool and pulls prompts from one shared queue, so a fast instance simply
+takes more work.
+
+The parent process watches the instances. If one dies, its in-flight prompts
+are re-queued (up to `max_attempts` per prompt) and a new process is started
+on the same profile. `health()` reports per-instance state.
+
+    python -m claude_bridge.fleet prompts.jsonl results.jsonl --profile ~/claude-profile --instances 4
+
+The prompts are independent: each one runs in a fresh chat. Log in to
+claude.ai once in the source profile; the clones are refreshed only with
+`--refresh-profiles`.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+
+from playwright.async_api import async_playwright
+
+from .batch import read_prompts
+from .blocking import BlockingProfile
+from .pool import TabPool
+
+# Profile entries that are locks, caches or crash dumps; cloning them is slow or breaks the clone.
+PROFILE_SKIP = {
+    "SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile", "Crashpad", "Crash Reports",
+    "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache", "DawnCache", "Service Worker",
+    "component_crx_cache", "BrowserMetrics",
+}
+DEFAULT_FLEET_DIR = os.path.expanduser("~/.cache/claude_bridge/fleet")
+HEALTH_INTERVAL_S = 30
+
+
+def clone_profile(source, destination, refresh=False):
+    """Copies a Chrome user-data directory without its locks and caches. Returns `destination`."""
+    if os.path.isdir(destination) and not refresh:
+        return destination
+    if os.path.isdir(destination):
+        shutil.rmtree(destination)
+    shutil.copytree(source, destination, ignore=lambda directory, names: [n for n in names if n in PROFILE_SKIP],
+                    symlinks=True)
+    return destination
+
+
+def _instance_main(index, profile_dir, tasks, events, options):
+    """Entry point of an instance process."""
+    try:
+        asyncio.run(_run_instance(index, profile_dir, tasks, events, options))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_instance(index, profile_dir, tasks, events, options):
+    loop = asyncio.get_running_loop()
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
+            profile_dir,
+            headless=options["headless"],
+            channel=options["channel"],
+            args=["--disable-background-timer-throttling", "--disable-renderer-backgrounding"],
+        )
+        blocking = BlockingProfile() if options["block"] else None
+        if blocking:
+            await blocking.apply(context)
+        pool = TabPool(context, size=options["tabs"], timeout=options["timeout"])
+        await pool.start()
+        events.put(("ready", index, os.getpid(), None))
+
+        async def tab_worker(tab):
+            while True:
+                task = await loop.run_in_executor(None, tasks.get)
+                if task is None:
+                    return
+                task_id, prompt = task
+                events.put(("started", index, os.getpid(), task_id))
+                started = time.monotonic()
+                success, text, error = False, None, None
+                try:
+                    await pool.prepare(tab)
+                    success, text = await pool.send(tab.page, prompt)
+                except Exception as e:
+                    error = str(e)
+                if success:
+                    tab.completed += 1
+                else:
+                    tab.failures += 1
+                events.put(("result", index, os.getpid(), {
+                    "task_id": task_id,
+                    "success": success,
+                    "text": text,
+                    "error": error,
+                    "tab": tab.index,
+                    "elapsed_ms": (time.monotonic() - started) * 1000,
+                }))
+                events.put(("health", index, os.getpid(), {
+                    "tabs": pool.health(),
+                    "blocking": blocking.stats() if blocking else None,
+                }))
+
+        try:
+            await asyncio.gather(*(tab_worker(tab) for tab in pool.tabs))
+        finally:
+            await pool.close()
+            await context.close()
+
+
+class Instance:
+    """Parent-side state of one browser process."""
+
+    def __init__(self, index, profile_dir):
+        self.index = index
+        self.profile_dir = profile_dir
+        self.process = None
+        self.ready = False
+        self.in_flight = set()
+        self.completed = 0
+        self.failures = 0
+        self.restarts = 0
+        self.started_at = None
+        self.last_event = None
+        self.tabs = []
+        self.blocking = None
+        self.retired = False  # gave up restarting it
+
+    def health(self):
+        alive = bool(self.process and self.process.is_alive())
+        return {
+            "instance": self.index,
+            "pid": self.process.pid if self.process else None,
+            "alive": alive,
+            "ready": self.ready and alive,
+            "in_flight": len(self.in_flight),
+            "completed": self.completed,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "uptime_s": round(time.monotonic() - self.started_at, 1) if self.started_at and alive else None,
+            "idle_s": round(time.monotonic() - self.last_event, 1) if self.last_event else None,
+            "tabs": self.tabs,
+            "blocking": self.blocking,
+        }
+
+
+class Fleet:
+    """Starts `instances` browser processes on cloned profiles and spreads prompts across them.
+
+    `worker` is the process entry point, called as `worker(index, profile_dir, tasks, events, options)`;
+    it must be a module-level function so the spawned process can import it.
+    """
+
+    def __init__(self, source_profile, instances=None, tabs=1, fleet_dir=DEFAULT_FLEET_DIR, headless=True,
+                 channel=None, timeout=120000, block=False, refresh_profiles=False, max_attempts=2, max_restarts=3,
+                 worker=_instance_main):
+        self.source_profile = os.path.expanduser(source_profile)
+        self.size = instances or max(1, (os.cpu_count() or 2) // 2)
+        self.fleet_dir = fleet_dir
+        self.refresh_profiles = refresh_profiles
+        self.max_attempts = max_attempts
+        self.max_restarts = max_restarts
+        self.worker = worker
+        self.options = {"headless": headless, "channel": channel, "tabs": tabs, "timeout": timeout, "block": block}
+        self.mp = multiprocessing.get_context("spawn")
+        self.tasks = self.mp.Queue()
+        self.events = self.mp.Queue()
+        self.instances = []
+
+    def start(self):
+        os.makedirs(self.fleet_dir, exist_ok=True)
+        for index in range(self.size):
+            profile_dir = clone_profile(self.source_profile, os.path.join(self.fleet_dir, f"profile_{index}"),
+                                        refresh=self.refresh_profiles)
+            instance = Instance(index, profile_dir)
+            self.instances.append(instance)
+            self._spawn(instance)
+        print(f"Fleet: started {self.size} instance(s) with {self.options['tabs']} tab(s) each.")
+        return self
+
+    def _spawn(self, instance):
+        instance.process = self.mp.Process(
+            target=self.worker,
+            args=(instance.index, instance.profile_dir, self.tasks, self.events, self.options),
+            name=f"claude-bridge-{instance.index}",
+            daemon=True,
+        )
+        instance.process.start()
+        instance.ready = False
+        instance.started_at = time.monotonic()
+
+    def _drain_tasks(self):
+        """Takes every prompt still waiting in the task queue off it and returns their ids."""
+        drained = []
+        while True:
+            try:
+                task = self.tasks.get(timeout=0.1)
+            except queue.Empty:
+                return drained
+            if task is not None:
+                drained.append(task[0])
+
+    def stop(self):
+        # Prompts nobody claimed must not run before the instances see their stop sentinel.
+        self._drain_tasks()
+        for instance in self.instances:
+            if instance.process and instance.process.is_alive():
+                for _ in range(self.options["tabs"]):
+                    self.tasks.put(None)
+        for instance in self.instances:
+            if instance.process:
+                instance.process.join(timeout=30)
+                if instance.process.is_alive():
+                    instance.process.terminate()
+        self.instances = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def health(self):
+        return [instance.health() for instance in self.instances]
+
+    def _handle_event(self, event, pending, attempts, results, on_result):
+        kind, index, pid, payload = event
+        instance = self.instances[index]
+        if instance.process is None or instance.process.pid != pid:
+            return  # from a process that has since been replaced
+        instance.last_event = time.monotonic()
+        if kind == "ready":
+            instance.ready = True
+        elif kind == "started":
+            instance.in_flight.add(payload)
+        elif kind == "health":
+            instance.tabs = payload["tabs"]
+            instance.blocking = payload["blocking"]
+        elif kind == "result":
+            task_id = payload["task_id"]
+            instance.in_flight.discard(task_id)
+            if payload["success"]:
+                instance.completed += 1
+            else:
+                instance.failures += 1
+            if task_id in pending:
+                pending.discard(task_id)
+                result = {**payload, "instance": index, "attempts": attempts[task_id]}
+                results[task_id] = result
+                if on_result:
+                    on_result(task_id, result)
+
+    def _fail(self, task_id, error, instance, pending, attempts, results, on_result):
+        pending.discard(task_id)
+        result = {"task_id": task_id, "success": False, "text": None, "instance": instance,
+                  "error": error, "tab": None, "elapsed_ms": None, "attempts": attempts[task_id]}
+        results[task_id] = result
+        if on_result:
+            on_result(task_id, result)
+
+    def _check_instances(self, prompts, pending, attempts, results, on_result):
+        for instance in self.instances:
+            if instance.retired or instance.process.is_alive():
+                continue
+            for task_id in instance.in_flight:
+                if task_id not in pending:
+                    continue
+                if attempts[task_id] >= self.max_attempts:
+                    self._fail(task_id, "browser instance crashed", instance.index, pending, attempts, results,
+                               on_result)
+                else:
+                    attempts[task_id] += 1
+                    self.tasks.put((task_id, prompts[task_id]))
+            instance.in_flight = set()
+            if not instance.ready and instance.restarts >= self.max_restarts:
+                # It never got as far as opening its tabs; restarting again won't help.
+                print(f"Fleet: instance {instance.index} keeps failing to start, giving up on it.")
+                instance.retired = True
+                continue
+            print(f"Fleet: instance {instance.index} (pid {instance.process.pid}) exited with "
+                  f"{instance.process.exitcode}, restarting it.")
+            instance.restarts += 1
+            self._spawn(instance)
+
+        if pending and all(instance.retired for instance in self.instances):
+            print("Fleet: no browser instance could be started.")
+            for task_id in list(pending):
+                self._fail(task_id, "no browser instance available", None, pending, attempts, results, on_result)
+
+    def run(self, prompts, on_result=None):
+        """Runs every prompt and returns one result dict per prompt, in input order.
+
+        `on_result(index, result)` is called as each prompt finishes.
+        """
+        if not self.instances:
+            self.start()
+        pending = set(range(len(prompts)))
+        attempts = {task_id: 1 for task_id in pending}
+        results = [None] * len(prompts)
+        for task_id, prompt in enumerate(prompts):
+            self.tasks.put((task_id, prompt))
+
+        last_report = last_event = time.monotonic()
+        stall_s = 2 * self.options["timeout"] / 1000
+        while pending:
+            try:
+                event = self.events.get(timeout=1)
+            except queue.Empty:
+                event = None
+            if event:
+                last_event = time.monotonic()
+                self._handle_event(event, pending, attempts, results, on_result)
+            self._check_instances(prompts, pending, attempts, results, on_result)
+            if time.monotonic() - last_event > stall_s and not any(i.in_flight for i in self.instances):
+                # A process died between taking a prompt and reporting it. Empty the queue first so
+                # prompts nobody claimed yet are queued once, not twice, when the rest go out again.
+                drained = self._drain_tasks()
+                print(f"Fleet: no progress for {stall_s:.0f}s, re-queueing {len(pending)} prompt(s) "
+                      f"({len(pending) - len(set(drained))} lost by a dead instance).")
+                for task_id in sorted(pending):
+                    self.tasks.put((task_id, prompts[task_id]))
+                last_event = time.monotonic()
+            if time.monotonic() - last_report >= HEALTH_INTERVAL_S:
+                last_report = time.monotonic()
+                print(self.status_line())
+        return results
+
+    def status_line(self):
+        parts = [f"#{h['instance']} {'up' if h['ready'] else 'down'} {h['completed']} done/{h['failures']} failed"
+                 f"/{h['restarts']} restarts" for h in self.health()]
+        return "Fleet: " + "; ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run prompts on a fleet of self-launched headless Chromium instances.")
+    parser.add_argument("input", help="Prompt JSONL file ({\"id\": ..., \"prompt\": ...} per line).")
+    parser.add_argument("output", help="Result JSONL file (overwritten).")
+    parser.add_argument("--profile", required=True, help="Logged-in Chrome user-data directory to clone.")
+    parser.add_argument("--instances", type=int, help="Browser processes to start (default: half the CPU cores).")
+    parser.add_argument("--tabs", type=int, default=1, help="Tabs per instance.")
+    parser.add_argument("--fleet-dir", default=DEFAULT_FLEET_DIR, help="Where the cloned profiles live.")
+    parser.add_argument("--refresh-profiles", action="store_true", help="Re-clone the profiles from --profile.")
+    parser.add_argument("--channel", help="Browser channel, e.g. 'chrome' to reuse the installed Chrome's cookie key.")
+    parser.add_argument("--headed", action="store_true", help="Show the browser windows.")
+    parser.add_argument("--timeout", type=int, default=120000, help="Response timeout in ms.")
+    parser.add_argument("--block", action="store_true", help="Block analytics, fonts and images in every instance.")
+    args = parser.parse_args()
+
+    items = read_prompts(args.input)
+    fleet = Fleet(args.profile, instances=args.instances, tabs=args.tabs, fleet_dir=args.fleet_dir,
+                  headless=not args.headed, channel=args.channel, timeout=args.timeout, block=args.block,
+                  refresh_profiles=args.refresh_profiles)
+    started = time.monotonic()
+    with open(args.output, "w", encoding="utf-8") as out, fleet:
+        def write(index, result):
+            out.write(json.dumps({"id": items[index]["id"], **result}, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"[{items[index]['id']}] {'done' if result['success'] else 'FAILED'} on instance {result['instance']}")
+
+        results = fleet.run([item["prompt"] for item in items], on_result=write)
+        print(fleet.status_line())
+    elapsed = time.monotonic() - started
+    done = sum(1 for result in results if result and result["success"])
+    print(f"Fleet finished: {done}/{len(items)} prompts in {elapsed:.0f}s ({len(items) / elapsed:.2f} prompts/s).")
+
+
+if __name__ == "__main__":
+    main()
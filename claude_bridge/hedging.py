@@ -0,0 +1,272 @@
+"""Hedged requests: sending a slow prompt a second time on an idle tab.
+
+Most turns produce their first token quickly. A few sit behind a slow backend
+and dominate tail latency. `Hedger` sends each prompt on one tab and waits for
+the first token. If none has arrived after the hedge delay, and another tab of
+the pool is idle, it sends the same prompt there as well. The first complete
+answer wins. The other tab is stopped with the UI's stop control and goes back
+to the idle set.
+
+The hedge delay is a percentile (p95 by default) of the first-token latencies
+seen so far, clamped to [min_delay_s, max_delay_s]. So only roughly the slowest
+5% of turns are hedged, and the extra load stays small. Hedges only use idle
+tabs, so a full queue is never slowed down by them.
+
+Latency saved is a lower-bound estimate. When the hedge wins, the primary
+still had to produce the rest of its answer. That is taken to be as long as
+the hedge's own generation time, minus whatever the primary had already
+streamed.
+"""
+import asyncio
+import collections
+import time
+
+from .completion import arm_completion_observer
+from .composer import stop_response, submit_message
+from .metrics import METRICS, _quantile
+
+DEFAULT_PERCENTILE = 0.95
+
+
+class HedgePolicy:
+    """The hedge delay: a percentile of recent first-token latencies, clamped."""
+
+    def __init__(self, percentile=DEFAULT_PERCENTILE, min_delay_s=1.0, max_delay_s=30.0, default_delay_s=8.0,
+                 min_samples=5, window=200):
+        self.percentile = percentile
+        self.min_delay_s = min_delay_s
+        self.max_delay_s = max_delay_s
+        self.default_delay_s = default_delay_s
+        self.min_samples = min_samples
+        self.samples = collections.deque(maxlen=window)
+
+    def observe(self, first_token_s):
+        self.samples.append(first_token_s)
+
+    def delay_s(self):
+        if len(self.samples) < self.min_samples:
+            return self.default_delay_s
+        delay = _quantile(sorted(self.samples), self.percentile)
+        return min(self.max_delay_s, max(self.min_delay_s, delay))
+
+
+class _Attempt:
+    """One send of the prompt on one tab."""
+
+    def __init__(self, tab, waiter, timeout):
+        self.tab = tab
+        self.waiter = waiter
+        self.sent = time.monotonic()
+        self.done_at = None
+        self.task = asyncio.create_task(waiter.wait(timeout))
+
+    @property
+    def first_at(self):
+        return self.waiter.timings.get("first")
+
+
+class Hedger:
+    """Runs prompts on a TabPool's tabs and hedges the ones whose first token is late.
+
+    Tabs are handed out from an idle set instead of being bound to one worker,
+    so a hedge can borrow any tab that has nothing to do.
+    """
+
+    def __init__(self, pool, policy=None, timeout=120000):
+        self.pool = pool
+        self.policy = policy or HedgePolicy()
+        self.timeout = timeout
+        self.idle = None
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.saved_s = 0.0
+
+    def _ensure_idle(self):
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for tab in self.pool.tabs:
+                self.idle.put_nowait(tab)
+
+    async def acquire(self):
+        """Waits for an idle tab and takes it."""
+        self._ensure_idle()
+        return await self.idle.get()
+
+    def release(self, tab):
+        self.idle.put_nowait(tab)
+
+    def _try_acquire(self):
+        self._ensure_idle()
+        try:
+            return self.idle.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    async def _start(self, tab, prompt, timeout, fresh_chat):
+        await self.pool.prepare(tab, fresh_chat=fresh_chat)
+        if self.pool.scheduler:
+            await self.pool.scheduler.ready(tab.page)
+        waiter = await arm_completion_observer(tab.page)
+        if not waiter:
+            raise RuntimeError(f"Could not arm the completion observer on tab {tab.index}.")
+        try:
+            await submit_message(tab.page, prompt)
+        except Exception:
+            await waiter.disarm()
+            raise
+        return _Attempt(tab, waiter, timeout)
+
+    async def _race(self, attempts):
+        """Returns (winning attempt, its payload), or (None, None) if every attempt failed."""
+        pending = {attempt.task: attempt for attempt in attempts}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                attempt = pending.pop(task)
+                attempt.done_at = time.monotonic()
+                if not task.cancelled() and task.exception() is None and task.result() is not None:
+                    return attempt, task.result()
+        return None, None
+
+    async def _stop(self, attempt):
+        """Stops a losing attempt's answer and returns its tab to the idle set."""
+        try:
+            if not attempt.task.done():
+                attempt.task.cancel()
+                await asyncio.gather(attempt.task, return_exceptions=True)
+                if not await stop_response(attempt.tab.page):
+                    print(f"Tab {attempt.tab.index}: no stop control found for the losing hedge.")
+        except Exception as e:
+            print(f"Tab {attempt.tab.index}: could not stop the losing hedge: {e}")
+        finally:
+            self.release(attempt.tab)
+
+    def _estimate_saved(self, primary, hedge):
+        generation = hedge.done_at - hedge.first_at if hedge.first_at else 0.0
+        streamed = hedge.done_at - primary.first_at if primary.first_at else 0.0
+        return max(0.0, generation - streamed)
+
+    async def send(self, prompt, timeout=None, fresh_chat=None):
+        """Sends `prompt`, hedging it on an idle tab if its first token is late.
+
+        Returns a result dict with `success`, `text`, `tab` (the winner's),
+        `hedged`, `winner` ("primary" or "hedge"), `first_token_ms` and
+        `elapsed_ms`.
+        """
+        timeout = timeout or self.timeout
+        started = time.monotonic()
+        self.requests += 1
+        result = {"success": False, "text": None, "error": None, "tab": None, "hedged": False, "winner": None,
+                  "first_token_ms": None}
+        primary_tab = await self.acquire()
+        try:
+            primary = await self._start(primary_tab, prompt, timeout, fresh_chat)
+        except Exception as e:
+            primary_tab.failures += 1
+            self.release(primary_tab)
+            result.update(error=str(e), tab=primary_tab.index, elapsed_ms=(time.monotonic() - started) * 1000)
+            return result
+
+        attempts = [primary]
+        delay = self.policy.delay_s()
+        if not await primary.waiter.wait_first(delay) and not primary.task.done():
+            tab = self._try_acquire()
+            if tab:
+                try:
+                    attempts.append(await self._start(tab, prompt, timeout, fresh_chat))
+                    self.hedged += 1
+                    result["hedged"] = True
+                    print(f"No first token on tab {primary_tab.index} after {delay:.1f}s, hedged on tab {tab.index}.")
+                except Exception as e:
+                    print(f"Could not hedge on tab {tab.index}: {e}")
+                    self.release(tab)
+
+        winner, payload = await self._race(attempts)
+        for attempt in attempts:
+            if attempt.first_at:
+                self.policy.observe(attempt.first_at - attempt.sent)
+                METRICS.observe("first_token", attempt.first_at - attempt.sent)
+            if attempt is not winner:
+                await self._stop(attempt)
+
+        if winner is None:
+            primary_tab.failures += 1
+            if self.pool.scheduler:
+                await self.pool.scheduler.check(primary_tab.page)
+            print("Timeout: Did not receive a complete new response in time.")
+            result.update(tab=primary_tab.index, elapsed_ms=(time.monotonic() - started) * 1000)
+            return result
+
+        winner.tab.completed += 1
+        if winner is not primary:
+            saved = self._estimate_saved(primary, winner)
+            self.hedge_wins += 1
+            self.saved_s += saved
+            METRICS.observe("hedge_saved", saved)
+        self.release(winner.tab)
+        result.update(
+            success=True,
+            text=payload["text"],
+            tab=winner.tab.index,
+            winner="primary" if winner is primary else "hedge",
+            first_token_ms=(winner.first_at - winner.sent) * 1000 if winner.first_at else None,
+            elapsed_ms=(time.monotonic() - started) * 1000,
+        )
+        return result
+
+    async def _worker(self, queue, results):
+        while True:
+            try:
+                index, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            cached = await self.pool.cache.aget(prompt) if self.pool.cache else None
+            if cached:
+                results[index] = {"index": index, "prompt": prompt, "success": True, "text": cached["text"],
+                                  "error": None, "tab": None, "cached": True, "hedged": False, "winner": None,
+                                  "first_token_ms": None, "elapsed_ms": 0.0}
+                continue
+            result = await self.send(prompt)
+            if result["success"] and result["text"] and self.pool.cache:
+                await self.pool.cache.aput(prompt, result["text"])
+            results[index] = {"index": index, "prompt": prompt, "cached": False, **result}
+
+    async def run(self, prompts):
+        """Like TabPool.run: every prompt once, results in input order.
+
+        One worker per tab pulls prompts. Once the queue runs dry, the tabs of
+        finished workers become idle and can hedge the stragglers.
+        """
+        if not self.pool.tabs:
+            await self.pool.start()
+        queue = asyncio.Queue()
+        for item in enumerate(prompts):
+            queue.put_nowait(item)
+        results = [None] * len(prompts)
+        await asyncio.gather(*(self._worker(queue, results) for _ in self.pool.tabs))
+        return results
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "latency_saved_s": round(self.saved_s, 3),
+            "delay_s": round(self.policy.delay_s(), 3),
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Hedged {stats['hedged']} of {stats['requests']} prompts ({stats['hedge_rate']:.0%}), "
+                f"the hedge won {stats['hedge_wins']} times, about {stats['latency_saved_s']:.1f}s saved "
+                f"(current delay {stats['delay_s']:.1f}s).")
+
+
+def add_hedging_arguments(parser):
+    parser.add_argument("--hedge", action="store_true",
+                        help="Resend prompts whose first token is late on an idle tab and keep the first answer.")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_PERCENTILE, metavar="Q",
+                        help="First-token latency percentile used as the hedge delay (default 0.95).")
+
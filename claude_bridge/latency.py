@@ -0,0 +1,248 @@
+"""Deadlines from observed latency, and retrying failed turns with backoff.
+
+`LatencyModel` records how long each operation took ("response",
+"input_ready", ...) together with the prompt and response size. The deadline
+for the next call is a least-squares fit of duration on those two sizes, plus
+the p99 residual, times a safety margin and clamped per operation. The
+expected response size is the p95 of the sizes seen so far. So a short prompt
+gets a short deadline, and a long code generation gets a long one. Until an
+operation has enough samples, the old fixed timeout is used.
+
+The history is appended to a JSON-lines file from the metrics writer thread,
+so the next run starts from what earlier runs saw.
+
+`send_with_retry` retries a failed turn after a jittered exponential backoff.
+Before resending, it checks whether the turn reached the chat anyway. If it
+did, the prompt is never sent again: the remaining attempts are spent waiting
+for that answer to settle.
+"""
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+
+from .composer import wait_for_input_ready
+from .messages import read_last_message
+from .metrics import _quantile, append_line, span, wait_for_appends
+from .selectors import REGISTRY
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "claude_bridge", "latency.jsonl")
+
+# op -> (fallback while the history is thin, floor, ceiling), all in ms
+DEFAULTS_MS = {
+    "response": (120000, 15000, 600000),
+    "input_ready": (10000, 2000, 30000),
+}
+GENERIC_DEFAULT_MS = (60000, 1000, 600000)
+
+TURN_SETTLED_JS = """([groupSel, copySel, baseline]) => {
+    const groups = document.querySelectorAll(groupSel);
+    if (groups.length <= baseline) return false;
+    const last = groups[groups.length - 1];
+    return last.getAttribute('data-is-streaming') === 'false' && !!last.querySelector(copySel);
+}"""
+
+
+def _solve(matrix, vector):
+    """Solves a small linear system by Gaussian elimination; None if it is singular."""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def _fit(samples):
+    """Least-squares (intercept, per prompt kchar, per response kchar) for the samples' seconds."""
+    features = [(1.0, s["prompt_chars"] / 1000, s["response_chars"] / 1000) for s in samples]
+    # A small ridge keeps the fit defined when every prompt had the same size.
+    xtx = [[sum(f[i] * f[j] for f in features) + (1e-6 if i == j else 0.0) for j in range(3)] for i in range(3)]
+    xty = [sum(f[i] * s["seconds"] for f, s in zip(features, samples)) for i in range(3)]
+    return _solve(xtx, xty)
+
+
+class LatencyModel:
+    """Per-operation latency history with deadlines derived from it."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, window=500, quantile=0.99, margin=1.5, min_samples=8):
+        self.path = path
+        self.window = window
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.retries = 0
+        self.recovered = 0  # failed turns whose answer arrived without resending
+        self._fits = {}
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        # Samples recorded by an earlier model in this process may still be queued.
+        wait_for_appends()
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    sample = json.loads(line)
+                    self.samples[sample["op"]].append(sample)
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        if lines > 2 * self.window * max(1, len(self.samples)):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for samples in self.samples.values():
+                for sample in samples:
+                    f.write(json.dumps(sample) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def record(self, op, seconds, prompt_chars=0, response_chars=0):
+        sample = {"op": op, "seconds": round(seconds, 4), "prompt_chars": prompt_chars,
+                  "response_chars": response_chars, "wall_time": time.time()}
+        self.samples[op].append(sample)
+        self._fits.pop(op, None)
+        if self.path:
+            append_line(self.path, json.dumps(sample) + "\n")
+
+    def _model(self, op):
+        if op not in self._fits:
+            samples = list(self.samples[op])
+            coefficients = _fit(samples)
+            if coefficients is None:
+                self._fits[op] = None
+            else:
+                a, b, c = coefficients
+                residuals = sorted(s["seconds"] - (a + b * s["prompt_chars"] / 1000 + c * s["response_chars"] / 1000)
+                                   for s in samples)
+                responses = sorted(s["response_chars"] for s in samples)
+                self._fits[op] = (coefficients, _quantile(residuals, self.quantile), _quantile(responses, 0.95))
+        return self._fits[op]
+
+    def deadline_ms(self, op, prompt_chars=0, response_chars=None, default=None):
+        """The timeout for the next `op`, in ms.
+
+        `response_chars` is the expected answer size if known; otherwise the
+        p95 of earlier answers is assumed.
+        """
+        fallback, floor, ceiling = DEFAULTS_MS.get(op, GENERIC_DEFAULT_MS)
+        if default is not None:
+            fallback = default
+        if len(self.samples[op]) < self.min_samples:
+            return fallback
+        fit = self._model(op)
+        if fit is None:
+            return fallback
+        (a, b, c), residual, typical_response = fit
+        if response_chars is None:
+            response_chars = typical_response
+        predicted = a + b * prompt_chars / 1000 + c * response_chars / 1000 + max(0.0, residual)
+        return int(min(ceiling, max(floor, predicted * self.margin * 1000)))
+
+    def stats(self):
+        stats = {}
+        for op, samples in sorted(self.samples.items()):
+            ordered = sorted(s["seconds"] for s in samples)
+            stats[op] = {
+                "samples": len(ordered),
+                "p50_ms": round(_quantile(ordered, 0.5) * 1000, 1),
+                "p99_ms": round(_quantile(ordered, 0.99) * 1000, 1),
+                "deadline_ms": self.deadline_ms(op),
+            }
+        return stats
+
+    def summary(self):
+        deadlines = ", ".join(f"{op} {info['deadline_ms'] / 1000:.0f}s ({info['samples']} samples)"
+                              for op, info in self.stats().items()) or "no history yet"
+        return f"Latency model: {deadlines}; {self.retries} retries, {self.recovered} recovered without resending."
+
+
+def backoff_delays(retries, base_s=2.0, cap_s=60.0):
+    """Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2**n)] per retry."""
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap_s, base_s * 2 ** attempt))
+
+
+async def turn_counts(page):
+    """(user messages, answer groups) currently in the chat."""
+    found = await REGISTRY.probe(page, "user_message", "message_group")
+    return tuple((found[concept] or {}).get("count", 0) for concept in ("user_message", "message_group"))
+
+
+async def wait_for_settled_turn(page, baseline_groups, timeout):
+    """Waits for an answer group past `baseline_groups` to finish and returns its text, or None."""
+    try:
+        await page.wait_for_function(
+            TURN_SETTLED_JS, arg=[REGISTRY.css("message_group"), REGISTRY.css("copy_button"), baseline_groups],
+            timeout=timeout)
+    except Exception:
+        return None
+    return await read_last_message(page, REGISTRY.selector("message"))
+
+
+async def send_with_retry(page, message, send, model, retries=2):
+    """Sends `message` with `send(page, message, timeout)` under adaptive deadlines, retrying failures.
+
+    `send` returns (success, text) like send_message_and_wait. The composer is
+    awaited here, under the adaptive "input_ready" deadline, so `send` need
+    not wait for it again. A failed turn is retried after a jittered backoff.
+    If the failed attempt did reach the chat, the prompt is not sent again;
+    the remaining attempts wait for that answer instead. Returns (success, text).
+    """
+    delays = backoff_delays(retries)
+    for attempt in range(retries + 1):
+        started = time.monotonic()
+        try:
+            with span("input_ready"):
+                await wait_for_input_ready(page, model.deadline_ms("input_ready"))
+            model.record("input_ready", time.monotonic() - started)
+        except Exception as e:
+            print(f"Composer not ready: {e}")
+        users_before, groups_before = await turn_counts(page)
+        timeout = model.deadline_ms("response", prompt_chars=len(message))
+        started = time.monotonic()
+        success, text = False, None
+        try:
+            success, text = await send(page, message, timeout)
+        except Exception as e:
+            print(f"Turn failed: {e}")
+        if not success:
+            users_after, groups_after = await turn_counts(page)
+            if users_after > users_before or groups_after > groups_before:
+                # The prompt is in the chat; sending it again would ask twice. Keep waiting for its answer.
+                text = None
+                for _ in range(retries - attempt + 1):
+                    print(f"The turn was submitted but not finished within {timeout / 1000:.0f}s, waiting for it...")
+                    text = await wait_for_settled_turn(page, groups_before, timeout)
+                    if text is not None:
+                        break
+                if text is None:
+                    print("The submitted turn did not finish; not sending the prompt again.")
+                    return False, None
+                model.recovered += 1
+                success = True
+        if success:
+            model.record("response", time.monotonic() - started, len(message), len(text or ""))
+            return True, text
+        if attempt == retries:
+            break
+        delay = next(delays)
+        model.retries += 1
+        print(f"Retrying in {delay:.1f}s (attempt {attempt + 2} of {retries + 1})...")
+        await asyncio.sleep(delay)
+    return False, None
@@ -0,0 +1,65 @@
+"""Reading messages out of the conversation without scrolling or fixed waits.
+
+Only the newest `data-scroll-anchor` message is read, so the history above it
+never has to be rendered and the cost stays flat as a conversation grows.
+"""
+import weakref
+
+from playwright.async_api import Error as PlaywrightError
+
+from .metrics import span
+from .selectors import REGISTRY
+
+LAST_MESSAGE_JS = """(selector) => {
+    const anchors = document.querySelectorAll(selector);
+    if (anchors.length === 0) return null;
+    return anchors[anchors.length - 1].innerText;
+}"""
+
+_navigations = weakref.WeakKeyDictionary()  # page -> main-frame navigation count
+
+
+def _track_navigations(page):
+    if page in _navigations:
+        return
+    _navigations[page] = 0
+
+    def on_navigated(frame):
+        if frame == page.main_frame:
+            _navigations[page] += 1
+
+    page.on("framenavigated", on_navigated)
+
+
+async def evaluate_when_ready(page, script, arg=None):
+    """Evaluates `script` once the document is ready.
+
+    If a main-frame navigation replaces the document mid-evaluation, waits for
+    the new document and evaluates once more instead of failing.
+    """
+    _track_navigations(page)
+    for attempt in range(2):
+        navigations = _navigations[page]
+        await page.wait_for_load_state('domcontentloaded')
+        try:
+            return await page.evaluate(script, arg)
+        except PlaywrightError:
+            if attempt or _navigations[page] == navigations:
+                raise
+            print("Page navigated while reading, waiting for the new document...")
+    return None
+
+
+async def read_last_message(page, selector=None):
+    """Returns the innerText of the newest message matching `selector`, or None.
+
+    Without a selector, the registry's `last_message` strategies are used.
+    """
+    with span("text_extraction"):
+        if selector:
+            return await evaluate_when_ready(page, LAST_MESSAGE_JS, selector)
+        text = await evaluate_when_ready(page, LAST_MESSAGE_JS, REGISTRY.selector("last_message"))
+        if text is None and (await REGISTRY.probe(page, "last_message"))["last_message"]:
+            # Another strategy matches; the probe made it the preferred one.
+            text = await evaluate_when_ready(page, LAST_MESSAGE_JS, REGISTRY.selector("last_message"))
+        return text
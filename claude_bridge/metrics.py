@@ -0,0 +1,239 @@
+"""Per-phase latency spans, driver call counts and metric export for the bridge.
+
+Code on the hot path wraps each phase in `span("fill")` and the like. Spans
+always feed per-phase histograms; inside `METRICS.turn(...)` they are also
+collected into a per-turn record that is appended to a JSON-lines trace.
+The aggregated histograms can be written as a Prometheus textfile with
+p50/p95/p99 quantiles. Trace lines are appended by `append_line` on a
+background thread, so a slow disk never holds up the event loop.
+
+Driver calls are counted by hooking the Playwright connection of a page with
+`count_driver_calls(page)`. Each call is one round trip to the browser, so
+the count shows how chatty a turn was.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import json
+import math
+import os
+import time
+import weakref
+
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUANTILES = (0.5, 0.95, 0.99)
+MAX_SAMPLES = 10000
+
+_current_turn = contextvars.ContextVar("claude_bridge_turn", default=None)
+_tracing_contexts = weakref.WeakSet()
+# One thread, so lines land in the order they were submitted.
+_appender = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics-append")
+
+
+def _append(path, line):
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"Could not append to {path}: {e}")
+
+
+def append_line(path, line):
+    """Appends `line` to the file at `path` on the background writer thread. Returns at once."""
+    _appender.submit(_append, path, line)
+
+
+def wait_for_appends():
+    """Blocks until every line submitted so far has been written."""
+    _appender.submit(lambda: None).result()
+
+
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return float("nan")
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_S)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(BUCKETS_S):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        return {q: _quantile(ordered, q) for q in QUANTILES}
+
+
+class Metrics:
+    def __init__(self):
+        self.phases = collections.defaultdict(Histogram)
+        self.driver_calls = collections.Counter()
+        self.turns = 0
+        self.trace_path = None
+
+    def configure(self, trace_path=None):
+        """Sets where per-turn records are appended (JSON lines); None disables the trace."""
+        if trace_path and os.path.dirname(trace_path):
+            os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        self.trace_path = trace_path
+
+    def reset(self):
+        """Drops every histogram and counter, e.g. between benchmark scenarios."""
+        self.phases.clear()
+        self.driver_calls.clear()
+        self.turns = 0
+
+    def observe(self, phase, seconds, **attrs):
+        self.phases[phase].observe(seconds)
+        turn = _current_turn.get()
+        if turn is not None:
+            turn["spans"].append({
+                "phase": phase,
+                "start_ms": round((time.monotonic() - seconds - turn["_started"]) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3),
+                **attrs,
+            })
+
+    @contextlib.contextmanager
+    def span(self, phase, **attrs):
+        """Times the block as `phase`. Yields the attrs dict, so the block can add to it."""
+        started = time.monotonic()
+        try:
+            yield attrs
+        finally:
+            self.observe(phase, time.monotonic() - started, **attrs)
+
+    @contextlib.contextmanager
+    def turn(self, turn_id, **attrs):
+        """Collects the spans and driver calls of one turn and appends them to the trace."""
+        record = {"turn": turn_id, **attrs, "spans": [], "driver_calls": collections.Counter(),
+                  "_started": time.monotonic()}
+        token = _current_turn.set(record)
+        try:
+            yield record
+        finally:
+            _current_turn.reset(token)
+            total = time.monotonic() - record.pop("_started")
+            self.turns += 1
+            self.phases["turn"].observe(total)
+            record["total_ms"] = round(total * 1000, 3)
+            record["driver_calls_total"] = sum(record["driver_calls"].values())
+            record["wall_time"] = time.time()
+            if self.trace_path:
+                append_line(self.trace_path, json.dumps(record) + "\n")
+
+    def count_call(self, method):
+        self.driver_calls[method] += 1
+        turn = _current_turn.get()
+        if turn is not None:
+            turn["driver_calls"][method] += 1
+
+    def summary(self):
+        return {
+            phase: {
+                "count": hist.count,
+                **{f"p{int(q * 100)}_ms": round(v * 1000, 1) for q, v in hist.quantiles().items()},
+            }
+            for phase, hist in sorted(self.phases.items())
+        }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP claude_bridge_phase_duration_seconds Duration of each bridge phase.",
+            "# TYPE claude_bridge_phase_duration_seconds histogram",
+        ]
+        for phase, hist in sorted(self.phases.items()):
+            for bound, count in zip(BUCKETS_S, hist.counts):
+                lines.append(f'claude_bridge_phase_duration_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'claude_bridge_phase_duration_seconds_bucket{{phase="{phase}",le="+Inf"}} {hist.count}')
+            lines.append(f'claude_bridge_phase_duration_seconds_sum{{phase="{phase}"}} {hist.sum:.6f}')
+            lines.append(f'claude_bridge_phase_duration_seconds_count{{phase="{phase}"}} {hist.count}')
+        lines += [
+            "# HELP claude_bridge_phase_latency_seconds Recent per-phase latency quantiles.",
+            "# TYPE claude_bridge_phase_latency_seconds summary",
+        ]
+        for phase, hist in sorted(self.phases.items()):
+            for q, value in hist.quantiles().items():
+                lines.append(f'claude_bridge_phase_latency_seconds{{phase="{phase}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'claude_bridge_phase_latency_seconds_sum{{phase="{phase}"}} {hist.sum:.6f}')
+            lines.append(f'claude_bridge_phase_latency_seconds_count{{phase="{phase}"}} {hist.count}')
+        lines += [
+            "# HELP claude_bridge_driver_calls_total Playwright driver calls by method.",
+            "# TYPE claude_bridge_driver_calls_total counter",
+        ]
+        for method, count in sorted(self.driver_calls.items()):
+            lines.append(f'claude_bridge_driver_calls_total{{method="{method}"}} {count}')
+        lines += [
+            "# HELP claude_bridge_turns_total Turns recorded.",
+            "# TYPE claude_bridge_turns_total counter",
+            f"claude_bridge_turns_total {self.turns}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the textfile atomically, as node_exporter's textfile collector expects."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+span = METRICS.span
+
+
+def count_driver_calls(page, metrics=METRICS):
+    """Counts every driver call made through the page's Playwright connection.
+
+    This wraps a private Playwright method; if it isn't there the counts are
+    simply not collected.
+    """
+    try:
+        connection = page._impl_obj._connection
+        original = connection._send_message_to_server
+    except AttributeError:
+        print("Driver call counting is not supported by this Playwright version.")
+        return False
+    if getattr(original, "_claude_bridge_counted", False):
+        return True
+
+    def counted(object, method, *args, **kwargs):
+        metrics.count_call(method)
+        return original(object, method, *args, **kwargs)
+
+    counted._claude_bridge_counted = True
+    connection._send_message_to_server = counted
+    return True
+
+
+async def profile_turn(context, turn_id, path):
+    """Starts a Playwright trace chunk for one turn; await the returned stop() after the turn."""
+    title = f"turn {turn_id}"
+    if context in _tracing_contexts:
+        await context.tracing.start_chunk(title=title)
+    else:
+        # start() opens the first chunk itself.
+        await context.tracing.start(title=title, screenshots=True, snapshots=True)
+        _tracing_contexts.add(context)
+
+    async def stop():
+        await context.tracing.stop_chunk(path=path)
+        print(f"--- Playwright trace for turn {turn_id} saved to {path} ---")
+
+    return stop
@@ -0,0 +1,488 @@
+"""Capturing claude.ai answers from the completion event stream.
+
+claude.ai streams each answer as server-sent events from a POST to
+`.../chat_conversations/<id>/completion`. Reading that stream through the CDP
+Network domain gives the exact markdown (code fences included), the message
+id, the stop reason and any tool/attachment blocks as soon as the bytes leave
+the server, without waiting for the UI to render them. The stream's
+`message_stop` event (or a legacy event carrying a `stop_reason`) marks the
+end of the turn.
+
+`Network.streamResourceContent` makes Chrome hand over the body while it is
+still arriving. On browsers without it the body is read once the request
+finishes. Anything that can't be captured this way falls back to the DOM
+observer in completion.py.
+"""
+import asyncio
+import base64
+import codecs
+import json
+import re
+import time
+import weakref
+
+from .completion import arm_completion_observer
+from .composer import submit_message
+from .metrics import METRICS, span
+from .streaming import stream_response
+
+COMPLETION_URL_RE = re.compile(r"/chat_conversations/[^/?]+/(retry_)?completion(\?|$)")
+# After the DOM reports the turn finished, how long to still wait for the stream's end.
+NETWORK_GRACE_S = 2.0
+
+_captures = weakref.WeakKeyDictionary()  # page -> NetworkCapture
+
+
+class SSEParser:
+    """Incremental server-sent-events parser. feed() returns the complete (event, data) pairs."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._event = None
+        self._data = []
+
+    def feed(self, chunk):
+        self._buffer += self._decoder.decode(chunk)
+        events = []
+        while True:
+            newline = self._buffer.find("\n")
+            if newline < 0:
+                break
+            line = self._buffer[:newline].rstrip("\r")
+            self._buffer = self._buffer[newline + 1:]
+            if not line:
+                if self._data:
+                    events.append((self._event or "message", "\n".join(self._data)))
+                self._event, self._data = None, []
+            elif line.startswith(":"):
+                continue
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    self._event = value
+                elif field == "data":
+                    self._data.append(value)
+        return events
+
+    def close(self):
+        """Flushes an unterminated last event."""
+        events = self.feed(b"\n\n") if self._buffer or self._data else []
+        return events
+
+
+class CompletionStream:
+    """Folds completion events into the answer: text, message id, stop reason, attachments."""
+
+    def __init__(self):
+        self.text = ""
+        self.message_id = None
+        self.model = None
+        self.stop_reason = None
+        self.attachments = []
+        self.limits = None
+        self.error = None
+        self.done = False
+        self._blocks = {}  # content block index -> attachment dict (non-text blocks only)
+        self._text_blocks = 0
+
+    def apply(self, event, data):
+        """Applies one SSE event and returns the text it appended ("" if none)."""
+        try:
+            payload = json.loads(data)
+        except json.JSONDecodeError:
+            return ""
+        if not isinstance(payload, dict):
+            return ""
+        kind = payload.get("type") or event
+
+        if kind == "message_start":
+            message = payload.get("message") or {}
+            self.message_id = message.get("uuid") or message.get("id")
+            self.model = message.get("model")
+            for key in ("attachments", "files"):
+                self.attachments.extend({"type": key[:-1], **item} for item in message.get(key) or [])
+        elif kind == "content_block_start":
+            block = payload.get("content_block") or {}
+            if block.get("type") == "text":
+                # Separate text blocks are rendered as separate paragraphs.
+                delta = ("\n\n" if self._text_blocks and self.text else "") + (block.get("text") or "")
+                self._text_blocks += 1
+                return self._append(delta)
+            attachment = {key: value for key, value in block.items() if key != "input"}
+            attachment["input"] = block.get("input") or None
+            attachment["_json"] = ""
+            self._blocks[payload.get("index")] = attachment
+            self.attachments.append(attachment)
+        elif kind == "content_block_delta":
+            delta = payload.get("delta") or {}
+            if delta.get("type") == "text_delta":
+                return self._append(delta.get("text") or "")
+            block = self._blocks.get(payload.get("index"))
+            if block is not None and delta.get("type") == "input_json_delta":
+                block["_json"] += delta.get("partial_json") or ""
+        elif kind == "content_block_stop":
+            block = self._blocks.pop(payload.get("index"), None)
+            if block is not None:
+                raw = block.pop("_json")
+                if raw:
+                    try:
+                        block["input"] = json.loads(raw)
+                    except json.JSONDecodeError:
+                        block["input"] = raw
+        elif kind == "message_delta":
+            self.stop_reason = (payload.get("delta") or {}).get("stop_reason") or self.stop_reason
+        elif kind == "message_stop":
+            self.done = True
+        elif kind == "message_limit":
+            self.limits = payload.get("message_limit")
+        elif kind == "error":
+            self.error = payload.get("error") or payload
+            self.done = True
+        elif kind == "completion" or "completion" in payload:
+            # Legacy format: every event carries the next piece and a stop_reason once done.
+            self.message_id = self.message_id or payload.get("id") or payload.get("log_id")
+            self.model = self.model or payload.get("model")
+            if payload.get("messageLimit"):
+                self.limits = payload["messageLimit"]
+            appended = self._append(payload.get("completion") or "")
+            if payload.get("stop_reason"):
+                self.stop_reason = payload["stop_reason"]
+                self.done = True
+            return appended
+        return ""
+
+    def _append(self, text):
+        self.text += text
+        return text
+
+    def result(self):
+        for block in self._blocks.values():
+            block.pop("_json", None)
+        return {
+            "text": self.text,
+            "message_id": self.message_id,
+            "model": self.model,
+            "stop_reason": self.stop_reason,
+            "attachments": self.attachments,
+            "limits": self.limits,
+            "error": self.error,
+            "complete": self.done and self.error is None,
+        }
+
+
+class ResponseCapture:
+    """The next completion request on a page. Deltas go to `deltas`; `future` gets the result dict."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.deltas = asyncio.Queue()
+        self.future = asyncio.get_running_loop().create_future()
+        self.stream = CompletionStream()
+        self.parser = SSEParser()
+        self.request_id = None
+        self.armed = time.monotonic()
+        self.first = None
+
+    @property
+    def first_token_s(self):
+        return None if self.first is None else self.first - self.armed
+
+    def feed(self, chunk):
+        for event, data in self.parser.feed(chunk):
+            self._apply(event, data)
+
+    def _apply(self, event, data):
+        appended = self.stream.apply(event, data)
+        if appended:
+            if self.first is None:
+                self.first = time.monotonic()
+            self.deltas.put_nowait(appended)
+        if self.stream.done:
+            self.finish()
+
+    def finish(self, error=None):
+        if self.future.done():
+            return
+        for event, data in self.parser.close():
+            self.stream.apply(event, data)
+        if error and not self.stream.error:
+            self.stream.error = error
+        result = self.stream.result()
+        result["elapsed_ms"] = (time.monotonic() - self.armed) * 1000
+        result["first_token_ms"] = None if self.first is None else (self.first - self.armed) * 1000
+        result["request_id"] = self.request_id
+        self.owner.last_result = result
+        self.future.set_result(result)
+        self.deltas.put_nowait(None)
+
+    async def wait(self, timeout=120000):
+        """Returns the result dict, or None if no stream finished in time."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.future), timeout / 1000)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self.owner.release(self)
+        if not self.future.done():
+            self.future.cancel()
+
+
+class NetworkCapture:
+    """One CDP session per page that routes completion responses to armed captures, oldest first."""
+
+    def __init__(self, page, cdp):
+        self.page = page
+        self.cdp = cdp
+        self.waiting = []  # armed captures without a request yet
+        self.active = {}  # CDP requestId -> ResponseCapture
+        self.streaming = {}  # requestId -> chunks held back until streamResourceContent returns
+        self.body_streamed = set()
+        self.finished_early = set()  # requestIds that finished while streaming was being set up
+        self.last_result = None  # result dict of the most recently finished capture
+
+    @classmethod
+    async def attach(cls, page):
+        """Returns the page's capture, enabling the Network domain once. None if CDP is unavailable."""
+        if page in _captures:
+            return _captures[page]
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+        except Exception as e:
+            print(f"Network capture unavailable: {e}")
+            return None
+        capture = cls(page, cdp)
+        cdp.on("Network.requestWillBeSent", capture._on_request)
+        cdp.on("Network.responseReceived", capture._on_response)
+        cdp.on("Network.dataReceived", capture._on_data)
+        cdp.on("Network.loadingFinished", capture._on_finished)
+        cdp.on("Network.loadingFailed", capture._on_failed)
+        _captures[page] = capture
+        return capture
+
+    def expect(self):
+        capture = ResponseCapture(self)
+        self.waiting.append(capture)
+        return capture
+
+    def release(self, capture):
+        if capture in self.waiting:
+            self.waiting.remove(capture)
+        if capture.request_id is not None:
+            self.active.pop(capture.request_id, None)
+            self.streaming.pop(capture.request_id, None)
+            self.body_streamed.discard(capture.request_id)
+            self.finished_early.discard(capture.request_id)
+
+    def _on_request(self, params):
+        request = params.get("request") or {}
+        if request.get("method") != "POST" or not COMPLETION_URL_RE.search(request.get("url", "")):
+            return
+        if not self.waiting:
+            return
+        capture = self.waiting.pop(0)
+        capture.request_id = params["requestId"]
+        self.active[capture.request_id] = capture
+
+    def _on_response(self, params):
+        request_id = params["requestId"]
+        capture = self.active.get(request_id)
+        if not capture:
+            return
+        status = (params.get("response") or {}).get("status", 200)
+        if status >= 400:
+            capture.stream.error = {"status": status}
+        self.streaming[request_id] = []
+        asyncio.ensure_future(self._start_streaming(request_id))
+
+    async def _start_streaming(self, request_id):
+        try:
+            reply = await self.cdp.send("Network.streamResourceContent", {"requestId": request_id})
+        except Exception:
+            # Older Chrome: the body is read in one go when loading finishes.
+            self.streaming.pop(request_id, None)
+            capture = self.active.get(request_id)
+            if capture and request_id in self.finished_early:
+                await self._read_body(capture, request_id)
+            return
+        capture = self.active.get(request_id)
+        if not capture:
+            return
+        self.body_streamed.add(request_id)
+        capture.feed(base64.b64decode(reply.get("bufferedData") or ""))
+        for chunk in self.streaming.pop(request_id, []):
+            capture.feed(chunk)
+        if request_id in self.finished_early:
+            capture.finish()
+
+    def _on_data(self, params):
+        request_id = params["requestId"]
+        capture = self.active.get(request_id)
+        if not capture or not params.get("data"):
+            return
+        chunk = base64.b64decode(params["data"])
+        if request_id in self.streaming:
+            # streamResourceContent hasn't returned yet; keep the order.
+            self.streaming[request_id].append(chunk)
+        else:
+            capture.feed(chunk)
+
+    def _on_finished(self, params):
+        request_id = params["requestId"]
+        capture = self.active.get(request_id)
+        if not capture:
+            return
+        if request_id in self.body_streamed:
+            capture.finish()
+        elif request_id in self.streaming:
+            # Finished before streaming was set up; finish once the buffered data is fed.
+            self.finished_early.add(request_id)
+        else:
+            asyncio.ensure_future(self._read_body(capture, request_id))
+
+    async def _read_body(self, capture, request_id):
+        try:
+            reply = await self.cdp.send("Network.getResponseBody", {"requestId": request_id})
+        except Exception as e:
+            capture.finish(error={"message": f"Could not read the response body: {e}"})
+            return
+        body = reply.get("body") or ""
+        capture.feed(base64.b64decode(body) if reply.get("base64Encoded") else body.encode("utf-8"))
+        capture.finish()
+
+    def _on_failed(self, params):
+        capture = self.active.get(params["requestId"])
+        if capture:
+            capture.finish(error={"message": params.get("errorText"), "canceled": params.get("canceled", False)})
+
+
+def last_stream_result(page):
+    """The result dict of the page's most recently finished capture, or None."""
+    capture = _captures.get(page)
+    return capture.last_result if capture else None
+
+
+async def arm_network_capture(page):
+    """Arms a capture for the page's next completion request. Returns None if CDP is unavailable."""
+    owner = await NetworkCapture.attach(page)
+    return owner.expect() if owner else None
+
+
+async def send_and_capture(page, message, timeout=120000):
+    """Sends `message` and reads the answer from the completion stream.
+
+    The DOM observer is armed as well. If the stream can't be captured, or
+    hasn't ended shortly after the DOM reports the turn finished, the DOM text
+    is used instead. Returns (success, text, info) where `info` is the stream
+    result dict (message id, stop reason, attachments, ...) with a `source`
+    key of "network" or "dom", or None on failure.
+    """
+    capture = await arm_network_capture(page)
+    waiter = await arm_completion_observer(page)
+    if not capture and not waiter:
+        return False, None, None
+    try:
+        await submit_message(page, message)
+    except Exception:
+        if capture:
+            capture.cancel()
+        if waiter:
+            await waiter.disarm()
+        raise
+
+    return await wait_for_capture(capture, waiter, timeout)
+
+
+async def wait_for_capture(capture, waiter, timeout=120000):
+    """Waits for an armed capture and/or DOM observer after the message was sent.
+
+    The stream's result wins; the DOM text is used when the stream can't be
+    captured or hasn't ended within NETWORK_GRACE_S of the DOM finishing.
+    Either may be None. Returns (success, text, info) like `send_and_capture`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout / 1000
+    futures = {f for f in (capture and capture.future, waiter and waiter.future) if f}
+    result = None
+    try:
+        with span("completion"):
+            while futures and result is None:
+                done, futures = await asyncio.wait(
+                    futures, timeout=max(0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                if capture and capture.future in done:
+                    info = capture.future.result()
+                    if info["complete"] or (info["text"] and not waiter):
+                        result = (info["complete"], info["text"], {**info, "source": "network"})
+                    else:
+                        print(f"Completion stream ended without a finished message ({info['error']}), "
+                              "waiting for the page instead.")
+                # Both can land in the same `done`; the DOM answer must not be dropped then.
+                if result is None and waiter and waiter.future in done:
+                    if capture and not capture.future.done():
+                        try:
+                            await asyncio.wait_for(asyncio.shield(capture.future), NETWORK_GRACE_S)
+                        except asyncio.TimeoutError:
+                            pass
+                    info = capture.future.result() if capture and capture.future.done() else None
+                    if info and info["complete"]:
+                        result = (True, info["text"], {**info, "source": "network"})
+                    else:
+                        payload = waiter.future.result()
+                        result = (True, payload["text"], {**(info or {}), "text": payload["text"], "source": "dom"})
+    finally:
+        if capture:
+            capture.cancel()
+        if waiter:
+            await waiter.disarm()
+
+    first_token_s = (capture and capture.first_token_s) or (waiter and waiter.first_token_s)
+    if first_token_s is not None:
+        METRICS.observe("first_token", first_token_s)
+    if result is None:
+        print("Timeout: Did not receive a complete response in time.")
+        return False, None, None
+    return result
+
+
+async def stream_network_response(page, message, timeout=120000):
+    """Like `stream_response`, but the deltas are read from the completion stream.
+
+    The final event also carries `message_id`, `stop_reason` and
+    `attachments`. Falls back to the DOM stream when CDP is unavailable.
+    """
+    capture = await arm_network_capture(page)
+    if not capture:
+        async for event in stream_response(page, message, timeout=timeout):
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    try:
+        await submit_message(page, message)
+        deadline = loop.time() + timeout / 1000
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                delta = await asyncio.wait_for(capture.deltas.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if delta is None:
+                yield {"type": "final", **capture.future.result()}
+                return
+            yield {"type": "delta", "text": delta}
+
+        print("Timeout: Did not receive a complete response in time.")
+        yield {"type": "final", **capture.stream.result(), "complete": False,
+               "elapsed_ms": (time.monotonic() - capture.armed) * 1000,
+               "first_token_ms": None if capture.first is None else (capture.first - capture.armed) * 1000}
+    finally:
+        capture.cancel()
@@ -0,0 +1,171 @@
+"""Overlapping each turn's post-processing with the next turn's generation.
+
+Run serially, a turn sends, waits for the answer, saves the text, parses it,
+opens the artifact canvas and pauses before the next send. The browser idles
+while the answer is processed, and the processing waits on the browser.
+`TurnPipeline` keeps only two steps on the tab's critical path: the send
+itself, and one evaluate that snapshots the finished answer (its segments
+and artifact labels). The next prompt goes out as soon as the chat is idle.
+Everything else happens in a background task per turn, against that snapshot:
+
+- parsing the document, in an executor thread;
+- reading artifact contents from the conversation API (`export.py`), so the
+  canvas is never clicked while the next answer streams;
+- queuing files on the result sink (`sink.py`).
+
+At most `max_pending` turns are post-processed at once. Beyond that the next
+send waits for a slot. If the conversation API is unavailable, artifacts are
+extracted through the canvas before the next send, as in a serial run.
+"""
+import asyncio
+import time
+
+from .artifacts import artifact_name, extract_artifacts
+from .composer import wait_for_chat_idle
+from .document import build_document, code_block_name, document_snapshot
+from .export import _api, conversation_id, fetch_conversation, organization_id, turns_from_api
+from .metrics import METRICS, span
+from .session import NEW_CHAT_URL
+
+API_RETRY_DELAYS_S = (0.5, 1, 2)  # the API can lag the end of the stream by a moment
+
+
+class TurnPipeline:
+    """Sends prompts on one tab back to back and post-processes finished turns in the background.
+
+    `send` is an async callable `(page, prompt) -> (success, text)`. With
+    `fresh_chat=True` every prompt starts in a new chat; otherwise the
+    prompts are turns of one conversation. `on_result(result)` is awaited
+    once a turn's post-processing is done, e.g. to fill a cache.
+    """
+
+    def __init__(self, page, send, sink, fresh_chat=False, max_pending=4, conversation="conversation",
+                 stop_on_failure=True, on_result=None, ready_timeout=30000):
+        self.page = page
+        self.send = send
+        self.sink = sink
+        self.fresh_chat = fresh_chat
+        self.conversation = conversation
+        self.stop_on_failure = stop_on_failure
+        self.on_result = on_result
+        self.ready_timeout = ready_timeout
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tasks = set()
+        self.org = None
+        self.api = None  # whether artifact contents can come from the conversation API
+        self.overlap_s = 0.0
+        self.post_s = 0.0
+        self.inline_artifacts = 0
+
+    async def _check_api(self):
+        try:
+            self.org = await organization_id(self.page)
+            await _api(self.page, "/api/organizations")
+            self.api = True
+        except Exception as e:
+            print(f"Conversation API unavailable ({e}); artifacts will be read from the canvas between turns.")
+            self.api = False
+
+    async def _api_artifacts(self, snapshot):
+        """The artifacts the snapshot's answer wrote, from the conversation JSON."""
+        conversation = conversation_id(snapshot["url"])
+        if not conversation:
+            return []
+        index = snapshot["raw"]["index"]
+        for delay in (0,) + API_RETRY_DELAYS_S:
+            await asyncio.sleep(delay)
+            raw = await fetch_conversation(self.page, conversation, self.org)
+            answers = [turn for turn in turns_from_api(raw) if turn["role"] == "assistant"]
+            if len(answers) > index:
+                return answers[index]["artifacts"]
+        print(f"Turn {snapshot['turn']}: answer {index + 1} is not in the conversation JSON yet; no artifacts read.")
+        return []
+
+    async def _post(self, snapshot, result):
+        started = time.monotonic()
+        turn = snapshot["turn"]
+        conversation = snapshot["conversation"]
+        try:
+            with span("post_process"):
+                await self.sink.put(conversation, turn, "response.txt", snapshot["text"], url=snapshot["url"])
+                raw = snapshot["raw"]
+                document = None
+                if raw:
+                    document = await asyncio.get_running_loop().run_in_executor(None, build_document, raw)
+                    for block in document["code_blocks"]:
+                        await self.sink.put(conversation, turn, code_block_name(block), block["code"],
+                                            kind="code", language=block["language"])
+                    await self.sink.put(conversation, turn, "response.json", document, kind="document")
+                artifacts = snapshot.get("artifacts")
+                if artifacts is None:
+                    artifacts = await self._api_artifacts(snapshot) if raw and raw["artifacts"] else []
+                for index, artifact in enumerate(artifacts):
+                    await self.sink.put(conversation, turn, artifact_name(index, artifact), artifact["content"],
+                                        kind="artifact", title=artifact["title"], language=artifact["language"])
+            result.update(document=document, artifacts=artifacts)
+            if self.on_result:
+                await self.on_result(result)
+        except Exception as e:
+            result["post_error"] = str(e)
+            print(f"Post-processing of turn {turn} failed: {e}")
+        finally:
+            result["post_ms"] = (time.monotonic() - started) * 1000
+            self.post_s += time.monotonic() - started
+            self._slots.release()
+
+    async def _next_send(self, index):
+        with span("turn_ready"):
+            if index and self.fresh_chat:
+                await self.page.goto(NEW_CHAT_URL, wait_until="commit")
+            await wait_for_chat_idle(self.page, self.ready_timeout)
+
+    async def run(self, prompts):
+        """Sends every prompt and returns one result dict per prompt sent, once all post-processing is done."""
+        if self.api is None:
+            await self._check_api()
+        results = []
+        run_started = time.monotonic()
+        for index, prompt in enumerate(prompts):
+            turn = index + 1
+            conversation = f"{self.conversation}_{turn}" if self.fresh_chat else self.conversation
+            # Wait for a post-processing slot before the send, so the backlog stays bounded.
+            await self._slots.acquire()
+            busy = len(self._tasks)
+            send_started = time.monotonic()
+            with METRICS.turn(turn, prompt_chars=len(prompt), pipelined=busy):
+                try:
+                    await self._next_send(index)
+                    success, text = await self.send(self.page, prompt)
+                except Exception as e:
+                    print(f"Turn {turn} failed: {e}")
+                    success, text = False, None
+                result = {"index": index, "prompt": prompt, "success": success, "text": text,
+                          "conversation": conversation, "elapsed_ms": (time.monotonic() - send_started) * 1000}
+                results.append(result)
+                if not success:
+                    self._slots.release()
+                    if self.stop_on_failure:
+                        break
+                    continue
+                snapshot = {"turn": turn, "conversation": conversation, "text": text, "url": self.page.url, "raw": None}
+                try:
+                    snapshot["raw"] = await document_snapshot(self.page)
+                    if not self.api and snapshot["raw"] and snapshot["raw"]["artifacts"]:
+                        # Without the API the canvas has to be read now, before the next prompt changes the page.
+                        snapshot["artifacts"] = await extract_artifacts(self.page)
+                        self.inline_artifacts += 1
+                except Exception as e:
+                    print(f"Could not snapshot turn {turn}: {e}")
+            if busy:
+                self.overlap_s += time.monotonic() - send_started
+            task = asyncio.create_task(self._post(snapshot, result))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        elapsed = time.monotonic() - run_started
+        sent = sum(result["success"] for result in results)
+        print(f"Pipeline: {sent} turns in {elapsed:.1f}s ({sent * 3600 / max(elapsed, 1e-9):.0f} turns/hour), "
+              f"{self.overlap_s:.1f}s of generation overlapped with post-processing, "
+              f"{self.inline_artifacts} turn(s) read artifacts from the canvas.")
+        return results
@@ -0,0 +1,186 @@
+"""Running independent prompts concurrently on several claude.ai tabs.
+
+All tabs share the one CDP connection and browser context. Each tab is driven
+by its own asyncio worker that pulls prompts from a shared queue, so a slow
+answer only holds up its own tab. Results come back in input order.
+"""
+import asyncio
+import time
+
+from .completion import send_and_wait
+from .composer import wait_for_input_ready
+from .session import NEW_CHAT_URL
+
+
+class Tab:
+    """Per-tab state. Nothing here is shared between workers."""
+
+    def __init__(self, index, page, owned):
+        self.index = index
+        self.page = page
+        self.owned = owned  # True if the pool opened the page and should close it
+        self.completed = 0
+        self.failures = 0
+        self.replacements = 0
+
+    def health(self):
+        return {
+            "tab": self.index,
+            "url": None if self.page.is_closed() else self.page.url,
+            "completed": self.completed,
+            "failures": self.failures,
+            "replacements": self.replacements,
+        }
+
+
+class TabPool:
+    """Opens or adopts `size` claude.ai tabs and spreads prompts across them.
+
+    `send` is an async callable `(page, prompt) -> (success, text)`; it defaults
+    to the observer-based `send_and_wait`. With `fresh_chat=True` every prompt
+    starts in a new chat so answers never see another prompt's context. A
+    `ResponseCache` answers repeated prompts without touching a tab; it is
+    only consulted for fresh chats. A `QuotaScheduler` holds sends back while a
+    usage limit is in force and meters them through its token bucket. A
+    `BlockingProfile` is applied to each of the pool's pages, never to the
+    shared context, and removed again when the pool closes.
+    """
+
+    def __init__(self, context, size=4, send=None, fresh_chat=True, timeout=120000, cache=None, scheduler=None,
+                 blocking=None):
+        self.context = context
+        self.blocking = blocking
+        self.cache = cache if fresh_chat else None
+        self.size = size
+        self.send = send or (lambda page, prompt: send_and_wait(page, prompt, timeout=timeout))
+        self.scheduler = scheduler
+        if scheduler:
+            self.send = scheduler.wrap(self.send)
+        self.fresh_chat = fresh_chat
+        self.tabs = []
+
+    async def start(self):
+        """Adopts already open claude.ai tabs and opens new ones until the pool is full."""
+        adopted = [page for page in self.context.pages if 'claude.ai' in page.url][:self.size]
+        for page in adopted:
+            if self.blocking:
+                await self.blocking.apply(page)
+            self.tabs.append(Tab(len(self.tabs), page, owned=False))
+        while len(self.tabs) < self.size:
+            page = await self._open_page()
+            self.tabs.append(Tab(len(self.tabs), page, owned=True))
+        print(f"Tab pool ready: {len(adopted)} adopted, {self.size - len(adopted)} opened.")
+        return self
+
+    async def close(self):
+        for tab in self.tabs:
+            if self.blocking:
+                await self.blocking.remove(tab.page)
+            if tab.owned and not tab.page.is_closed():
+                await tab.page.close()
+        self.tabs = []
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _open_page(self):
+        page = await self.context.new_page()
+        if self.blocking:
+            await self.blocking.apply(page)
+        # The composer becoming usable is the ready signal; don't wait for images or fonts.
+        await page.goto(NEW_CHAT_URL, wait_until="commit")
+        await wait_for_input_ready(page, timeout=30000)
+        return page
+
+    async def _is_healthy(self, tab):
+        if tab.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(tab.page.evaluate("() => document.readyState"), 5)
+            return True
+        except Exception:
+            return False
+
+    async def _replace(self, tab):
+        print(f"Tab {tab.index} is unhealthy, replacing it.")
+        if self.blocking:
+            await self.blocking.remove(tab.page)
+        if tab.owned and not tab.page.is_closed():
+            try:
+                await tab.page.close()
+            except Exception:
+                pass
+        tab.page = await self._open_page()
+        tab.owned = True
+        tab.replacements += 1
+
+    async def prepare(self, tab, fresh_chat=None):
+        """Makes sure the tab is healthy and, with fresh_chat, on an empty chat."""
+        if not await self._is_healthy(tab):
+            await self._replace(tab)
+        if self.fresh_chat if fresh_chat is None else fresh_chat:
+            await tab.page.goto(NEW_CHAT_URL, wait_until="commit")
+            await wait_for_input_ready(tab.page, timeout=30000)
+
+    async def _worker(self, tab, queue, results):
+        while True:
+            try:
+                index, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.monotonic()
+            success, text, error = False, None, None
+            cached = await self.cache.aget(prompt) if self.cache else None
+            if cached:
+                results[index] = {
+                    "index": index,
+                    "prompt": prompt,
+                    "success": True,
+                    "text": cached["text"],
+                    "error": None,
+                    "tab": None,
+                    "cached": True,
+                    "elapsed_ms": (time.monotonic() - started) * 1000,
+                }
+                queue.task_done()
+                continue
+            try:
+                await self.prepare(tab)
+                success, text = await self.send(tab.page, prompt)
+            except Exception as e:
+                error = str(e)
+                print(f"Tab {tab.index} failed on prompt {index}: {e}")
+            if success and text and self.cache:
+                await self.cache.aput(prompt, text)
+            if success:
+                tab.completed += 1
+            else:
+                tab.failures += 1
+            results[index] = {
+                "index": index,
+                "prompt": prompt,
+                "success": success,
+                "text": text,
+                "error": error,
+                "tab": tab.index,
+                "cached": False,
+                "elapsed_ms": (time.monotonic() - started) * 1000,
+            }
+            queue.task_done()
+
+    async def run(self, prompts):
+        """Runs every prompt and returns one result dict per prompt, in input order."""
+        if not self.tabs:
+            await self.start()
+        queue = asyncio.Queue()
+        for item in enumerate(prompts):
+            queue.put_nowait(item)
+        results = [None] * len(prompts)
+        await asyncio.gather(*(self._worker(tab, queue, results) for tab in self.tabs))
+        return results
+
+    def health(self):
+        return [tab.health() for tab in self.tabs]
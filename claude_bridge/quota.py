@@ -0,0 +1,252 @@
+"""Pausing on usage limits and metering submissions with a token bucket.
+
+When claude.ai hits a usage limit it shows a banner ("You've reached your
+usage limit ... until 5:00 PM") and the completion stream reports a
+`message_limit` of type `exceeded_limit`, or a 429 / `rate_limit_error`.
+Without a scheduler, every later turn waits out its full timeout. With
+`QuotaScheduler`, the first failed turn is checked against both signals, and
+the reset time is parsed from them. Until that time, new submissions wait,
+either for the whole account (the default, since all tabs share one login)
+or only for the tab that hit the limit.
+
+Submissions also pass a `TokenBucket`, so a large batch runs at a steady
+sustainable rate instead of bursting into the limit.
+"""
+import asyncio
+import datetime
+import re
+import time
+
+from .network import last_stream_result
+from .selectors import REGISTRY
+
+DEFAULT_PAUSE_S = 300  # when a limit is hit but no reset time is shown
+MAX_PAUSE_S = 6 * 3600
+
+LIMIT_RE = re.compile(
+    r"usage limit|message limit|out of (?:free )?messages|too many requests|rate.?limit|"
+    r"reached (?:your|the) .{0,30}limit|limit (?:will )?resets?",
+    re.IGNORECASE)
+RELATIVE_RE = re.compile(r"\bin\s+(?:about\s+)?(\d+)\s*(seconds?|secs?|minutes?|mins?|hours?|hrs?)\b", re.IGNORECASE)
+CLOCK_RE = re.compile(
+    r"\b(?:until|at|after|resets?)\s+(?:(mon|tue|wed|thu|fri|sat|sun)[a-z]*,?\s+)?"
+    r"(\d{1,2})(?::(\d{2}))?\s*([ap]\.?\s?m\.?)?",
+    re.IGNORECASE)
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+UNIT_S = {"s": 1, "m": 60, "h": 3600}
+
+# Banner and alert texts, skipping anything inside a message so answers that
+# talk about rate limits don't count.
+BANNER_TEXT_JS = """([bannerSel, messageSel]) => {
+    const texts = [];
+    for (const el of document.querySelectorAll(bannerSel)) {
+        if (el.closest(messageSel)) continue;
+        if (el.getClientRects().length === 0) continue;
+        const text = (el.innerText || '').trim();
+        if (text) texts.push(text.slice(0, 500));
+    }
+    return texts;
+}"""
+
+
+def parse_reset(text, now=None):
+    """The epoch time a limit message says it resets at, or None.
+
+    Understands "in 45 minutes", "until 5 PM", "resets at 17:30" and
+    "until Tuesday 9:00 AM" (local time).
+    """
+    now = now or time.time()
+    match = RELATIVE_RE.search(text)
+    if match:
+        return now + int(match.group(1)) * UNIT_S[match.group(2)[0].lower()]
+    match = CLOCK_RE.search(text)
+    if not match:
+        return None
+    weekday, hour, minute, meridiem = match.groups()
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if hour > 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower().startswith("p") else 0)
+    elif not (match.group(3) or weekday):
+        # A bare number after "at" is too ambiguous ("at 3" might be a count).
+        return None
+    if hour > 23 or minute > 59:
+        return None
+    current = datetime.datetime.fromtimestamp(now)
+    reset = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if weekday:
+        reset += datetime.timedelta(days=(WEEKDAYS.index(weekday[:3].lower()) - current.weekday()) % 7)
+    if reset <= current:
+        reset += datetime.timedelta(days=7 if weekday else 1)
+    return reset.timestamp()
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e12 else value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def limit_from_stream(info):
+    """A limit signal from a completion stream result dict, or None."""
+    if not info:
+        return None
+    limits = info.get("limits") or {}
+    if isinstance(limits, dict) and limits.get("type") == "exceeded_limit":
+        return {"source": "network", "kind": "usage_limit", "reset_at": _epoch(limits.get("resetsAt")),
+                "message": "Usage limit exceeded."}
+    error = info.get("error") or {}
+    if not isinstance(error, dict):
+        return None
+    message = str(error.get("message") or "")
+    if error.get("status") == 429 or error.get("type") == "rate_limit_error" or LIMIT_RE.search(message):
+        return {"source": "network", "kind": "rate_limit", "reset_at": parse_reset(message),
+                "message": message or "Too many requests."}
+    return None
+
+
+async def limit_from_page(page):
+    """A limit signal from a banner or alert on the page, or None."""
+    try:
+        texts = await page.evaluate(BANNER_TEXT_JS, [REGISTRY.css("limit_banner"), REGISTRY.css("message_group")])
+    except Exception:
+        return None
+    for text in texts:
+        if LIMIT_RE.search(text):
+            return {"source": "dom", "kind": "usage_limit", "reset_at": parse_reset(text), "message": text}
+    return None
+
+
+class TokenBucket:
+    """Allows `rate_per_min` submissions a minute on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate_per_min, burst=1):
+        self.rate = rate_per_min / 60
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Takes one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+        return waited
+
+
+class QuotaScheduler:
+    """Holds submissions back while a usage limit is in force and meters them through a token bucket.
+
+    `scope="account"` pauses every tab when one hits a limit; `scope="tab"`
+    pauses only that tab.
+    """
+
+    def __init__(self, bucket=None, scope="account", default_pause_s=DEFAULT_PAUSE_S, max_waits=3):
+        self.bucket = bucket
+        self.scope = scope
+        self.default_pause_s = default_pause_s
+        self.max_waits = max_waits
+        self.paused_until = {}  # None (the account) or a page -> epoch seconds
+        self.limits_hit = 0
+        self.paused_s = 0.0
+        self.throttled_s = 0.0
+        self.last_limit = None
+
+    def _resume_at(self, page):
+        return max(self.paused_until.get(None, 0), self.paused_until.get(page, 0))
+
+    async def ready(self, page=None):
+        """Waits until no limit applies to `page`, then takes a submission token."""
+        while True:
+            wait = self._resume_at(page) - time.time()
+            if wait <= 0:
+                break
+            print(f"Usage limit in force, waiting {wait / 60:.1f} min "
+                  f"(until {time.strftime('%H:%M', time.localtime(self._resume_at(page)))}).")
+            await asyncio.sleep(min(wait, 60))
+            self.paused_s += min(wait, 60)
+        if self.bucket:
+            self.throttled_s += await self.bucket.acquire()
+
+    def pause(self, signal, page=None):
+        """Records a limit signal and pauses the account or the tab until its reset time."""
+        now = time.time()
+        reset_at = signal.get("reset_at") or now + self.default_pause_s
+        reset_at = min(max(reset_at, now + 1), now + MAX_PAUSE_S)
+        key = page if self.scope == "tab" else None
+        self.paused_until[key] = max(self.paused_until.get(key, 0), reset_at)
+        self.limits_hit += 1
+        self.last_limit = {**signal, "paused_until": reset_at}
+        where = "this tab" if key is not None else "all tabs"
+        print(f"Usage limit detected ({signal['source']}: {signal['message'][:120]}), "
+              f"pausing {where} until {time.strftime('%H:%M', time.localtime(reset_at))}.")
+
+    async def check(self, page, since=None):
+        """Looks for a limit after a failed turn and pauses if one is found. Returns the signal or None.
+
+        `since` is the page's stream result from before the turn, so an old
+        result is not mistaken for this turn's.
+        """
+        result = last_stream_result(page)
+        signal = limit_from_stream(result) if result is not since else None
+        signal = signal or await limit_from_page(page)
+        if signal:
+            self.pause(signal, page)
+        return signal
+
+    def wrap(self, send):
+        """Wraps `send(page, ...) -> (success, text)` so it waits for quota and retries after a limit resets."""
+        async def scheduled(page, *args, **kwargs):
+            for _ in range(self.max_waits + 1):
+                await self.ready(page)
+                before = last_stream_result(page)
+                success, text = await send(page, *args, **kwargs)
+                if success or not await self.check(page, since=before):
+                    return success, text
+            return False, None
+        return scheduled
+
+    def stats(self):
+        return {
+            "limits_hit": self.limits_hit,
+            "paused_s": round(self.paused_s, 1),
+            "throttled_s": round(self.throttled_s, 1),
+            "paused_until": max((until for until in self.paused_until.values() if until > time.time()), default=None),
+            "last_limit": self.last_limit,
+        }
+
+    def summary(self):
+        return (f"Quota: {self.limits_hit} limits hit, {self.paused_s / 60:.1f} min paused, "
+                f"{self.throttled_s:.1f}s throttled by the token bucket.")
+
+
+def add_quota_arguments(parser):
+    parser.add_argument("--rate", type=float, metavar="PER_MIN",
+                        help="Submit at most this many prompts a minute (token bucket).")
+    parser.add_argument("--burst", type=int, default=1, help="Prompts the token bucket lets through at once.")
+    parser.add_argument("--quota-scope", choices=("account", "tab"), default="account",
+                        help="Pause every tab (account) or only the affected tab when a usage limit is hit.")
+
+
+def scheduler_from_args(args):
+    """The QuotaScheduler the quota flags ask for. Limit detection is always on."""
+    bucket = TokenBucket(args.rate, args.burst) if args.rate else None
+    return QuotaScheduler(bucket, scope=args.quota_scope)
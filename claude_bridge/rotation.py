@@ -0,0 +1,159 @@
+"""Moving a long conversation to a fresh chat before the tab slows down.
+
+Every turn adds to the DOM. Message lookups get slower and the renderer's JS
+heap grows until the tab becomes sluggish or crashes. `ConversationRotator`
+samples CDP `Performance.getMetrics` (JSHeapUsedSize, Nodes) after each turn.
+Once the chat passes a turn, node or heap threshold, it opens a new chat. The
+next prompt is prefixed with a context preamble: a configurable text, then
+the last few exchanges. That way a multi-turn group keeps what it needs and
+each turn costs about the same no matter how many came before.
+"""
+import time
+import weakref
+
+from .composer import wait_for_input_ready
+from .session import NEW_CHAT_URL
+
+DEFAULT_MAX_TURNS = 40
+DEFAULT_MAX_NODES = 150_000
+DEFAULT_MAX_HEAP_MB = 512
+DEFAULT_PREAMBLE = "We are continuing an earlier conversation. Its most recent exchanges were:"
+CARRY_CHARS = 2000  # per carried message
+
+_performance_sessions = weakref.WeakKeyDictionary()  # page -> CDPSession with Performance enabled, or None
+
+
+async def page_metrics(page):
+    """{"js_heap_mb", "nodes"} from CDP Performance.getMetrics, or None if CDP is unavailable."""
+    if page not in _performance_sessions:
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            await cdp.send("Performance.enable")
+            _performance_sessions[page] = cdp
+        except Exception as e:
+            print(f"Page metrics unavailable: {e}")
+            _performance_sessions[page] = None
+    cdp = _performance_sessions[page]
+    if not cdp:
+        return None
+    try:
+        reply = await cdp.send("Performance.getMetrics")
+    except Exception:
+        return None
+    values = {metric["name"]: metric["value"] for metric in reply.get("metrics", [])}
+    return {
+        "js_heap_mb": values.get("JSHeapUsedSize", 0) / (1024 * 1024),
+        "nodes": int(values.get("Nodes", 0)),
+    }
+
+
+class RotationPolicy:
+    """Thresholds after which a chat is rotated; None disables one."""
+
+    def __init__(self, max_turns=DEFAULT_MAX_TURNS, max_nodes=DEFAULT_MAX_NODES, max_heap_mb=DEFAULT_MAX_HEAP_MB,
+                 preamble=DEFAULT_PREAMBLE, carry_turns=2):
+        self.max_turns = max_turns
+        self.max_nodes = max_nodes
+        self.max_heap_mb = max_heap_mb
+        self.preamble = preamble
+        self.carry_turns = carry_turns
+
+    def exceeded(self, turns, metrics):
+        """The name of the first threshold crossed, or None."""
+        if self.max_turns and turns >= self.max_turns:
+            return "turns"
+        if metrics and self.max_nodes and metrics["nodes"] >= self.max_nodes:
+            return "nodes"
+        if metrics and self.max_heap_mb and metrics["js_heap_mb"] >= self.max_heap_mb:
+            return "heap"
+        return None
+
+
+class ConversationRotator:
+    """Tracks one tab's chat and rotates it to a new chat when the policy says so."""
+
+    def __init__(self, policy=None):
+        self.policy = policy or RotationPolicy()
+        self.turns = 0
+        self.history = []  # (prompt, response) of the current chat, newest last
+        self.carry = None  # preamble for the first prompt of a rotated chat
+        self.rotations = 0
+        self.last_metrics = None
+
+    def prepare(self, message):
+        """The prompt to send: `message`, prefixed with the carried context right after a rotation."""
+        if not self.carry:
+            return message
+        carry, self.carry = self.carry, None
+        return f"{carry}\n\n{message}"
+
+    def reset(self):
+        """Forgets the chat, e.g. when the caller opened a new one itself."""
+        self.turns = 0
+        self.history = []
+        self.carry = None
+
+    async def after_turn(self, page, prompt, response):
+        """Records a finished turn and samples the page. Returns the threshold crossed, or None."""
+        self.turns += 1
+        self.history.append((prompt, response or ""))
+        del self.history[:-max(1, self.policy.carry_turns)]
+        self.last_metrics = await page_metrics(page)
+        return self.policy.exceeded(self.turns, self.last_metrics)
+
+    def _carried_context(self):
+        parts = [self.policy.preamble] if self.policy.preamble else []
+        for prompt, response in self.history[-self.policy.carry_turns:] if self.policy.carry_turns else []:
+            parts.append(f"User: {prompt[:CARRY_CHARS]}")
+            parts.append(f"Assistant: {response[:CARRY_CHARS]}")
+        return "\n\n".join(parts) or None
+
+    async def rotate(self, page, reason="turns"):
+        """Opens a new chat on `page` and arms the context preamble for the next prompt."""
+        started = time.monotonic()
+        metrics = self.last_metrics or {}
+        carry = self._carried_context()
+        await page.goto(NEW_CHAT_URL, wait_until="commit")
+        await wait_for_input_ready(page, timeout=30000)
+        self.rotations += 1
+        print(f"Rotated to a new chat after {self.turns} turns ({reason}: {metrics.get('nodes', '?')} nodes, "
+              f"{metrics.get('js_heap_mb', 0):.0f} MB heap) in {time.monotonic() - started:.1f}s.")
+        self.reset()
+        self.carry = carry
+
+    async def maybe_rotate(self, page, prompt, response):
+        """after_turn() followed by rotate() if a threshold was crossed. Returns True if it rotated."""
+        reason = await self.after_turn(page, prompt, response)
+        if reason:
+            await self.rotate(page, reason)
+        return bool(reason)
+
+
+def add_rotation_arguments(parser):
+    parser.add_argument("--rotate", action="store_true",
+                        help=f"Move long conversations to a fresh chat after {DEFAULT_MAX_TURNS} turns, "
+                             f"{DEFAULT_MAX_NODES} DOM nodes or {DEFAULT_MAX_HEAP_MB} MB of JS heap.")
+    parser.add_argument("--rotate-turns", type=int, metavar="N", help="Rotate after this many turns (implies --rotate).")
+    parser.add_argument("--rotate-nodes", type=int, metavar="N", help="Rotate above this many DOM nodes (implies --rotate).")
+    parser.add_argument("--rotate-heap-mb", type=float, metavar="MB", help="Rotate above this JS heap size (implies --rotate).")
+    parser.add_argument("--rotate-preamble", default=DEFAULT_PREAMBLE, metavar="TEXT",
+                        help="Text that opens the first prompt of a rotated chat; @FILE reads it from a file.")
+    parser.add_argument("--rotate-carry", type=int, default=2, metavar="N",
+                        help="Exchanges carried over into the rotated chat (default 2).")
+
+
+def rotation_policy_from_args(args):
+    """The RotationPolicy the --rotate flags ask for, or None."""
+    if not (args.rotate or args.rotate_turns or args.rotate_nodes or args.rotate_heap_mb):
+        return None
+    preamble = args.rotate_preamble
+    if preamble and preamble.startswith("@"):
+        with open(preamble[1:], encoding="utf-8") as f:
+            preamble = f.read().strip()
+    return RotationPolicy(
+        max_turns=args.rotate_turns or DEFAULT_MAX_TURNS,
+        max_nodes=args.rotate_nodes or DEFAULT_MAX_NODES,
+        max_heap_mb=args.rotate_heap_mb or DEFAULT_MAX_HEAP_MB,
+        preamble=preamble,
+        carry_turns=args.rotate_carry,
+    )
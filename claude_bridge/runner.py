@@ -0,0 +1,400 @@
+"""The conversation runner behind both `start_chrome.py` scripts.
+
+The scripts only hold their prompts; this module attaches to the user's
+Chrome over CDP, sends each turn, waits for the answer and queues the
+response, its code blocks and its artifacts on a result sink. Independent
+prompts can be spread over a tab pool (`--tabs`), pipelined (`--pipeline`)
+or replayed from the response cache (`--cache`).
+
+    from claude_bridge.runner import main
+    main(["Show a code on code canvas.", "Thank you!"])
+"""
+import argparse
+import asyncio
+import os
+
+from playwright.async_api import async_playwright
+
+from .artifacts import artifact_name, extract_artifacts
+from .blocking import add_blocking_arguments, profile_from_args
+from .cache import ResponseCache, chain_context, get_cached_conversation
+from .completion import arm_completion_observer
+from .composer import click_send, enter_message, wait_for_chat_idle, wait_for_input_ready
+from .document import code_block_name, extract_document
+from .hedging import Hedger, HedgePolicy, add_hedging_arguments
+from .latency import DEFAULT_HISTORY_PATH, LatencyModel, send_with_retry, turn_counts, wait_for_settled_turn
+from .metrics import METRICS, count_driver_calls, profile_turn, span
+from .network import arm_network_capture, wait_for_capture
+from .pipeline import TurnPipeline
+from .pool import TabPool
+from .quota import QuotaScheduler, add_quota_arguments, scheduler_from_args
+from .rotation import ConversationRotator, add_rotation_arguments, rotation_policy_from_args
+from .session import CDP_URL, ClaudeSession
+from .sink import DirectorySink, add_sink_arguments, sink_from_args
+
+# The response deadline when the adaptive timeouts are turned off (--fixed-timeout).
+RESPONSE_TIMEOUT_MS = 120000
+# Where --profile traces go without --metrics.
+DEFAULT_TRACE_DIR = "FINAL WORK/metrics"
+# "poll" is the root script's old name for the copy-button wait.
+COMPLETION_MODES = ("observer", "network", "copy-button", "poll")
+
+
+async def extract_artifact_code(page, turn_number, sink, conversation="conversation"):
+    """Extracts every artifact of the latest turn and hands each to `sink` with its own extension.
+
+    The code is read from the editor state without reloading the page. Returns
+    the list of artifacts ({title, language, extension, content}).
+    """
+    try:
+        print("Checking for artifact buttons...")
+        artifacts = await extract_artifacts(page)
+        if not artifacts:
+            print("No artifact found in latest response.")
+            return []
+
+        for index, artifact in enumerate(artifacts):
+            path = await sink.put(conversation, turn_number, artifact_name(index, artifact), artifact["content"],
+                                  kind="artifact", title=artifact["title"], language=artifact["language"])
+            print(f"--- Artifact '{artifact['title']}' ({artifact['language'] or 'unknown language'}) saved to {path} ---")
+            content = artifact["content"]
+            preview = content[:500] + '...' if len(content) > 500 else content
+            print(f"Extracted code preview:\n{preview}")
+        return artifacts
+
+    except Exception as e:
+        print(f"An error occurred in extract_artifact_code: {e}")
+        return []
+
+
+async def send_message_and_wait(page, message, timeout=RESPONSE_TIMEOUT_MS, completion="observer", wait_ready=True):
+    """Sends a message and waits for a new, complete response. Returns (success, text).
+
+    completion="observer" waits on an in-page MutationObserver that only fires for
+    the new turn; completion="network" reads the exact markdown from the
+    completion stream with the observer as fallback; completion="copy-button"
+    (or "poll") waits for a new message group to show the copy button in its action bar.
+
+    With wait_ready=False the caller has already waited for the composer.
+    """
+    print(f"Sending: {message}")
+
+    if wait_ready:
+        print("Waiting for input box to be ready...")
+        with span("input_ready"):
+            await wait_for_input_ready(page)
+
+    # One verified insert replaces whatever is in the editor; very large prompts are attached as a file.
+    method = await enter_message(page, message)
+    print(f"Prompt entered via {method}.")
+
+    waiter = None
+    capture = None
+    if completion == "network":
+        capture = await arm_network_capture(page)
+        if not capture:
+            print("Network capture unavailable, using the completion observer.")
+    if completion in ("observer", "network"):
+        # Arm before sending so the observer's baseline excludes the new turn.
+        waiter = await arm_completion_observer(page)
+        if not waiter:
+            print("Completion observer unavailable, falling back to the Copy button wait.")
+
+    if not waiter:
+        # Code blocks and artifacts have Copy buttons too; only the new turn's action bar counts.
+        _, groups_before = await turn_counts(page)
+
+    await click_send(page)
+
+    print("Waiting for a new response to appear...")
+
+    if capture:
+        success, text, info = await wait_for_capture(capture, waiter, timeout)
+        if success:
+            print(f"Response is complete (from the {info['source']}, stop reason {info.get('stop_reason')}).")
+        return success, text
+
+    if waiter:
+        with span("completion"):
+            result = await waiter.wait(timeout)
+        if waiter.first_token_s is not None:
+            METRICS.observe("first_token", waiter.first_token_s)
+        if result is None:
+            print("Timeout: Did not receive a complete new response in time.")
+            return False, None
+        print(f"Response is complete (observer fired after {result['elapsed_ms']:.0f} ms).")
+        return True, result['text']
+
+    with span("completion"):
+        response_text = await wait_for_settled_turn(page, groups_before, timeout)
+    if response_text is None:
+        print("Timeout: Did not receive a complete new response in time.")
+        return False, None
+    print("Response is complete (Copy button found).")
+    return True, response_text
+
+
+def turn_sender(completion="observer", latency=None, retries=2, scheduler=None, timeout=RESPONSE_TIMEOUT_MS):
+    """An async `(page, message) -> (success, text)` for one turn.
+
+    With a LatencyModel the response deadline comes from earlier turns and a failed turn is retried;
+    without one the turn gets `timeout` ms and a single attempt.
+    With a QuotaScheduler the turn waits out usage limits and the submission rate is capped.
+    """
+    # send_with_retry already waits for the composer under its adaptive deadline.
+    send = lambda page, message, timeout: send_message_and_wait(page, message, timeout, completion,
+                                                                wait_ready=latency is None)
+    if scheduler:
+        send = scheduler.wrap(send)
+    if latency:
+        return lambda page, message: send_with_retry(page, message, send, latency, retries)
+    return lambda page, message: send(page, message, timeout)
+
+
+async def run_turn(page, turn_number, message, completion="observer", latency=None, retries=2, scheduler=None,
+                   sink=None, conversation="conversation", timeout=RESPONSE_TIMEOUT_MS):
+    """Sends one message, queues the response and its artifacts on `sink`. Returns (success, text, artifacts)."""
+    success, response_text = await turn_sender(completion, latency, retries, scheduler, timeout)(page, message)
+
+    if not success:
+        return False, response_text, []
+
+    if response_text:
+        printable_text = response_text[:1000] + '...' if len(response_text) > 1000 else response_text
+        print(f"Claude:\n{printable_text}")
+
+        with span("file_write", files=1):
+            file_path = await sink.put(conversation, turn_number, "response.txt", response_text, url=page.url)
+        print(f"--- Full response saved to {file_path} ---")
+
+    # One pass for prose and inline code blocks; the canvas is only opened for real artifacts.
+    document = await extract_document(page)
+    if document:
+        with span("file_write", files=len(document["code_blocks"]) + 1):
+            for block in document["code_blocks"]:
+                path = await sink.put(conversation, turn_number, code_block_name(block), block["code"],
+                                      kind="code", language=block["language"])
+                print(f"--- Code block saved to {path} ---")
+            await sink.put(conversation, turn_number, "response.json", document, kind="document")
+    artifacts = []
+    if document is None or document["artifacts"]:
+        artifacts = await extract_artifact_code(page, turn_number, sink, conversation)
+    return True, response_text, artifacts
+
+
+async def save_cached_turn(turn_number, entry, sink, conversation="conversation"):
+    """Queues a cached turn's response and artifacts like a live turn would."""
+    file_path = await sink.put(conversation, turn_number, "response.txt", entry["text"], cached=True)
+    print(f"--- Cached response saved to {file_path} ---")
+    for index, artifact in enumerate(entry["artifacts"]):
+        path = await sink.put(conversation, turn_number, artifact_name(index, artifact), artifact["content"],
+                              kind="artifact", cached=True)
+        print(f"--- Cached artifact code saved to {path} ---")
+
+
+async def run_prompts_in_pool(context, prompts, tabs, sink, cache=None, hedge=None, scheduler=None, blocking=None):
+    """Runs independent prompts concurrently on `tabs` claude.ai tabs and queues each response on `sink`.
+
+    With a HedgePolicy in `hedge`, prompts whose first token is late are also sent on an idle tab.
+    A BlockingProfile in `blocking` is applied to the pool's tabs only.
+    """
+    async with TabPool(context, size=tabs, cache=cache, scheduler=scheduler, blocking=blocking) as pool:
+        hedger = Hedger(pool, hedge) if hedge else None
+        results = await (hedger or pool).run(prompts)
+        for result in results:
+            n = result["index"] + 1
+            if not result["success"]:
+                print(f"Failed to get complete response for prompt {n} (tab {result['tab']})")
+                continue
+            source = "from cache" if result["cached"] else f"on tab {result['tab']}"
+            if result.get("hedged"):
+                source += f", hedged, {result['winner']} won"
+            # Every prompt ran in its own chat.
+            file_path = await sink.put(f"prompt_{n}", 1, "response.txt", result["text"], cached=result["cached"])
+            print(f"--- Response {n} ({result['elapsed_ms'] / 1000:.1f}s {source}) saved to {file_path} ---")
+        for health in pool.health():
+            print(f"Tab {health['tab']}: {health['completed']} completed, {health['failures']} failed, "
+                  f"{health['replacements']} replaced")
+        if hedger:
+            print(hedger.summary())
+    return results
+
+
+async def run_conversation(conversations, tabs=1, use_cache=False, metrics_dir=None, profile=None,
+                           completion="observer", blocking=None, hedge=None, retries=2,
+                           latency_history=DEFAULT_HISTORY_PATH, adaptive=True, scheduler=None,
+                           rotation=None, sink=None, pipeline=False, timeout=RESPONSE_TIMEOUT_MS):
+    """Sends `conversations` as turns of the chat in the user's claude.ai tab.
+
+    With tabs > 1 every prompt runs as its own chat on a tab pool instead.
+    A BlockingProfile in `blocking` is applied to the automation tabs only.
+    """
+    # Files are written by the sink's own thread; the loop only queues them.
+    sink = sink or DirectorySink()
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(CDP_URL)
+        context = browser.contexts[0]
+        session = ClaudeSession(context)
+        with span("page_attach"):
+            page = await session.page()
+        # Only the tab choice is saved; this run keeps working in the tab's current chat.
+        await session.close()
+        print(f"{'Reattached to' if session.reattached else 'Found'} claude.ai tab: {page.url}")
+
+        if blocking:
+            # Only the automation tab: the context is the user's own Chrome profile.
+            await blocking.apply(page)
+
+        try:
+            await page.bring_to_front()
+            # The composer accepting input is the app-ready signal; networkidle waits on analytics and fonts.
+            with span("page_ready"):
+                await wait_for_input_ready(page, timeout=30000)
+
+            cache = ResponseCache() if use_cache else None
+            latency = LatencyModel(latency_history) if adaptive else None
+            scheduler = scheduler or QuotaScheduler()
+            rotator = ConversationRotator(rotation) if rotation else None
+
+            if metrics_dir:
+                METRICS.configure(os.path.join(metrics_dir, "turns.jsonl"))
+                count_driver_calls(page)
+
+            if tabs > 1:
+                await run_prompts_in_pool(context, conversations, tabs, sink, cache, hedge, scheduler, blocking)
+                await sink.aclose()
+                print("\nAll prompts completed!")
+                print(sink.summary())
+                if blocking:
+                    print(blocking.summary())
+                return
+
+            if pipeline:
+                if rotator:
+                    print("--rotate is not applied to pipelined turns.")
+                runner = TurnPipeline(page, turn_sender(completion, latency, retries, scheduler, timeout), sink)
+                results = await runner.run(conversations)
+                if cache:
+                    # Post-processing finishes out of order, so the chained cache entries are added afterwards.
+                    cache_context = ""
+                    for result in results:
+                        if result["success"] and result["text"]:
+                            await cache.aput(result["prompt"], result["text"], cache_context,
+                                             result.get("artifacts") or [])
+                            cache_context = chain_context(cache_context, result["prompt"], result["text"])
+                await sink.aclose()
+                print("\nConversation completed!")
+                print(sink.summary())
+                if latency:
+                    print(latency.summary())
+                if blocking:
+                    print(blocking.summary())
+                return
+
+            if cache:
+                # Only replay from the cache when every turn hits, so a live turn never
+                # lands in a chat that is missing the earlier (cached) turns.
+                cached_turns = await get_cached_conversation(cache, conversations)
+                if cached_turns:
+                    for i, entry in enumerate(cached_turns):
+                        await save_cached_turn(i + 1, entry, sink)
+                    await sink.aclose()
+                    print(f"\nConversation served from cache: {await cache.astats()}")
+                    return
+
+            cache_context = ""
+            for i, message in enumerate(conversations):
+                print(f"\n--- Turn {i+1} ---")
+
+                stop_profile = None
+                if profile and (profile == "all" or i + 1 in profile):
+                    stop_profile = await profile_turn(context, i + 1, os.path.join(metrics_dir, f"trace_turn_{i+1}.zip"))
+
+                prompt = rotator.prepare(message) if rotator else message
+                with METRICS.turn(i + 1, prompt_chars=len(prompt)):
+                    success, response_text, artifacts = await run_turn(page, i + 1, prompt, completion,
+                                                                       latency, retries, scheduler, sink,
+                                                                       timeout=timeout)
+
+                if stop_profile:
+                    await stop_profile()
+                if metrics_dir:
+                    METRICS.write_prometheus(os.path.join(metrics_dir, "claude_bridge.prom"))
+
+                if not success:
+                    print(f"Failed to get complete response for turn {i+1} after {retries + 1 if latency else 1} attempt(s)")
+                    break
+
+                if cache and response_text:
+                    await cache.aput(message, response_text, cache_context, artifacts)
+                    cache_context = chain_context(cache_context, message, response_text)
+
+                if rotator:
+                    await rotator.maybe_rotate(page, message, response_text)
+
+                # The next turn starts once the chat is idle again, not after a fixed pause.
+                await wait_for_chat_idle(page, timeout=30000)
+
+            await sink.aclose()
+            print("\nConversation completed!")
+            print(sink.summary())
+            if latency:
+                print(latency.summary())
+            print(scheduler.summary())
+            if blocking:
+                print(blocking.summary())
+        finally:
+            # Flushes whatever is still queued (and ends a gzip/zstd archive cleanly) even if a turn raised.
+            await sink.aclose()
+            if blocking:
+                await blocking.remove()
+            await browser.close()
+
+
+def add_runner_arguments(parser, timeout=RESPONSE_TIMEOUT_MS):
+    parser.add_argument("--tabs", type=int, default=1,
+                        help="Run the prompts as independent chats spread over this many tabs.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse cached responses for prompts (and conversations) asked before.")
+    parser.add_argument("--metrics", metavar="DIR",
+                        help="Write per-turn phase timings (turns.jsonl) and a Prometheus textfile to DIR.")
+    parser.add_argument("--profile", metavar="TURNS",
+                        help="Record a Playwright trace for these turns, e.g. '1,3' or 'all'.")
+    parser.add_argument("--completion", choices=COMPLETION_MODES, default="observer",
+                        help="How to detect the end of a turn; 'network' reads the answer from the completion stream.")
+    add_blocking_arguments(parser)
+    add_hedging_arguments(parser)
+    add_quota_arguments(parser)
+    add_rotation_arguments(parser)
+    add_sink_arguments(parser)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Send the next turn as soon as an answer is captured and save, parse and read "
+                             "artifacts in the background.")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retry a failed turn this many times, with jittered exponential backoff.")
+    parser.add_argument("--latency-history", default=DEFAULT_HISTORY_PATH, metavar="PATH",
+                        help="JSON-lines latency history the adaptive timeouts are derived from.")
+    parser.add_argument("--fixed-timeout", action="store_true",
+                        help=f"Give every turn a fixed {timeout // 1000}s deadline and one attempt "
+                             "instead of adaptive timeouts and retries.")
+
+
+async def _main(conversations, args, timeout):
+    profile = None
+    if args.profile:
+        profile = "all" if args.profile == "all" else {int(turn) for turn in args.profile.split(",")}
+    await run_conversation(conversations, tabs=args.tabs, use_cache=args.cache,
+                           metrics_dir=args.metrics or (DEFAULT_TRACE_DIR if profile else None), profile=profile,
+                           completion=args.completion, blocking=profile_from_args(args),
+                           hedge=HedgePolicy(percentile=args.hedge_percentile) if args.hedge else None,
+                           retries=args.retries, latency_history=args.latency_history,
+                           adaptive=not args.fixed_timeout, scheduler=scheduler_from_args(args),
+                           rotation=rotation_policy_from_args(args), sink=sink_from_args(args),
+                           pipeline=args.pipeline, timeout=timeout)
+
+
+def main(conversations, timeout=RESPONSE_TIMEOUT_MS, argv=None):
+    """Parses the command line and runs `conversations`; `timeout` is the --fixed-timeout deadline in ms."""
+    parser = argparse.ArgumentParser()
+    add_runner_arguments(parser, timeout)
+    asyncio.run(_main(conversations, parser.parse_args(argv), timeout))
@@ -0,0 +1,191 @@
+"""One registry of selector strategies for every part of the claude.ai UI the bridge touches.
+
+Each concept (the composer, the send button, the copy icon, ...) has a list
+of candidate strategies. A strategy is a CSS selector, optionally with text
+the element must contain. `probe()` checks every strategy of every requested
+concept in one synchronous in-page pass and returns at once. A missing
+element is reported within the same frame instead of after a chain of
+per-selector timeouts. The strategy that matched is remembered and tried
+first from then on.
+
+Observer scripts take `REGISTRY.css(concept)`, the CSS strategies joined into
+one selector list, so any of them satisfies the observer.
+"""
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from .bindings import helper, register_helper
+
+# concept -> [(css, text or None), ...] in order of preference
+SELECTORS = {
+    "input": [
+        ('div[contenteditable="true"]', None),
+        ('div.ProseMirror[contenteditable]', None),
+        ('fieldset [contenteditable]', None),
+    ],
+    "send_button": [
+        ('button[aria-label="Send message"]', None),
+        ('button[aria-label="Send Message"]', None),
+        ('fieldset button[type="submit"]', None),
+    ],
+    "stop_button": [
+        ('button[aria-label="Stop response"]', None),
+        ('button[aria-label="Stop Response"]', None),
+        ('fieldset button[aria-label^="Stop"]', None),
+    ],
+    "user_message": [
+        ('[data-testid="user-message"]', None),
+        ("div.font-user-message", None),
+    ],
+    "limit_banner": [
+        ('[role="alert"]', None),
+        ('[role="status"]', None),
+        ('[data-testid*="limit"]', None),
+        ('[data-testid*="banner"]', None),
+    ],
+    "message_group": [
+        ("[data-is-streaming]", None),
+    ],
+    "message": [
+        ("div.font-claude-message", None),
+        ("div.font-claude-response", None),
+    ],
+    "last_message": [
+        ("div[data-scroll-anchor]", None),
+        ("div.font-claude-message", None),
+    ],
+    "copy_button": [
+        ('svg[data-testid="action-bar-copy"]', None),
+        ('button[data-testid="action-bar-copy"]', None),
+        ('button[aria-label="Copy"]', None),
+    ],
+    "artifact_button": [
+        ('button[aria-label="Preview contents"]', None),
+        ("button", "Open Code Canvas"),
+    ],
+    "canvas_content": [
+        (".cm-content", None),
+        ('.cm-editor [role="textbox"]', None),
+    ],
+    "close_button": [
+        ('button[aria-label="Close"]', None),
+        ('button[aria-label="Close artifact"]', None),
+    ],
+}
+
+PROBE_JS = """([concepts, scopeSel, visibleOnly]) => {
+    let root = document;
+    if (scopeSel) {
+        const scopes = document.querySelectorAll(scopeSel);
+        if (scopes.length === 0) return null;
+        root = scopes[scopes.length - 1];
+    }
+    const visible = (el) => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+    const found = {};
+    for (const [concept, strategies] of concepts) {
+        found[concept] = null;
+        for (let i = 0; i < strategies.length; i++) {
+            const [css, text] = strategies[i];
+            let elements;
+            try {
+                elements = Array.from(root.querySelectorAll(css));
+            } catch (e) {
+                continue;  // a selector this browser can't parse
+            }
+            if (text) elements = elements.filter((el) => (el.textContent || '').includes(text));
+            if (visibleOnly) elements = elements.filter(visible);
+            if (elements.length === 0) continue;
+            found[concept] = {
+                strategy: i,
+                count: elements.length,
+                labels: elements.slice(0, 50).map((el) => (el.innerText || el.getAttribute('aria-label') || '').trim()),
+            };
+            break;
+        }
+    }
+    return found;
+}"""
+
+WAIT_JS = """([concepts, scopeSel, visibleOnly]) => {
+    const found = (%s)([concepts, scopeSel, visibleOnly]);
+    return found && Object.values(found).some((match) => match) ? found : null;
+}""" % PROBE_JS
+register_helper("probe", PROBE_JS)
+register_helper("waitFor", WAIT_JS)
+
+
+def _playwright_selector(css, text):
+    if not text:
+        return css
+    return f'{css}:has-text("{text}")'
+
+
+class SelectorRegistry:
+    """Ordered selector strategies per concept, with the last winning strategy tried first."""
+
+    def __init__(self, strategies=None):
+        self.strategies = {concept: list(options) for concept, options in (strategies or SELECTORS).items()}
+        self.winners = {}  # concept -> strategy that matched last
+
+    def ordered(self, concept):
+        options = self.strategies[concept]
+        winner = self.winners.get(concept)
+        if winner in options:
+            return [winner] + [option for option in options if option != winner]
+        return list(options)
+
+    def selector(self, concept):
+        """The Playwright selector of the preferred strategy (the last winner, else the first)."""
+        return _playwright_selector(*self.ordered(concept)[0])
+
+    def css(self, concept):
+        """All text-free strategies joined into one CSS selector list, preferred first."""
+        return ", ".join(css for css, text in self.ordered(concept) if not text)
+
+    def _args(self, order, scope, visible):
+        return [
+            [[concept, [list(option) for option in options]] for concept, options in order.items()],
+            self.css(scope) if scope else None,
+            visible,
+        ]
+
+    def _remember(self, order, found):
+        matches = {}
+        for concept, options in order.items():
+            match = (found or {}).get(concept)
+            if match is None:
+                matches[concept] = None
+                continue
+            option = options[match["strategy"]]
+            self.winners[concept] = option
+            matches[concept] = {
+                "selector": _playwright_selector(*option),
+                "count": match["count"],
+                "labels": match["labels"],
+            }
+        return matches
+
+    async def probe(self, page, *concepts, scope=None, visible=False):
+        """Checks every strategy of `concepts` in one evaluate.
+
+        Returns {concept: {"selector", "count", "labels"} or None}. With
+        `scope`, only the last element matching that concept is searched.
+        """
+        order = {concept: self.ordered(concept) for concept in concepts}
+        found = await page.evaluate(helper(page, "probe"), self._args(order, scope, visible))
+        return self._remember(order, found)
+
+    async def wait_for(self, page, *concepts, timeout=10000, scope=None, visible=True):
+        """Waits, checking once per animation frame, until any of `concepts` matches.
+
+        Returns the same dict as `probe()`, or None on timeout.
+        """
+        order = {concept: self.ordered(concept) for concept in concepts}
+        try:
+            handle = await page.wait_for_function(
+                helper(page, "waitFor"), arg=self._args(order, scope, visible), polling="raf", timeout=timeout)
+        except PlaywrightTimeoutError:
+            return None
+        return self._remember(order, await handle.json_value())
+
+
+REGISTRY = SelectorRegistry()
@@ -0,0 +1,222 @@
+"""Getting to a ready claude.ai composer as fast as possible at startup.
+
+A cold run used to scan every tab for claude.ai, bring it to the front, wait
+for the page, and (in `temp_claude_script.py`) click a "new chat" button.
+That button was found by the shape of its SVG icon and given 5 s to appear.
+`ClaudeSession` cuts this down:
+
+- The CDP target id of the tab it uses is remembered in a small state file.
+  The next run looks that id up in the browser's `/json/list` and takes the
+  matching page directly, with no scan and no probing of other tabs.
+- It keeps spare tabs that are already loaded on an empty new chat. A run
+  that needs a new chat takes a spare, whose composer is ready at once. The
+  tab it used last is sent back to `/new` in the background and becomes the
+  next run's spare, so the number of tabs stays the same.
+- The in-page helpers (selector probes, observers, the document walker) are
+  installed once per page with `add_init_script` (`bindings.install_helpers`).
+  Later evaluates send a one-line call instead of the full function source.
+
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(CDP_URL)
+        session = ClaudeSession(browser.contexts[0])
+        page = await session.new_chat_page()
+        ...
+        await session.close()
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+
+from .bindings import install_helpers
+from .composer import wait_for_input_ready
+from .metrics import span
+
+CDP_URL = "http://localhost:9222"
+NEW_CHAT_URL = "https://claude.ai/new"
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "claude_bridge", "session.json")
+
+
+def find_claude_page(context):
+    """The first claude.ai page in the context, or None."""
+    for page in context.pages:
+        if "claude.ai" in page.url:
+            return page
+    return None
+
+
+def _is_new_chat(url):
+    return url.rstrip("/") == NEW_CHAT_URL
+
+
+async def target_id(page):
+    """The page's CDP target id, or None."""
+    try:
+        cdp = await page.context.new_cdp_session(page)
+    except Exception:
+        return None
+    try:
+        return (await cdp.send("Target.getTargetInfo"))["targetInfo"]["targetId"]
+    except Exception:
+        return None
+    finally:
+        try:
+            await cdp.detach()
+        except Exception:
+            pass
+
+
+class ClaudeSession:
+    """Reattaches to the bridge's claude.ai tab and keeps `spares` new-chat tabs loaded for the next run.
+
+    Its messages go to stderr: `temp_claude_script.py` callers read the answer from stdout.
+    """
+
+    def __init__(self, context, state_path=DEFAULT_STATE_PATH, spares=1, cdp_url=CDP_URL):
+        self.context = context
+        self.state_path = state_path
+        self.spares = spares
+        self.cdp_url = cdp_url
+        self.state = self._load()
+        self.active = None
+        self.reattached = False
+        self._targets = None
+        self._ids = {}  # page -> target id, for the pages this session knows
+        self._pending = []  # background navigations that must commit before the process exits
+        self.started = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        if not self.state_path:
+            return
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _list_targets(self):
+        with urllib.request.urlopen(f"{self.cdp_url}/json/list", timeout=2) as response:
+            return {target["id"]: target["url"] for target in json.load(response) if target.get("type") == "page"}
+
+    async def _target_urls(self):
+        """{target id: url} of every tab, from the browser's HTTP endpoint; {} if it can't be read."""
+        if self._targets is None:
+            try:
+                self._targets = await asyncio.get_running_loop().run_in_executor(None, self._list_targets)
+            except Exception as e:
+                print(f"Could not list browser targets: {e}", file=sys.stderr)
+                self._targets = {}
+        return self._targets
+
+    async def _page_for(self, target):
+        """The Page of a remembered target id, or None if the tab is gone."""
+        url = (await self._target_urls()).get(target)
+        if url is None:
+            return None
+        candidates = [page for page in self.context.pages if page.url == url]
+        if len(candidates) > 1:
+            # Several tabs on the same URL (e.g. spares on /new): ask only those for their ids.
+            candidates = [page for page in candidates if await self._id(page) == target]
+        if not candidates:
+            return None
+        self._ids[candidates[0]] = target
+        return candidates[0]
+
+    async def _id(self, page):
+        if page not in self._ids:
+            self._ids[page] = await target_id(page)
+        return self._ids[page]
+
+    async def _adopt(self, page):
+        """Makes `page` the session's tab and remembers it for the next run."""
+        self.active = page
+        self.state["target_id"] = await self._id(page)
+        self.state["url"] = page.url
+        self.state["updated_at"] = time.time()
+        await install_helpers(page)
+        return page
+
+    async def page(self):
+        """The bridge's claude.ai tab: the one used last time if it is still open, else the first one found."""
+        if self.active and not self.active.is_closed():
+            return self.active
+        with span("session_attach"):
+            target = self.state.get("target_id")
+            page = await self._page_for(target) if target else None
+            self.reattached = page is not None
+            page = page or find_claude_page(self.context)
+            if not page:
+                page = await self.context.new_page()
+                await page.goto(NEW_CHAT_URL, wait_until="commit")
+            return await self._adopt(page)
+
+    async def _take_spare(self):
+        spares = self.state.get("spares") or []
+        for index, target in enumerate(spares):
+            page = await self._page_for(target)
+            if page and _is_new_chat(page.url) and page is not self.active:
+                self.state["spares"] = spares[:index] + spares[index + 1:]
+                return page
+        self.state["spares"] = []
+        return None
+
+    async def _open_spare(self, page=None):
+        """Sends `page` (or a new tab) to /new in the background and records it as a spare."""
+        page = page or await self.context.new_page()
+        self.state.setdefault("spares", []).append(await self._id(page))
+        self._pending.append(asyncio.create_task(page.goto(NEW_CHAT_URL, wait_until="commit")))
+
+    async def new_chat_page(self, timeout=30000):
+        """A tab on an empty new chat with its composer ready.
+
+        Takes a preloaded spare if one is left from an earlier run; the tab
+        used before becomes the next spare. Without a spare, the session's own
+        tab is navigated to a new chat.
+        """
+        with span("session_new_chat"):
+            previous = await self.page()
+            spare = None
+            if not _is_new_chat(previous.url):
+                spare = await self._take_spare() if self.spares else None
+                if spare:
+                    await self._adopt(spare)
+                    await self._open_spare(previous)
+                else:
+                    await previous.goto(NEW_CHAT_URL, wait_until="commit")
+            while len(self.state.get("spares") or []) < self.spares:
+                await self._open_spare()
+            await self.active.bring_to_front()
+            await wait_for_input_ready(self.active, timeout)
+        print(f"Composer ready {(time.monotonic() - self.started) * 1000:.0f} ms after the session started "
+              f"({'preloaded tab' if spare else 'navigated'}, {'reattached' if self.reattached else 'scanned'}).",
+              file=sys.stderr)
+        return self.active
+
+    async def close(self):
+        """Waits for background navigations to commit and saves the state for the next run."""
+        if self._pending:
+            results = await asyncio.gather(*self._pending, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Could not preload a new chat: {result}", file=sys.stderr)
+            self._pending = []
+        if self.active:
+            self.state["url"] = self.active.url
+        self._save()
+
+    def stats(self):
+        return {
+            "target_id": self.state.get("target_id"),
+            "reattached": self.reattached,
+            "spares": len(self.state.get("spares") or []),
+        }
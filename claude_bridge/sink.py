@@ -0,0 +1,272 @@
+"""Writing results from a background thread, so disk I/O never blocks a turn.
+
+A `ResultSink` takes responses, documents, code blocks and artifacts from the
+event loop and puts them on a bounded queue. A writer thread drains the queue
+in batches. Whatever piled up while the last batch was being written goes out
+in one write and one flush. `put` returns at once unless the queue is full.
+In that case it waits in an executor thread (never on the loop) until the
+writer catches up, and the time it waited is reported in `stats()`.
+
+Every item is named `<conversation>/turn_NNN_<name>` inside a run, and a
+name that is already taken gets a `_2`, `_3`, ... suffix. Runs are kept apart
+by a run id: a directory per run for `DirectorySink`, a `run` field on
+every line for `JsonlSink`. So a re-run never overwrites an earlier one.
+
+Backends:
+
+- `DirectorySink(root)`: one file per item under `<root>/<run id>/`.
+- `JsonlSink(path)`: one JSON line per item, appended to `path`.
+- `JsonlSink(path, compression="gzip" | "zstd")`: the same, compressed.
+  zstd needs the optional `zstandard` package.
+"""
+import asyncio
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_ROOT = "FINAL WORK"
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_BATCH_SIZE = 200
+_STOP = object()
+
+
+def new_run_id():
+    """A sortable id for this run: start time plus process id."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+def _slug(value):
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("._") or "item"
+
+
+class ResultSink:
+    """Queues results and writes them from a writer thread. Subclasses implement the storage."""
+
+    def __init__(self, run=None, max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE):
+        self.run = run or new_run_id()
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._names = set()
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.bytes = 0
+        self.errors = 0
+        self.blocked_s = 0.0
+        self.write_s = 0.0
+        self.max_depth = 0
+        self.last_error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._drain, name=f"result-sink-{self.run}", daemon=True)
+        self._thread.start()
+
+    # Storage, called from the writer thread only.
+
+    def location(self, name):
+        """Where an item named `name` ends up, for log messages."""
+        raise NotImplementedError
+
+    def _write(self, records):
+        raise NotImplementedError
+
+    def _flush(self):
+        pass
+
+    def _close(self):
+        pass
+
+    # Event-loop side.
+
+    def _claim(self, conversation, turn, name):
+        name = f"{_slug(conversation)}/turn_{turn:03d}_{_slug(name)}"
+        stem, extension = os.path.splitext(name)
+        counter = 2
+        while name in self._names:
+            name = f"{stem}_{counter}{extension}"
+            counter += 1
+        self._names.add(name)
+        return name
+
+    async def put(self, conversation, turn, name, content, kind="response", **fields):
+        """Queues one item and returns its location. `content` is text, or anything JSON-serializable.
+
+        Extra `fields` (a chat URL, a language, ...) are kept on the JSONL record.
+        """
+        if self._closed:
+            raise RuntimeError("The result sink is closed.")
+        name = self._claim(conversation, turn, name)
+        record = {"run": self.run, "conversation": str(conversation), "turn": turn, "kind": kind, "name": name,
+                  "content": content, "written_at": time.time(), **fields}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            started = time.monotonic()
+            await asyncio.get_running_loop().run_in_executor(None, self._queue.put, record)
+            self.blocked_s += time.monotonic() - started
+        self.queued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return self.location(name)
+
+    def _drain(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            if not records:
+                continue
+            started = time.monotonic()
+            try:
+                self._write(records)
+                self._flush()
+                self.written += len(records)
+            except Exception as e:
+                self.errors += len(records)
+                self.last_error = str(e)
+                print(f"Result sink could not write {len(records)} item(s): {e}")
+            self.batches += 1
+            self.write_s += time.monotonic() - started
+        try:
+            self._close()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Result sink could not close cleanly: {e}")
+
+    def close(self):
+        """Writes everything still queued and stops the writer thread. Blocks; use `aclose` on the loop."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def stats(self):
+        return {
+            "run": self.run,
+            "queued": self.queued,
+            "written": self.written,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "max_depth": self.max_depth,
+            "blocked_s": round(self.blocked_s, 3),
+            "write_s": round(self.write_s, 3),
+            "last_error": self.last_error,
+        }
+
+    def summary(self):
+        return (f"Results: {self.written} item(s) ({self.bytes / 1024:.0f} KiB) in {self.batches} batch(es) "
+                f"to {self.location('')}, {self.write_s:.2f}s writing off the event loop, "
+                f"{self.blocked_s:.2f}s of backpressure, {self.errors} error(s).")
+
+
+class DirectorySink(ResultSink):
+    """One file per item: <root>/<run id>/<conversation>/turn_NNN_<name>."""
+
+    def __init__(self, root=DEFAULT_ROOT, **kwargs):
+        self.root = root
+        super().__init__(**kwargs)
+
+    def location(self, name):
+        return os.path.join(self.root, self.run, *name.split("/"))
+
+    def _write(self, records):
+        for record in records:
+            path = self.location(record["name"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            content = record["content"]
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False, indent=2)
+            data = content.encode("utf-8")
+            with open(path, "wb") as f:
+                f.write(data)
+            self.bytes += len(data)
+
+
+class JsonlSink(ResultSink):
+    """Appends one JSON line per item to `path`, optionally gzip or zstd compressed.
+
+    Appending to an existing archive adds a new gzip member or zstd frame;
+    both formats decompress such files as one stream.
+    """
+
+    def __init__(self, path, compression=None, **kwargs):
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd output needs the zstandard package (pip install zstandard).")
+        self.path = path
+        self.compression = compression
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if compression == "gzip":
+            self._file = gzip.open(path, "ab")
+        elif compression == "zstd":
+            self._file = zstandard.ZstdCompressor().stream_writer(open(path, "ab"))
+        else:
+            self._file = open(path, "ab")
+        super().__init__(**kwargs)
+
+    def location(self, name):
+        return f"{self.path}#{self.run}/{name}" if name else self.path
+
+    def _write(self, records):
+        data = b"".join(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" for record in records)
+        self._file.write(data)
+        self.bytes += len(data)
+
+    def _flush(self):
+        if self.compression == "zstd":
+            self._file.flush(zstandard.FLUSH_FRAME)
+        else:
+            self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+SINK_EXTENSIONS = {"jsonl": ".jsonl", "gz": ".jsonl.gz", "zst": ".jsonl.zst"}
+
+
+def make_sink(kind="dir", path=None, **kwargs):
+    """A sink by name: "dir", "jsonl", "gz" or "zst". `path` defaults to FINAL WORK/."""
+    if kind == "dir":
+        return DirectorySink(path or DEFAULT_ROOT, **kwargs)
+    path = path or os.path.join(DEFAULT_ROOT, "results" + SINK_EXTENSIONS[kind])
+    return JsonlSink(path, compression={"jsonl": None, "gz": "gzip", "zst": "zstd"}[kind], **kwargs)
+
+
+def add_sink_arguments(parser):
+    parser.add_argument("--sink", choices=("dir", "jsonl", "gz", "zst"), default="dir",
+                        help="Where results go: a directory per run (default), or one appended JSONL file, "
+                             "plain, gzip or zstd.")
+    parser.add_argument("--sink-path", metavar="PATH",
+                        help=f"Root directory or JSONL file for results (default '{DEFAULT_ROOT}').")
+    parser.add_argument("--sink-queue", type=int, default=DEFAULT_MAX_PENDING, metavar="N",
+                        help="Results that may wait for the writer thread before turns are held back.")
+
+
+def sink_from_args(args):
+    return make_sink(args.sink, args.sink_path, max_pending=args.sink_queue)
@@ -0,0 +1,246 @@
+"""Streaming a claude.ai response as it is written.
+
+The observer tracks the text nodes of the new `div.font-claude-message` and
+pushes only what was appended since the last flush, so long answers are not
+re-read in full on every tick. When the renderer rewrites earlier text (for
+example when a code fence is re-highlighted) the observer falls back to
+sending one full snapshot, which Python turns back into a delta whenever it is
+still a pure append.
+"""
+import asyncio
+import time
+
+from .bindings import add_handler, ensure_binding, helper, register_helper, remove_handler, BINDING_NAME
+from .composer import submit_message
+from .selectors import REGISTRY
+
+STREAM_OBSERVER_JS = """([token, binding, groupSel, copySel, messageSel, flushMs]) => {
+    const registry = window.__claudeBridgeObservers || (window.__claudeBridgeObservers = {});
+    const baseline = document.querySelectorAll(groupSel).length;
+    const started = performance.now();
+    let group = null;
+    let message = null;
+    let lastNode = null;
+    let emitted = new WeakMap();
+    let buffer = '';
+    let resetPending = false;
+    let timer = null;
+
+    const textNodes = (root) => {
+        if (root.nodeType === Node.TEXT_NODE) return [root];
+        const nodes = [];
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode()) nodes.push(walker.currentNode);
+        return nodes;
+    };
+    const snapshot = () => {
+        emitted = new WeakMap();
+        lastNode = null;
+        for (const node of textNodes(message)) {
+            emitted.set(node, node.data);
+            lastNode = node;
+        }
+    };
+    const flush = () => {
+        timer = null;
+        if (resetPending) {
+            resetPending = false;
+            buffer = '';
+            snapshot();
+            window[binding](token, 'reset', message.textContent);
+        } else if (buffer) {
+            const chunk = buffer;
+            buffer = '';
+            window[binding](token, 'delta', chunk);
+        }
+    };
+    const schedule = () => {
+        if (!timer) timer = setTimeout(flush, flushMs);
+    };
+    const push = (text) => {
+        if (!text) return;
+        buffer += text;
+        schedule();
+    };
+    const reset = () => {
+        resetPending = true;
+        schedule();
+    };
+    const follows = (node) =>
+        !lastNode || !!(lastNode.compareDocumentPosition(node) & Node.DOCUMENT_POSITION_FOLLOWING);
+    const holdsEmittedText = (node) => textNodes(node).some((t) => (emitted.get(t) || '').length > 0);
+
+    const attach = () => {
+        const groups = document.querySelectorAll(groupSel);
+        if (groups.length <= baseline) return false;
+        group = groups[groups.length - 1];
+        const found = group.querySelector(messageSel);
+        if (!found) return false;
+        const reattached = message !== null;
+        message = found;
+        if (reattached) {
+            reset();
+        } else {
+            snapshot();
+            push(message.textContent);
+        }
+        return true;
+    };
+
+    const handle = (records) => {
+        for (const record of records) {
+            if (resetPending) return;
+            if (!message.contains(record.target)) continue;
+            if (record.type === 'characterData') {
+                const node = record.target;
+                const before = emitted.get(node);
+                if (before === undefined) {
+                    if (!follows(node)) { reset(); continue; }
+                    emitted.set(node, node.data);
+                    lastNode = node;
+                    push(node.data);
+                } else if (node.data === before) {
+                    continue;
+                } else if (node === lastNode && node.data.startsWith(before)) {
+                    push(node.data.slice(before.length));
+                    emitted.set(node, node.data);
+                } else {
+                    reset();
+                }
+            } else if (record.type === 'childList') {
+                for (const node of record.removedNodes) {
+                    if (holdsEmittedText(node)) { reset(); break; }
+                }
+                if (resetPending) return;
+                for (const node of record.addedNodes) {
+                    for (const text of textNodes(node)) {
+                        if (emitted.has(text) || !text.isConnected) continue;
+                        if (!follows(text)) { reset(); break; }
+                        emitted.set(text, text.data);
+                        lastNode = text;
+                        push(text.data);
+                    }
+                    if (resetPending) return;
+                }
+            }
+        }
+    };
+
+    const observer = new MutationObserver((records) => {
+        if (!message || !message.isConnected) {
+            if (!attach()) return;
+        } else {
+            handle(records);
+        }
+        if (group.getAttribute('data-is-streaming') !== 'false' || !group.querySelector(copySel)) return;
+        observer.disconnect();
+        clearTimeout(timer);
+        delete registry[token];
+        window[binding](token, 'done', {
+            text: message.textContent,
+            elapsed_ms: performance.now() - started,
+        });
+    });
+    observer.observe(document.body, {
+        childList: true,
+        subtree: true,
+        characterData: true,
+        attributes: true,
+        attributeFilter: ['data-is-streaming', 'data-testid'],
+    });
+    registry[token] = {
+        disconnect: () => {
+            observer.disconnect();
+            clearTimeout(timer);
+        },
+    };
+    return baseline;
+}"""
+
+register_helper("streamObserver", STREAM_OBSERVER_JS)
+
+
+async def stream_response(page, message, timeout=120000, flush_ms=50):
+    """Sends `message` and yields events while Claude writes the answer.
+
+    Events are dicts:
+      {"type": "delta", "text": ...}  newly appended text
+      {"type": "reset", "text": ...}  the whole text so far, when earlier text was rewritten
+      {"type": "final", "complete": bool, "text": ..., "elapsed_ms": ..., "first_token_ms": ...}
+    The final event is always last; `complete` is False on timeout.
+    """
+    if not await ensure_binding(page):
+        raise RuntimeError("The bridge binding is required for streaming but could not be exposed.")
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    token = add_handler(page, lambda kind, payload: events.put_nowait((kind, payload)))
+    text = ""
+    first_token_ms = None
+
+    def reconcile(full_text):
+        # Turns a full snapshot back into a delta when it only appends to what we have.
+        nonlocal text
+        if full_text.startswith(text):
+            event = {"type": "delta", "text": full_text[len(text):]}
+        else:
+            event = {"type": "reset", "text": full_text}
+        text = full_text
+        return event
+
+    try:
+        await page.evaluate(
+            helper(page, "streamObserver"),
+            [token, BINDING_NAME, REGISTRY.css("message_group"), REGISTRY.css("copy_button"),
+             REGISTRY.css("message"), flush_ms],
+        )
+        await submit_message(page, message)
+        started = time.monotonic()
+        deadline = loop.time() + timeout / 1000
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                kind, payload = await asyncio.wait_for(events.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+            if kind == "done":
+                event = reconcile(payload["text"])
+            elif kind == "reset":
+                event = reconcile(payload)
+            else:
+                text += payload
+                event = {"type": "delta", "text": payload}
+
+            if event["text"]:
+                if first_token_ms is None:
+                    first_token_ms = (time.monotonic() - started) * 1000
+                yield event
+
+            if kind == "done":
+                yield {
+                    "type": "final",
+                    "complete": True,
+                    "text": text,
+                    "elapsed_ms": (time.monotonic() - started) * 1000,
+                    "first_token_ms": first_token_ms,
+                }
+                return
+
+        print("Timeout: Did not receive a complete response in time.")
+        yield {
+            "type": "final",
+            "complete": False,
+            "text": text,
+            "elapsed_ms": (time.monotonic() - started) * 1000,
+            "first_token_ms": first_token_ms,
+        }
+    finally:
+        remove_handler(page, token)
+        try:
+            await page.evaluate(helper(page, "disarm"), token)
+        except Exception:
+            pass
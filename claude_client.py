@@ -0,0 +1,92 @@
+"""Thin client for the claude_bridge daemon.
+
+Reads a prompt from stdin, sends it to the running daemon and prints the
+response. It only uses the standard library, so it starts instantly:
+
+    echo "Explain generators" | python claude_client.py
+    cat prompt.txt | python claude_client.py --stream
+    python claude_client.py --health
+"""
+import argparse
+import json
+import socket
+import sys
+
+DEFAULT_SOCKET = "/tmp/claude_bridge.sock"
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+
+def connect(socket_path, port):
+    if port:
+        return socket.create_connection(("127.0.0.1", port))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    return sock
+
+
+def request(payload, socket_path=DEFAULT_SOCKET, port=None):
+    """Sends one request and yields each NDJSON line the daemon answers with."""
+    with connect(socket_path, port) as sock:
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("r", encoding="utf-8") as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a prompt from stdin to the claude_bridge daemon.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Daemon Unix socket path.")
+    parser.add_argument("--port", type=int, help="Daemon localhost TCP port (instead of --socket).")
+    parser.add_argument("--stream", action="store_true", help="Write the response as it is generated.")
+    parser.add_argument("--keep-chat", action="store_true", help="Continue the tab's current chat.")
+    parser.add_argument("--timeout", type=int, default=120000, help="Response timeout in ms.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the daemon's response cache.")
+    parser.add_argument("--json", action="store_true", help="Print the raw NDJSON events.")
+    parser.add_argument("--health", action="store_true", help="Print daemon health and exit.")
+    args = parser.parse_args()
+
+    if args.health:
+        payload = {"op": "health"}
+    else:
+        payload = {
+            "op": "prompt",
+            "prompt": sys.stdin.read(),
+            "stream": args.stream,
+            "new_chat": not args.keep_chat,
+            "timeout": args.timeout,
+            "cache": not args.no_cache,
+        }
+
+    try:
+        events = request(payload, args.socket, args.port)
+        for event in events:
+            if args.json or event["type"] == "health":
+                print(json.dumps(event), flush=True)
+                continue
+            if event["type"] in ("delta", "reset"):
+                if event["type"] == "reset":
+                    print("\n[earlier response text was rewritten; full text follows]", file=sys.stderr)
+                sys.stdout.write(event["text"])
+                sys.stdout.flush()
+            elif event["type"] == "final":
+                if not event["complete"]:
+                    print(f"Error: {event.get('error') or 'no complete response in time'}", file=sys.stderr)
+                    return 1
+                if args.stream:
+                    sys.stdout.write("\n")
+                else:
+                    print(event["text"].strip())
+            elif event["type"] == "error":
+                print(f"Error: {event['error']}", file=sys.stderr)
+                return 1
+    except OSError as e:
+        print(f"Error: could not reach the claude_bridge daemon ({e}). "
+              f"Start it with: python -m claude_bridge.daemon", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,56 +1,41 @@
+import argparse
 import asyncio
 from playwright.async_api import async_playwright
 import sys
 
+from claude_bridge import send_and_wait, stream_network_response, stream_response
+from claude_bridge.cache import ResponseCache
+from claude_bridge.session import CDP_URL, ClaudeSession
+
 # Increase the max size of the standard output buffer
 # This is crucial for handling large outputs like generated code
 sys.stdout.reconfigure(encoding='utf-8')
 
-async def get_claude_response(prompt):
+async def get_claude_response(prompt, stream=False, network=False):
     """
     Connects to Chrome, sends a single prompt to Claude, and returns the response.
+    With stream=True the response is written to stdout as it is generated.
+    With network=True it is read from the completion stream as exact markdown.
     """
     async with async_playwright() as p:
+        session = None
         try:
-            browser = await p.chromium.connect_over_cdp("http://localhost:9222")
-            context = browser.contexts[0]
-            
-            page = None
-            for p_iter in context.pages:
-                if "claude.ai" in p_iter.url:
-                    page = p_iter
-                    break
-            
-            if not page:
-                print("Error: Could not find an open tab with claude.ai.", file=sys.stderr)
-                return None
-
-            await page.bring_to_front()
+            browser = await p.chromium.connect_over_cdp(CDP_URL)
+            # Start a new chat to ensure a clean slate: a tab preloaded on /new by the
+            # previous run if there is one, else the remembered tab navigated there.
+            session = ClaudeSession(browser.contexts[0])
+            page = await session.new_chat_page()
 
-            # Start a new chat to ensure a clean slate
-            try:
-                new_chat_button_locator = page.locator("button:has(svg > path[d^='M10 3'])")
-                await new_chat_button_locator.wait_for(state="visible", timeout=5000)
-                await new_chat_button_locator.click()
-                await page.locator("div[contenteditable='true']").wait_for(state="visible", timeout=10000)
-            except Exception:
-                # If it fails, just continue in the current chat.
-                print("Could not start a new chat, continuing in the current one.", file=sys.stderr)
+            if stream or network:
+                return await stream_claude_response(page, prompt, network=network, echo=stream)
 
-            # Send the prompt
-            await page.locator("div[contenteditable='true']").fill(prompt)
-            await page.locator("button[aria-label='Send message']").click()
-
-            # Wait for the response to finish
-            newest_claude_response_group = page.locator("div.group").filter(has=page.locator("div.font-claude-message")).last
-            copy_button_locator = newest_claude_response_group.locator("button:has(svg[data-testid='action-bar-copy'])")
-            
+            # One verified insert (or an attachment for very large prompts), the registry's send
+            # button, and the completion observer for the new turn.
             # Increased timeout for potentially long code generation
-            await copy_button_locator.wait_for(state="visible", timeout=120000) 
+            success, claude_response = await send_and_wait(page, prompt, timeout=120000)
+            if not success:
+                return None
 
-            response_text_container = newest_claude_response_group.locator("div.font-claude-message")
-            claude_response = await response_text_container.inner_text()
-            
             # The actual response is all we print to stdout
             print(claude_response.strip())
 
@@ -59,11 +44,62 @@ async def get_claude_response(prompt):
         except Exception as e:
             print(f"An error occurred: {e}", file=sys.stderr)
             return None
+        finally:
+            if session:
+                # Lets the previous tab finish switching to /new so the next run finds it preloaded.
+                await session.close()
+
+async def stream_claude_response(page, prompt, network=False, echo=True):
+    """Writes response deltas to stdout as they arrive and returns the full text.
+
+    With echo=False only the final text is printed.
+    """
+    events = stream_network_response if network else stream_response
+    async for event in events(page, prompt, timeout=120000):
+        if event["type"] == "delta":
+            if echo:
+                sys.stdout.write(event["text"])
+                sys.stdout.flush()
+        elif event["type"] == "reset":
+            if echo:
+                print("\n[earlier response text was rewritten; full text follows]", file=sys.stderr)
+                sys.stdout.write(event["text"])
+                sys.stdout.flush()
+        elif event["type"] == "final":
+            if not echo and event["complete"]:
+                sys.stdout.write(event["text"].strip())
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+            first_token = event["first_token_ms"]
+            first_token = f"{first_token:.0f} ms" if first_token is not None else "n/a"
+            print(f"Response {'complete' if event['complete'] else 'incomplete'} after "
+                  f"{event['elapsed_ms']:.0f} ms (first token {first_token}).", file=sys.stderr)
+            return event["text"].strip() if event["complete"] else None
+    return None
 
 async def main():
+    parser = argparse.ArgumentParser(description="Send a prompt from stdin to claude.ai.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write the response to stdout as it is generated.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Answer repeated prompts from the on-disk response cache.")
+    parser.add_argument("--network", action="store_true",
+                        help="Read the response from the completion stream (exact markdown) instead of the page.")
+    args = parser.parse_args()
+
     # Read the entire prompt from stdin
     prompt = sys.stdin.read()
-    await get_claude_response(prompt)
+
+    cache = ResponseCache() if args.cache else None
+    if cache:
+        entry = await cache.aget(prompt)
+        if entry:
+            print(entry["text"].strip())
+            return
+
+    response = await get_claude_response(prompt, stream=args.stream, network=args.network)
+    if cache and response:
+        await cache.aput(prompt, response)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from claude_bridge.batch import CheckpointWriter, load_checkpoint, plan_units
+
+
+def result(item_id, success=True, group=None):
+    return {"id": item_id, "group": group, "success": success, "text": "answer", "url": f"https://claude.ai/chat/{item_id}"}
+
+
+class CheckpointWriterTest(unittest.TestCase):
+    def test_results_are_written_off_the_loop_and_checkpointed(self):
+        with tempfile.TemporaryDirectory() as root:
+            output = os.path.join(root, "results.jsonl")
+            threads = set()
+            writer = CheckpointWriter(output, fsync_every=2)
+            add = writer.add
+            writer.add = lambda record: (threads.add(threading.current_thread()), add(record))
+
+            async def scenario():
+                for record in (result("a"), result("b", success=False), result("c", group="g")):
+                    await writer.aadd(record)
+                await writer.aclose()
+            asyncio.run(scenario())
+            done, groups = load_checkpoint(output)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual(set(done), {"a", "c"})
+        self.assertEqual(groups, {"g": "https://claude.ai/chat/c"})
+
+    def test_checkpointed_ids_are_skipped(self):
+        items = [{"id": "a", "group": None}, {"id": "b", "group": "g"}, {"id": "c", "group": "g"},
+                 {"id": "d", "group": None}]
+        units = plan_units(items, {"a": None, "b": "url"})
+        self.assertEqual([[item["id"] for item in unit] for unit in units], [["c"], ["d"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
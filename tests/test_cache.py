@@ -0,0 +1,48 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from claude_bridge.cache import ResponseCache, chain_context, get_cached_conversation
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.dir.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def test_async_roundtrip_off_the_loop(self):
+        async def scenario():
+            miss = await self.cache.aget("Hello")
+            await self.cache.aput("Hello", "Hi!", artifacts=[{"name": "a.py"}])
+            return miss, await self.cache.aget("Hello  \r\n"), await self.cache.astats()
+        miss, hit, stats = asyncio.run(scenario())
+        self.assertIsNone(miss)
+        self.assertEqual((hit["text"], hit["artifacts"]), ("Hi!", [{"name": "a.py"}]))
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (1, 1, 1))
+
+    def test_expired_entries_miss(self):
+        self.cache.put("p", "old", ttl=-1)
+        self.assertIsNone(self.cache.get("p"))
+
+    def test_eviction_keeps_the_size_bound(self):
+        self.cache.max_bytes = 10
+        self.cache.put("a", "12345678")
+        self.cache.put("b", "12345678")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_conversation_needs_every_turn(self):
+        self.cache.put("first", "one")
+        self.cache.put("second", "two", context=chain_context("", "first", "one"))
+        entries = asyncio.run(get_cached_conversation(self.cache, ["first", "second"]))
+        self.assertEqual([entry["text"] for entry in entries], ["one", "two"])
+        self.assertIsNone(asyncio.run(get_cached_conversation(self.cache, ["first", "other"])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from claude_bridge.composer import _digest
+
+CODE = "def add(a, b):\n    if a:\n        return a + b\n    return b\n"
+
+
+class DigestTest(unittest.TestCase):
+    def test_paragraph_breaks_are_normalized(self):
+        self.assertEqual(_digest("one\ntwo"), _digest("\none\r\n\r\n\ntwo\n"))
+
+    def test_flattened_indentation_does_not_match(self):
+        flattened = "\n".join(line.strip() for line in CODE.splitlines())
+        self.assertNotEqual(_digest(CODE), _digest(flattened))
+
+    def test_newlines_turned_into_spaces_do_not_match(self):
+        self.assertNotEqual(_digest(CODE), _digest(CODE.replace("\n", " ")))
+        self.assertNotEqual(_digest("a b"), _digest("ab"))
+
+    def test_other_whitespace_is_kept(self):
+        for text in ("a\ufeffb", "a\x1cb", "a\x85b", "a\tb"):
+            self.assertEqual(_digest(text)["length"], 3, repr(text))
+
+    def test_length_counts_utf16_units(self):
+        self.assertEqual(_digest("😀\n\n")["length"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from claude_bridge.document import build_document, code_block_name, document_from_markdown, filename_hint
+
+
+def raw(*segments):
+    return {"segments": list(segments), "artifacts": []}
+
+
+class FilenameHintTest(unittest.TestCase):
+    def test_first_line_comment(self):
+        self.assertEqual(filename_hint("# app.py\nprint(1)\n"), "app.py")
+        self.assertEqual(filename_hint("// src/index.ts\nexport {}\n"), "src/index.ts")
+
+    def test_plain_word_with_other_language_extension_is_ignored(self):
+        self.assertIsNone(filename_hint("from flask import Flask\n", "A Flask API for your Next.js app:", "python"))
+
+    def test_backticked_or_bold_name(self):
+        self.assertEqual(filename_hint("x = 1\n", "Save this as `app.py`:"), "app.py")
+        self.assertEqual(filename_hint("x = 1\n", "Then in **settings.toml**:"), "settings.toml")
+
+    def test_marked_name_from_the_dom(self):
+        self.assertEqual(filename_hint("x = 1\n", "Save this as app.py:", marked=["app.py"]), "app.py")
+        self.assertIsNone(filename_hint("x = 1\n", "Save this as app.py:"))
+
+    def test_plain_name_matching_the_language(self):
+        self.assertEqual(filename_hint("import os\n", "Put this in server.py:", "python"), "server.py")
+
+    def test_marked_name_of_another_language_is_ignored(self):
+        self.assertIsNone(filename_hint("import os\n", "Call it from `main.js`:", "python"))
+
+    def test_path_outside_the_output_directory(self):
+        self.assertIsNone(filename_hint("# ../../etc/passwd.py\n"))
+
+
+class BuildDocumentTest(unittest.TestCase):
+    def test_python_block_after_next_js_sentence(self):
+        document = build_document(raw(
+            {"type": "prose", "text": "A Flask API for your Next.js app:", "marked": []},
+            {"type": "code", "language": "python", "code": "from flask import Flask\n"},
+        ))
+        block = document["code_blocks"][0]
+        self.assertIsNone(block["filename"])
+        self.assertEqual(block["extension"], ".py")
+        self.assertEqual(code_block_name(block), "code_1.py")
+
+    def test_hint_sets_language_of_unlabeled_block(self):
+        document = build_document(raw(
+            {"type": "prose", "text": "Save it as styles.css:", "marked": ["styles.css"]},
+            {"type": "code", "language": None, "code": "body { margin: 0; }\n"},
+        ))
+        block = document["code_blocks"][0]
+        self.assertEqual((block["filename"], block["language"]), ("styles.css", "css"))
+
+    def test_segments_keep_their_shape(self):
+        document = build_document(raw(
+            {"type": "prose", "text": "Intro", "marked": ["x"]},
+            {"type": "code", "language": "py", "code": "x = 1\n"},
+        ))
+        self.assertEqual(document["segments"][0], {"type": "prose", "text": "Intro"})
+        self.assertEqual(document["code_blocks"][0]["language"], "python")
+        self.assertEqual(document["text"], "Intro\n\n```python\nx = 1\n```")
+
+    def test_hint_only_applies_to_the_next_block(self):
+        document = document_from_markdown(
+            "Save this as `app.py`:\n```python\nprint(1)\n```\n```python\nprint(2)\n```\n")
+        self.assertEqual([block["filename"] for block in document["code_blocks"]], ["app.py", None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from claude_bridge.fleet import Fleet
+
+
+def _fake_instance(index, profile_dir, tasks, events, options):
+    """Answers prompts without a browser. "crash" kills the process mid-task the first time it is
+    seen on a profile, "always crash" every time."""
+    events.put(("ready", index, os.getpid(), None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, prompt = task
+        events.put(("started", index, os.getpid(), task_id))
+        marker = os.path.join(profile_dir, "crashed")
+        if prompt == "always crash" or (prompt == "crash" and not os.path.exists(marker)):
+            open(marker, "w").close()
+            time.sleep(1)  # let the parent see the prompt in flight before the process dies
+            sys.exit(1)
+        events.put(("result", index, os.getpid(), {"task_id": task_id, "success": True, "text": prompt.upper(),
+                                                   "error": None, "tab": 0, "elapsed_ms": 1.0}))
+
+
+class DrainTasksTest(unittest.TestCase):
+    def test_drains_queued_prompts_and_skips_sentinels(self):
+        fleet = Fleet("~/profile", instances=1)  # not started: no profiles are cloned, no processes spawned
+        for task in [(0, "a"), None, (2, "c")]:
+            fleet.tasks.put(task)
+        self.assertEqual(fleet._drain_tasks(), [0, 2])
+        self.assertEqual(fleet._drain_tasks(), [])
+
+
+class RunTest(unittest.TestCase):
+    def run_fleet(self, prompts):
+        with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+            source = os.path.join(root, "profile")
+            os.makedirs(source)
+            fleet = Fleet(source, instances=1, fleet_dir=os.path.join(root, "fleet"), max_attempts=2,
+                          worker=_fake_instance)
+            with fleet:
+                results = fleet.run(prompts)
+                health = fleet.health()[0]
+        return results, health
+
+    def test_prompt_of_a_crashed_instance_is_retried_once_on_its_restart(self):
+        results, health = self.run_fleet(["hello", "crash"])
+
+        self.assertEqual([r["text"] for r in results], ["HELLO", "CRASH"])
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual([r["attempts"] for r in results], [1, 2])
+        self.assertEqual(health["restarts"], 1)
+        self.assertEqual(health["completed"], 2)
+        self.assertEqual(health["failures"], 0)
+        self.assertEqual(health["in_flight"], 0)
+
+    def test_prompt_fails_once_max_attempts_crashes_are_used_up(self):
+        results, health = self.run_fleet(["always crash"])
+
+        self.assertFalse(results[0]["success"])
+        self.assertEqual(results[0]["error"], "browser instance crashed")
+        self.assertEqual(results[0]["attempts"], 2)
+        self.assertEqual(health["restarts"], 2)
+        self.assertEqual(health["completed"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
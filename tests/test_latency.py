@@ -0,0 +1,94 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from claude_bridge import latency
+from claude_bridge.latency import DEFAULTS_MS, LatencyModel, backoff_delays, send_with_retry
+
+
+class LatencyModelTest(unittest.TestCase):
+    def test_fallback_until_enough_samples(self):
+        model = LatencyModel(path=None, min_samples=8)
+        for _ in range(7):
+            model.record("response", 10.0, 1000, 1000)
+        self.assertEqual(model.deadline_ms("response"), DEFAULTS_MS["response"][0])
+        self.assertEqual(model.deadline_ms("response", default=5000), 5000)
+
+    def test_deadline_follows_size_and_is_clamped(self):
+        model = LatencyModel(path=None, min_samples=8, margin=1.0)
+        for chars in range(1000, 11000, 1000):
+            model.record("response", 5 + chars / 1000, 100, chars)  # 1 s per 1000 response chars
+        self.assertAlmostEqual(model.deadline_ms("response", 100, 20000) / 1000, 25, delta=0.5)
+        self.assertEqual(model.deadline_ms("response", 100, 0), DEFAULTS_MS["response"][1])
+        self.assertEqual(model.deadline_ms("response", 100, 10 ** 7), DEFAULTS_MS["response"][2])
+
+    def test_stats_percentiles(self):
+        model = LatencyModel(path=None)
+        for seconds in range(1, 101):
+            model.record("input_ready", seconds / 100)
+        stats = model.stats()["input_ready"]
+        self.assertEqual(stats["samples"], 100)
+        self.assertAlmostEqual(stats["p50_ms"], 505, delta=10)
+        self.assertAlmostEqual(stats["p99_ms"], 990, delta=10)
+
+    def test_history_is_reloaded(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "latency.jsonl")
+            LatencyModel(path=path).record("response", 3.0, 10, 20)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("not json\n")
+            self.assertEqual(len(LatencyModel(path=path).samples["response"]), 1)
+
+    def test_backoff_is_capped(self):
+        self.assertTrue(all(0 <= delay <= 5 for delay in backoff_delays(10, base_s=1, cap_s=5)))
+
+
+class SendWithRetryTest(unittest.TestCase):
+    def run_send(self, counts, settled):
+        calls = []
+
+        async def send(page, message, timeout):
+            calls.append(message)
+            return False, None
+
+        async def no_wait(page, timeout):
+            pass
+
+        async def turn_counts(page):
+            return counts.pop(0)
+
+        async def wait_for_settled_turn(page, baseline, timeout):
+            return settled.pop(0)
+
+        async def no_sleep(delay):
+            pass
+
+        model = LatencyModel(path=None)
+        with mock.patch.object(latency, "wait_for_input_ready", no_wait), \
+                mock.patch.object(latency, "turn_counts", turn_counts), \
+                mock.patch.object(latency, "wait_for_settled_turn", wait_for_settled_turn), \
+                mock.patch.object(latency.asyncio, "sleep", no_sleep), \
+                contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(send_with_retry(object(), "hi", send, model, retries=2))
+        return result, calls, model
+
+    def test_submitted_turn_is_awaited_not_resent(self):
+        result, calls, model = self.run_send([(0, 0), (1, 0)], [None, "late answer"])
+        self.assertEqual(result, (True, "late answer"))
+        self.assertEqual((len(calls), model.recovered, model.retries), (1, 1, 0))
+
+    def test_submitted_turn_that_never_settles_is_not_resent(self):
+        result, calls, model = self.run_send([(0, 0), (1, 1)], [None, None, None])
+        self.assertEqual((result, len(calls)), ((False, None), 1))
+
+    def test_lost_prompt_is_resent(self):
+        result, calls, model = self.run_send([(0, 0)] * 6, [])
+        self.assertEqual((result, len(calls), model.retries), ((False, None), 3, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import json
+import os
+import tempfile
+import unittest
+
+from claude_bridge.metrics import Metrics, wait_for_appends
+
+
+class TurnTraceTest(unittest.TestCase):
+    def test_turn_records_are_appended_in_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            metrics = Metrics()
+            metrics.configure(os.path.join(root, "metrics", "turns.jsonl"))
+            for turn in (1, 2, 3):
+                with metrics.turn(turn, prompt_chars=10):
+                    with metrics.span("fill", method="insert_text"):
+                        pass
+            wait_for_appends()
+            with open(metrics.trace_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([record["turn"] for record in records], [1, 2, 3])
+        self.assertEqual(records[0]["spans"][0]["phase"], "fill")
+        self.assertEqual(metrics.summary()["turn"]["count"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import unittest
+
+from claude_bridge.network import CompletionStream, SSEParser, wait_for_capture
+
+
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+class SSEParserTest(unittest.TestCase):
+    def test_events_split_across_chunks(self):
+        parser = SSEParser()
+        data = sse("completion", {"completion": "héllo"}) + b": keep-alive\n\n" + sse("ping", {})
+        events = []
+        for i in range(0, len(data), 3):  # also splits the two-byte é
+            events.extend(parser.feed(data[i:i + 3]))
+        self.assertEqual(events, [("completion", '{"completion": "h\\u00e9llo"}'), ("ping", "{}")])
+
+    def test_multi_line_data_and_default_event(self):
+        self.assertEqual(SSEParser().feed(b"data: a\r\ndata: b\r\n\r\n"), [("message", "a\nb")])
+
+    def test_close_flushes_unterminated_event(self):
+        parser = SSEParser()
+        self.assertEqual(parser.feed(b"event: x\ndata: 1"), [])
+        self.assertEqual(parser.close(), [("x", "1")])
+
+
+class CompletionStreamTest(unittest.TestCase):
+    def test_message_events(self):
+        stream = CompletionStream()
+        for event, payload in [
+            ("message_start", {"type": "message_start", "message": {"uuid": "m1", "model": "x"}}),
+            ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text"}}),
+            ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                     "delta": {"type": "text_delta", "text": "Hi"}}),
+            ("content_block_start", {"type": "content_block_start", "index": 1,
+                                     "content_block": {"type": "tool_use", "name": "artifacts"}}),
+            ("content_block_delta", {"type": "content_block_delta", "index": 1,
+                                     "delta": {"type": "input_json_delta", "partial_json": "{\"a\": 1}"}}),
+            ("content_block_stop", {"type": "content_block_stop", "index": 1}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]:
+            stream.apply(event, json.dumps(payload))
+        result = stream.result()
+        self.assertEqual((result["text"], result["message_id"], result["stop_reason"]), ("Hi", "m1", "end_turn"))
+        self.assertEqual(result["attachments"][0]["input"], {"a": 1})
+        self.assertTrue(result["complete"])
+
+    def test_error_is_incomplete(self):
+        stream = CompletionStream()
+        stream.apply("error", json.dumps({"type": "error", "error": {"type": "overloaded_error"}}))
+        self.assertFalse(stream.result()["complete"])
+
+
+class _Capture:
+    first_token_s = None
+
+    def __init__(self, future):
+        self.future = future
+
+    def cancel(self):
+        pass
+
+
+class _Waiter(_Capture):
+    async def disarm(self):
+        pass
+
+
+class WaitForCaptureTest(unittest.TestCase):
+    def run_wait(self, capture_result, waiter_result):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            capture, waiter = loop.create_future(), loop.create_future()
+            capture.set_result(capture_result)
+            waiter.set_result(waiter_result)
+            return await wait_for_capture(_Capture(capture), _Waiter(waiter), timeout=1000)
+        return asyncio.run(scenario())
+
+    def test_incomplete_stream_and_finished_dom_in_the_same_wakeup(self):
+        success, text, info = self.run_wait({"complete": False, "text": "par", "error": "cut off"},
+                                            {"text": "full answer"})
+        self.assertEqual((success, text, info["source"]), (True, "full answer", "dom"))
+
+    def test_complete_stream_wins(self):
+        success, text, info = self.run_wait({"complete": True, "text": "**exact**", "error": None},
+                                            {"text": "exact"})
+        self.assertEqual((success, text, info["source"]), (True, "**exact**", "network"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import datetime
+import io
+import time
+import unittest
+
+from claude_bridge.quota import QuotaScheduler, TokenBucket, limit_from_stream, parse_reset
+
+NOW = datetime.datetime(2026, 3, 2, 12, 0).timestamp()  # a Monday, local time
+
+
+class ParseResetTest(unittest.TestCase):
+    def test_relative(self):
+        self.assertEqual(parse_reset("Try again in 45 minutes.", now=NOW), NOW + 45 * 60)
+        self.assertEqual(parse_reset("resets in about 2 hours", now=NOW), NOW + 2 * 3600)
+
+    def test_clock_time(self):
+        reset = datetime.datetime.fromtimestamp(parse_reset("usage limit until 5 PM", now=NOW))
+        self.assertEqual((reset.day, reset.hour, reset.minute), (2, 17, 0))
+
+    def test_past_clock_time_is_tomorrow(self):
+        reset = datetime.datetime.fromtimestamp(parse_reset("limit resets at 09:30", now=NOW))
+        self.assertEqual((reset.day, reset.hour, reset.minute), (3, 9, 30))
+
+    def test_weekday(self):
+        reset = datetime.datetime.fromtimestamp(parse_reset("until Tuesday 9:00 AM", now=NOW))
+        self.assertEqual((reset.day, reset.hour), (3, 9))
+
+    def test_ambiguous_or_invalid(self):
+        self.assertIsNone(parse_reset("you sent 5 messages at 3", now=NOW))
+        self.assertIsNone(parse_reset("until 13 PM", now=NOW))
+        self.assertIsNone(parse_reset("no time here", now=NOW))
+
+
+class LimitFromStreamTest(unittest.TestCase):
+    def test_exceeded_limit(self):
+        signal = limit_from_stream({"limits": {"type": "exceeded_limit", "resetsAt": 1767225600000}})
+        self.assertEqual((signal["kind"], signal["reset_at"]), ("usage_limit", 1767225600))
+
+    def test_rate_limit_error(self):
+        signal = limit_from_stream({"error": {"status": 429, "message": "Too many requests, try in 30 seconds"}})
+        self.assertEqual(signal["kind"], "rate_limit")
+        self.assertAlmostEqual(signal["reset_at"], time.time() + 30, delta=5)
+
+    def test_other_errors(self):
+        self.assertIsNone(limit_from_stream(None))
+        self.assertIsNone(limit_from_stream({"error": {"type": "overloaded_error", "message": "Overloaded"}}))
+        self.assertIsNone(limit_from_stream({"error": "connection reset"}))
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_rate(self):
+        async def scenario():
+            bucket = TokenBucket(rate_per_min=6000, burst=2)  # a token every 10 ms
+            waits = [await bucket.acquire() for _ in range(4)]
+            return waits
+        waits = asyncio.run(scenario())
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertTrue(all(0 < wait <= 0.02 for wait in waits[2:]))
+
+
+class FakePage:
+    def __init__(self, banners):
+        self.banners = banners
+
+    async def evaluate(self, script, arg=None):
+        return self.banners
+
+
+class QuotaSchedulerTest(unittest.TestCase):
+    def test_wrap_resends_after_a_limit(self):
+        page = FakePage(["You've reached your usage limit. Try again in 0 seconds."])
+        calls = []
+
+        async def send(page, prompt):
+            calls.append(prompt)
+            if len(calls) == 1:
+                return False, None
+            page.banners = []
+            return True, "answer"
+
+        scheduler = QuotaScheduler()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(scheduler.wrap(send)(page, "hi"))
+        self.assertEqual(result, (True, "answer"))
+        self.assertEqual((calls, scheduler.limits_hit), (["hi", "hi"], 1))
+
+    def test_wrap_does_not_resend_without_a_limit(self):
+        calls = []
+
+        async def send(page, prompt):
+            calls.append(prompt)
+            return False, None
+
+        result = asyncio.run(QuotaScheduler().wrap(send)(FakePage([]), "hi"))
+        self.assertEqual((result, len(calls)), ((False, None), 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from claude_bridge.sink import DirectorySink, JsonlSink, ResultSink
+
+
+class _NullSink(ResultSink):
+    def location(self, name):
+        return name
+
+    def _write(self, records):
+        pass
+
+
+class ClaimTest(unittest.TestCase):
+    def test_taken_names_get_a_suffix(self):
+        sink = _NullSink(run="r")
+        try:
+            names = [sink._claim("chat 1", 1, "main.py") for _ in range(3)]
+            other_turn = sink._claim("chat 1", 2, "main.py")
+        finally:
+            sink.close()
+        self.assertEqual(names, ["chat_1/turn_001_main.py", "chat_1/turn_001_main_2.py", "chat_1/turn_001_main_3.py"])
+        self.assertEqual(other_turn, "chat_1/turn_002_main.py")
+
+
+class DirectorySinkTest(unittest.TestCase):
+    def test_writes_under_the_run_directory(self):
+        with tempfile.TemporaryDirectory() as root:
+            async def scenario():
+                async with DirectorySink(root, run="run1") as sink:
+                    first = await sink.put("c", 1, "response.md", "hello")
+                    second = await sink.put("c", 1, "response.md", {"a": 1}, kind="document")
+                return sink, first, second
+            sink, first, second = asyncio.run(scenario())
+            self.assertEqual(first, os.path.join(root, "run1", "c", "turn_001_response.md"))
+            with open(first, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "hello")
+            with open(second, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), {"a": 1})
+            self.assertEqual((sink.written, sink.errors), (2, 0))
+            sink.close()  # a second close is a no-op
+
+    def test_put_after_close_fails(self):
+        with tempfile.TemporaryDirectory() as root:
+            sink = DirectorySink(root)
+            sink.close()
+            with self.assertRaises(RuntimeError):
+                asyncio.run(sink.put("c", 1, "x.txt", "late"))
+
+
+class JsonlSinkTest(unittest.TestCase):
+    def test_gzip_appends_runs(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "results.jsonl.gz")
+
+            async def scenario(run):
+                async with JsonlSink(path, compression="gzip", run=run) as sink:
+                    await sink.put("c", 1, "response.md", f"answer {run}", url="https://claude.ai/chat/x")
+
+            asyncio.run(scenario("a"))
+            asyncio.run(scenario("b"))
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([(r["run"], r["content"], r["url"]) for r in records],
+                         [("a", "answer a", "https://claude.ai/chat/x"), ("b", "answer b", "https://claude.ai/chat/x")])
+
+
+if __name__ == "__main__":
+    unittest.main()